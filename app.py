@@ -2,15 +2,27 @@
 Cargo Scout Wycena - UI Frontend
 Prosty frontend - tylko normalizuje kody pocztowe i wywołuje Backend API
 """
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, render_template, jsonify, request, Response, stream_with_context
+import base64
 import os
 import re
+import time
+from functools import partial
 from dotenv import load_dotenv
 import requests
 
+from http_client import get_http_session, get_pool_stats
+from json_provider import configure_json
+from compression import init_compression
+from response_cache import create_cache
+from singleflight import SingleFlight
+
 load_dotenv()
 
 app = Flask(__name__)
+configure_json(app)
+# Skompresowane pliki statyczne - te same warianty serwuje asgi_app.py
+static_precompressor = init_compression(app)
 
 # Konfiguracja Backend API
 BACKEND_API_URL = os.getenv("API_URL")
@@ -20,6 +32,36 @@ BACKEND_API_KEY = os.getenv("API_KEY")
 AWS_LOCATION_API_KEY = os.getenv("AWS_LOCATION_API_KEY")
 AWS_REGION = os.getenv("AWS_REGION", "eu-central-1")
 
+# Cache odpowiedzi Backend API per trasa (PL20 -> DE49)
+# TTL domyślnie 1h - dane giełdowe w backendzie odświeżane są co godzinę
+PRICING_CACHE_TTL = int(os.getenv("PRICING_CACHE_TTL", "3600"))
+PRICING_CACHE_MAXSIZE = int(os.getenv("PRICING_CACHE_MAXSIZE", "5000"))
+# Dystans drogowy między tymi samymi punktami praktycznie się nie zmienia
+DISTANCE_CACHE_TTL = int(os.getenv("DISTANCE_CACHE_TTL", str(7 * 24 * 3600)))
+DISTANCE_CACHE_MAXSIZE = int(os.getenv("DISTANCE_CACHE_MAXSIZE", "20000"))
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")
+# Surowa odpowiedź backendu (_api_response) w każdej wycenie - tylko do debugowania
+DEBUG_API_RESPONSE = os.getenv("DEBUG_API_RESPONSE", "false").lower() in ("1", "true", "yes")
+
+# Backend wybierany przez CACHE_BACKEND (memory | sqlite) - patrz response_cache.py
+pricing_cache = create_cache('pricing', PRICING_CACHE_MAXSIZE, PRICING_CACHE_TTL)
+distance_cache = create_cache('distance', DISTANCE_CACHE_MAXSIZE, DISTANCE_CACHE_TTL)
+
+# Okresy danych giełdowych w odpowiedzi (dni) i okres domyślny
+QUOTE_PERIODS = (7, 30, 90)
+DEFAULT_PERIOD = 30
+
+# Tryb strumieniowy /api/calculate: ile zleceń historycznych w jednym fragmencie odpowiedzi
+STREAM_ORDERS_CHUNK = int(os.getenv("STREAM_ORDERS_CHUNK", "200"))
+
+# Zlecenia historyczne: pierwsza strona w /api/calculate, kolejne z /api/historical-orders
+HISTORICAL_ORDERS_PAGE_SIZE = int(os.getenv("HISTORICAL_ORDERS_PAGE_SIZE", "50"))
+HISTORICAL_ORDERS_MAX_PAGE_SIZE = 500
+HISTORICAL_ORDERS_SORT_FIELDS = ('date', 'rate_per_km', 'amount')
+
+# Równoczesne wyceny tej samej trasy współdzielą jedno wywołanie Backend API
+backend_flight = SingleFlight('backend_pricing')
+
 
 def normalize_postal_code(postal_code):
     """
@@ -51,6 +93,15 @@ def calculate_route():
     1. Normalizuje kody pocztowe (PL20, DE49)
     2. Wywołuje Backend API
     3. Zwraca odpowiedź
+    
+    Tryb strumieniowy - eksport WSZYSTKICH zleceń historycznych (bez stronicowania,
+    w kolejności z Backend API); UI używa zwykłego trybu i /api/historical-orders:
+    - ?stream=json lub ?stream=1 - dokument JSON jak zwykle, ale historical_orders
+      zawiera wszystkie zlecenia, wysyłane fragmentami
+    - ?stream=ndjson lub Accept: application/x-ndjson - pierwsza linia to wycena
+      bez historical_orders, każda kolejna linia to jedno zlecenie
+    W obu historical_orders_page ma mode 'all', total = liczba zleceń i
+    next_cursor null - nie ma kolejnych stron do pobrania.
     """
     data = request.json
     
@@ -75,124 +126,413 @@ def calculate_route():
             'message': 'Ustaw API_URL i API_KEY w .env'
         }), 500
     
-    # Wywołaj Backend API
+    backend_data, error = load_lane_pricing(normalized_start, normalized_end)
+    if error is not None:
+        return error
+    
     try:
-        print(f"🌐 Backend API: {normalized_start} -> {normalized_end}")
-        
-        response = requests.post(
-            BACKEND_API_URL,
-            json={
-                'start_postal_code': normalized_start,
-                'end_postal_code': normalized_end
-            },
-            headers={
-                'X-API-Key': BACKEND_API_KEY,
-                'Content-Type': 'application/json'
-            },
-            timeout=30
+        return quote_response(data, backend_data)
+    except Exception as e:
+        print(f"❌ {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+def load_lane_pricing(normalized_start, normalized_end):
+    """
+    Dane Backend API dla trasy - z cache albo z jednego (współdzielonego) wywołania
+    
+    Returns:
+        (backend_data, None) lub (None, odpowiedź błędu Flask)
+    """
+    cache_key = (normalized_start, normalized_end)
+    backend_data = pricing_cache.get(cache_key)
+    if backend_data is not None:
+        print(f"⚡ Cache: {normalized_start} -> {normalized_end}")
+        return backend_data, None
+    
+    # Wywołaj Backend API (równoczesne zapytania o tę samą trasę czekają na jedno wywołanie)
+    try:
+        (status_code, payload), shared = backend_flight.do(
+            cache_key, lambda: fetch_backend_pricing(normalized_start, normalized_end)
         )
+        if shared:
+            print(f"🔗 Współdzielona odpowiedź: {normalized_start} -> {normalized_end}")
         
-        print(f"📥 Status: {response.status_code}")
-        
-        if response.status_code == 200:
-            api_data = response.json()
-            
-            if api_data.get('success'):
-                # Przekształć do formatu UI
-                backend_data = api_data.get('data', {})
-                pricing = backend_data.get('pricing', {})
-                route_distance_data = backend_data.get('route_distance', {})
-                
-                # Użyj dystansu z API
-                actual_distance = route_distance_data.get('distance_km', 0)
-                
-                # Przygotuj odpowiedź
-                result = {
-                    'distance': actual_distance,
-                    'start_location': start_location,
-                    'end_location': end_location,
-                    'start_coords': data.get('start_coords'),
-                    'end_coords': data.get('end_coords'),
-                    'route': {
-                        'start': data.get('start_coords', [52.0, 19.0]),
-                        'end': data.get('end_coords', [50.0, 20.0]),
-                        'route': []
-                    },
-                    # Dane z API
-                    'exchange_rates': transform_to_ui_format(pricing, actual_distance, 30),
-                    'exchange_rates_by_days': {
-                        '7': transform_to_ui_format(pricing, actual_distance, 7),
-                        '30': transform_to_ui_format(pricing, actual_distance, 30),
-                        '90': transform_to_ui_format(pricing, actual_distance, 90)
-                    },
-                    'historical_rates': transform_historical(pricing),
-                    'historical_rates_by_days': {
-                        '7': transform_historical(pricing),
-                        '30': transform_historical(pricing),
-                        '90': transform_historical(pricing)
-                    },
-                    'historical_orders': get_all_historical_orders(backend_data),
-                    'tolls': {'estimated': 0, 'currency': 'EUR'},
-                    'suggested_carriers': [],
-                    '_api_response': backend_data  # Debug
-                }
-                
-                return jsonify(result)
-            else:
-                return jsonify(api_data), 400
-        else:
-            return jsonify({
-                'error': f'Backend API error: {response.status_code}',
-                'message': response.text
-            }), response.status_code
+        backend_data, error = pricing_result(status_code, payload)
+        if error is not None:
+            body, status = error
+            return None, (jsonify(body), status)
+        return backend_data, None
             
     except requests.exceptions.Timeout:
-        return jsonify({'error': 'Backend API timeout'}), 504
+        return None, (jsonify({'error': 'Backend API timeout'}), 504)
     except requests.exceptions.ConnectionError:
-        return jsonify({'error': f'Nie można połączyć z {BACKEND_API_URL}'}), 503
+        return None, (jsonify({'error': f'Nie można połączyć z {BACKEND_API_URL}'}), 503)
     except Exception as e:
         print(f"❌ {e}")
-        return jsonify({'error': str(e)}), 500
+        return None, (jsonify({'error': str(e)}), 500)
+
+
+def pricing_result(status_code, payload):
+    """
+    Wynik wywołania Backend API (wspólny dla wersji Flask i ASGI)
+    
+    Returns:
+        (backend_data, None) lub (None, (treść błędu, status))
+    """
+    if status_code == 200:
+        if payload.get('success'):
+            return payload.get('data', {}), None
+        return None, (payload, 400)
+    return None, ({
+        'error': f'Backend API error: {status_code}',
+        'message': payload
+    }, status_code)
+
+
+def fetch_backend_pricing(normalized_start, normalized_end):
+    """
+    Wywołuje Backend API dla trasy i zapisuje udaną odpowiedź w cache
+    
+    Returns:
+        (status_code, api_data) dla 200 lub (status_code, treść błędu)
+    """
+    print(f"🌐 Backend API: {normalized_start} -> {normalized_end}")
+    
+    response = get_http_session().post(
+        BACKEND_API_URL,
+        json={
+            'start_postal_code': normalized_start,
+            'end_postal_code': normalized_end
+        },
+        headers={
+            'X-API-Key': BACKEND_API_KEY,
+            'Content-Type': 'application/json'
+        },
+        timeout=30
+    )
+    
+    print(f"📥 Status: {response.status_code}")
+    
+    if response.status_code != 200:
+        return response.status_code, response.text
+    
+    api_data = response.json()
+    if api_data.get('success'):
+        pricing_cache.set((normalized_start, normalized_end), api_data.get('data', {}))
+    return 200, api_data
+
+
+def _stream_format():
+    """Tryb strumieniowy żądany przez klienta: 'json', 'ndjson' lub None"""
+    stream = request.args.get('stream', '').lower()
+    if stream in ('1', 'true', 'json'):
+        return 'json'
+    if stream == 'ndjson' or 'application/x-ndjson' in request.headers.get('Accept', ''):
+        return 'ndjson'
+    return None
+
+
+def _debug_requested():
+    """
+    Czy dołączyć surową odpowiedź backendu (_api_response)
+    - flaga DEBUG_API_RESPONSE dla całej aplikacji, albo
+    - nagłówek X-Debug: 1 w żądaniu (z X-Admin-Key, jeśli ustawiono ADMIN_API_KEY)
+    """
+    if DEBUG_API_RESPONSE:
+        return True
+    if request.headers.get('X-Debug', '').lower() in ('1', 'true'):
+        return _is_admin_request()
+    return False
+
+
+def quote_response(data, backend_data):
+    """
+    Odpowiedź /api/calculate - zwykły JSON albo strumień (patrz calculate_route)
+    
+    Nagłówki pomiarowe: Server-Timing (build, serialize), X-Payload-Bytes,
+    w trybie debug także X-Backend-Payload-Bytes
+    """
+    include_debug = _debug_requested()
+    stream_format = _stream_format()
+    
+    started = time.perf_counter()
+    result = build_quote_response(
+        data, backend_data,
+        include_orders=stream_format is None,
+        include_debug=include_debug
+    )
+    built = time.perf_counter()
+    
+    if stream_format is not None:
+        response = stream_quote_response(result, backend_data, stream_format)
+        response.headers['Server-Timing'] = f"build;dur={(built - started) * 1000:.2f}"
+        return response
+    
+    response = jsonify(result)
+    serialized = time.perf_counter()
+    payload_bytes = response.content_length
+    
+    response.headers['Server-Timing'] = (
+        f"build;dur={(built - started) * 1000:.2f}, serialize;dur={(serialized - built) * 1000:.2f}"
+    )
+    response.headers['X-Payload-Bytes'] = str(payload_bytes)
+    if include_debug:
+        response.headers['X-Backend-Payload-Bytes'] = str(len(app.json.dumps(backend_data).encode('utf-8')))
+    
+    print(f"📤 Odpowiedź: {payload_bytes} B, serializacja {(serialized - built) * 1000:.2f} ms"
+          f"{' (debug)' if include_debug else ''}")
+    return response
+
+
+def _chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_quote_stream(result, backend_data, stream_format):
+    """
+    Fragmenty strumienia wyceny (json / ndjson) - wszystkie zlecenia historyczne
+    przekształcane i serializowane fragmentami prosto z payloadu backendu
+    """
+    # Kompaktowo, jak jsonify() w zwykłym trybie
+    dumps = partial(app.json.dumps, separators=(',', ':'))
+    orders = iter_historical_orders(backend_data)
+    
+    if stream_format == 'ndjson':
+        yield dumps(result) + '\n'
+        for chunk in _chunked(orders, STREAM_ORDERS_CHUNK):
+            yield ''.join(dumps(order) + '\n' for order in chunk)
+        return
+    
+    head = dumps(result)
+    yield head[:-1] + (',' if len(result) else '') + '"historical_orders":['
+    separator = ''
+    for chunk in _chunked(orders, STREAM_ORDERS_CHUNK):
+        yield separator + ','.join(dumps(order) for order in chunk)
+        separator = ','
+    yield ']}'
+
+
+def stream_quote_response(result, backend_data, stream_format):
+    """
+    Wysyła wycenę, a zlecenia historyczne fragmentami (iter_quote_stream) -
+    bez budowania drugiej pełnej listy ani jednego dużego stringa JSON
+    """
+    mimetype = 'application/x-ndjson' if stream_format == 'ndjson' else 'application/json'
+    return Response(
+        stream_with_context(iter_quote_stream(result, backend_data, stream_format)),
+        mimetype=mimetype
+    )
+
+
+def build_quote_response(data, backend_data, include_orders=True, include_debug=False):
+    """
+    Przekształć odpowiedź Backend API do formatu UI
+    historical_orders zawiera pierwszą stronę zleceń (kolejne: /api/historical-orders)
+    include_orders=False pomija historical_orders (tryb strumieniowy wysyła osobno
+    wszystkie zlecenia - historical_orders_page opisuje wtedy cały eksport)
+    include_debug=True dołącza surową odpowiedź backendu jako _api_response
+    """
+    pricing = backend_data.get('pricing', {})
+    route_distance_data = backend_data.get('route_distance', {})
+    
+    # Użyj dystansu z API
+    actual_distance = route_distance_data.get('distance_km', 0)
+    start_location = data.get('start_location', '')
+    end_location = data.get('end_location', '')
+    
+    result = {
+        'distance': actual_distance,
+        'start_location': start_location,
+        'end_location': end_location,
+        'start_coords': data.get('start_coords'),
+        'end_coords': data.get('end_coords'),
+        'route': {
+            'start': data.get('start_coords', [52.0, 19.0]),
+            'end': data.get('end_coords', [50.0, 20.0]),
+            'route': []
+        },
+        # Dane z API
+        **build_period_views(pricing, actual_distance),
+        'tolls': {'estimated': 0, 'currency': 'EUR'},
+        'suggested_carriers': []
+    }
+    
+    if include_debug:
+        result['_api_response'] = backend_data
+    
+    if include_orders:
+        page = query_historical_orders(backend_data, limit=HISTORICAL_ORDERS_PAGE_SIZE)
+        result['historical_orders'] = page.pop('orders')
+        result['historical_orders_page'] = page
+    else:
+        total = len(_historical_orders_source(backend_data))
+        result['historical_orders_page'] = {
+            'mode': 'all',
+            'total': total,
+            'limit': total,
+            'sort': None,
+            'order': None,
+            'next_cursor': None
+        }
+    
+    return result
 
 
-def get_all_historical_orders(backend_data):
-    """Pobierz wszystkie zlecenia historyczne z API"""
-    # Zlecenia są w pricing.historical.180d.orders
+def build_period_views(pricing, distance):
+    """
+    Widoki okresów (7/30/90 dni) w jednym przebiegu po `pricing`
+    Każdy okres liczony raz, obiekty współdzielone między kluczami odpowiedzi
+    """
+    exchange_by_days = {
+        str(days): transform_to_ui_format(pricing, distance, days)
+        for days in QUOTE_PERIODS
+    }
+    # Historia firmowa jest zawsze z 180 dni - ten sam wynik dla każdego okresu
+    historical = transform_historical(pricing)
+    
+    return {
+        'exchange_rates': exchange_by_days[str(DEFAULT_PERIOD)],
+        'exchange_rates_by_days': exchange_by_days,
+        'historical_rates': historical,
+        'historical_rates_by_days': {key: historical for key in exchange_by_days}
+    }
+
+
+def _historical_orders_source(backend_data):
+    """Surowa lista zleceń z API - są w pricing.historical.180d.orders"""
     pricing = backend_data.get('pricing', {})
     historical = pricing.get('historical', {})
     period_180d = historical.get('180d', {})
-    orders = period_180d.get('orders', [])
-    
-    print(f"📦 Orders znalezione: {len(orders) if orders else 0}")
-    
-    if not orders:
-        return []
-    
-    # Przekształć zlecenia do formatu UI
-    result = []
-    for order in orders:
-        # Formatuj datę do yyyy-mm-dd
-        order_date = order.get('order_date', '')
-        if order_date and 'T' in order_date:
-            order_date = order_date.split('T')[0]  # Weź tylko część przed 'T'
-        elif order_date and ' ' in order_date:
-            order_date = order_date.split(' ')[0]  # Weź tylko część przed spacją
-        
-        result.append({
-            'date': order_date,
-            'carrier': order.get('carrier_name'),
-            'type': order.get('order_type'),  # FTL lub LTL
-            'cargo_type': order.get('cargo_type'),
-            'rate_per_km': order.get('carrier_price_per_km'),
-            'amount': order.get('carrier_amount'),
-            'currency': order.get('carrier_currency', 'EUR'),
-            'distance': order.get('route_distance') or order.get('distance'),
-            'carrier_email': order.get('carrier_email'),
-            'carrier_contact': order.get('carrier_contact')
-        })
+    return period_180d.get('orders', []) or []
+
+
+def _order_date(order):
+    """Data zlecenia w formacie yyyy-mm-dd"""
+    order_date = order.get('order_date', '')
+    if order_date and 'T' in order_date:
+        order_date = order_date.split('T')[0]  # Weź tylko część przed 'T'
+    elif order_date and ' ' in order_date:
+        order_date = order_date.split(' ')[0]  # Weź tylko część przed spacją
+    return order_date
+
+
+def format_historical_order(order):
+    """Przekształć jedno zlecenie do formatu UI"""
+    return {
+        'date': _order_date(order),
+        'carrier': order.get('carrier_name'),
+        'type': order.get('order_type'),  # FTL lub LTL
+        'cargo_type': order.get('cargo_type'),
+        'rate_per_km': order.get('carrier_price_per_km'),
+        'amount': order.get('carrier_amount'),
+        'currency': order.get('carrier_currency', 'EUR'),
+        'distance': order.get('route_distance') or order.get('distance'),
+        'carrier_email': order.get('carrier_email'),
+        'carrier_contact': order.get('carrier_contact')
+    }
+
+
+def iter_historical_orders(backend_data):
+    """Zlecenia historyczne w formacie UI - generator, jedno zlecenie naraz"""
+    for order in _historical_orders_source(backend_data):
+        yield format_historical_order(order)
+
+
+# Pole sortowania w UI -> wartość z surowego zlecenia API
+_ORDER_SORT_KEYS = {
+    'date': _order_date,
+    'rate_per_km': lambda order: order.get('carrier_price_per_km'),
+    'amount': lambda order: order.get('carrier_amount'),
+}
+
+
+def _encode_cursor(offset):
+    return base64.urlsafe_b64encode(f"o:{offset}".encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor):
+    """Kursor -> offset (ValueError dla nieprawidłowego kursora)"""
+    if not cursor:
+        return 0
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        prefix, offset = raw.split(':', 1)
+        offset = int(offset)
+    except Exception:
+        raise ValueError('Nieprawidłowy kursor')
+    if prefix != 'o' or offset < 0:
+        raise ValueError('Nieprawidłowy kursor')
+    return offset
+
+
+def query_historical_orders(backend_data, sort='date', descending=True, order_type=None,
+                            carrier=None, date_from=None, date_to=None, cursor=None,
+                            limit=HISTORICAL_ORDERS_PAGE_SIZE):
+    """
+    Strona zleceń historycznych z filtrami i sortowaniem
     
-    print(f"✅ Przekształcono {len(result)} zleceń")
-    return result
+    Filtry i sortowanie działają na surowych zleceniach z API,
+    do formatu UI przekształcana jest tylko zwracana strona.
+    
+    Args:
+        sort: 'date' | 'rate_per_km' | 'amount'
+        order_type: 'FTL' | 'LTL'
+        carrier: fragment nazwy przewoźnika (bez rozróżniania wielkości liter)
+        date_from, date_to: zakres dat yyyy-mm-dd (włącznie)
+        cursor: kursor z poprzedniej strony (next_cursor)
+    """
+    if sort not in _ORDER_SORT_KEYS:
+        raise ValueError(f"Nieobsługiwane sortowanie '{sort}'")
+    offset = _decode_cursor(cursor)
+    
+    orders = _historical_orders_source(backend_data)
+    if order_type:
+        order_type = order_type.upper()
+        orders = [o for o in orders if (o.get('order_type') or '').upper() == order_type]
+    if carrier:
+        carrier = carrier.lower()
+        orders = [o for o in orders if carrier in (o.get('carrier_name') or '').lower()]
+    if date_from or date_to:
+        def in_range(order):
+            order_date = _order_date(order)
+            return bool(order_date) and (not date_from or order_date >= date_from) \
+                and (not date_to or order_date <= date_to)
+        orders = [o for o in orders if in_range(o)]
+    
+    # Sortowanie stabilne, zlecenia bez wartości zawsze na końcu
+    sort_key = _ORDER_SORT_KEYS[sort]
+    with_value = [o for o in orders if sort_key(o) not in (None, '')]
+    without_value = [o for o in orders if sort_key(o) in (None, '')]
+    with_value.sort(key=sort_key, reverse=descending)
+    ordered = with_value + without_value
+    
+    page = ordered[offset:offset + limit]
+    next_offset = offset + len(page)
+    
+    return {
+        'orders': [format_historical_order(order) for order in page],
+        'total': len(ordered),
+        'limit': limit,
+        'sort': sort,
+        'order': 'desc' if descending else 'asc',
+        'next_cursor': _encode_cursor(next_offset) if next_offset < len(ordered) else None
+    }
+
+
+# Typy pojazdów TimoCom: klucz API -> etykieta UI
+TIMOCOM_VEHICLE_TYPES = (
+    ('3_5t', 'Do 3.5t'),
+    ('12t', 'Do 12t'),
+    ('trailer', 'Naczepa'),
+)
 
 
 def transform_to_ui_format(pricing, distance, days):
@@ -205,55 +545,32 @@ def transform_to_ui_format(pricing, distance, days):
     
     # TimoCom
     timocom = pricing.get('timocom', {}).get(period_key, {})
-    if timocom.get('avg_price_per_km'):
-        avg_prices = timocom['avg_price_per_km']
-        total_offers = timocom.get('total_offers', 0)
+    avg_prices = timocom.get('avg_price_per_km')
+    if avg_prices:
         offers_by_type = timocom.get('offers_by_vehicle_type', {})
         total_prices = timocom.get('total_price', {})
         
-        # 3.5t
-        if avg_prices.get('3_5t'):
-            offers.append({
-                'exchange': 'TimoCom',
-                'vehicle_type': 'Do 3.5t',
-                'rate_per_km': avg_prices['3_5t'],
-                'total_price': total_prices.get('3_5t'),
-                'currency': 'EUR',
-                'has_data': True,
-                'total_offers_sum': offers_by_type.get('3_5t', 0)
-            })
-        
-        # 12t
-        if avg_prices.get('12t'):
-            offers.append({
-                'exchange': 'TimoCom',
-                'vehicle_type': 'Do 12t',
-                'rate_per_km': avg_prices['12t'],
-                'total_price': total_prices.get('12t'),
-                'currency': 'EUR',
-                'has_data': True,
-                'total_offers_sum': offers_by_type.get('12t', 0)
-            })
-        
-        # Naczepa (trailer)
-        if avg_prices.get('trailer'):
-            offers.append({
-                'exchange': 'TimoCom',
-                'vehicle_type': 'Naczepa',
-                'rate_per_km': avg_prices['trailer'],
-                'total_price': total_prices.get('trailer'),
-                'currency': 'EUR',
-                'has_data': True,
-                'total_offers_sum': offers_by_type.get('trailer', 0)
-            })
+        for vehicle_key, label in TIMOCOM_VEHICLE_TYPES:
+            rate = avg_prices.get(vehicle_key)
+            if rate:
+                offers.append({
+                    'exchange': 'TimoCom',
+                    'vehicle_type': label,
+                    'rate_per_km': rate,
+                    'total_price': total_prices.get(vehicle_key),
+                    'currency': 'EUR',
+                    'has_data': True,
+                    'total_offers_sum': offers_by_type.get(vehicle_key, 0)
+                })
     
     # Trans.eu
     transeu = pricing.get('transeu', {}).get(period_key, {})
-    if transeu.get('avg_price_per_km', {}).get('lorry'):
+    lorry_rate = transeu.get('avg_price_per_km', {}).get('lorry')
+    if lorry_rate:
         offers.append({
             'exchange': 'Trans.eu',
             'vehicle_type': 'Lorry',
-            'rate_per_km': transeu['avg_price_per_km']['lorry'],
+            'rate_per_km': lorry_rate,
             'currency': 'EUR',
             'has_data': True,
             'total_offers_sum': transeu.get('total_offers', 0)
@@ -275,6 +592,27 @@ def transform_to_ui_format(pricing, distance, days):
     }
 
 
+def _transform_historical_segment(segment):
+    """Jeden segment danych historycznych (FTL lub LTL) w formacie UI"""
+    carriers = [
+        {
+            'carrier': c.get('carrier_name'),
+            'rate_per_km': c.get('avg_carrier_price_per_km'),
+            'total_price': c.get('avg_carrier_amount'),
+            'currency': c.get('carrier_currency', 'EUR'),
+            'order_count': c.get('order_count', 0)
+        }
+        for c in segment.get('top_carriers') or []
+    ]
+    
+    return {
+        'has_data': True,
+        'avg_rate_per_km': segment.get('avg_price_per_km', {}).get('carrier'),
+        'avg_amount': segment.get('total_price', {}).get('carrier'),  # Użyj total_price z API
+        'carriers': carriers
+    }
+
+
 def transform_historical(pricing):
     """Przekształć dane historyczne z API - osobno FTL i LTL"""
     historical = pricing.get('historical', {}).get('180d', {})
@@ -287,51 +625,52 @@ def transform_historical(pricing):
         'ltl': {'has_data': False, 'avg_rate_per_km': None, 'avg_amount': None, 'carriers': []}
     }
     
-    # FTL
     if ftl:
-        ftl_carriers = []
-        if ftl.get('top_carriers'):
-            for c in ftl['top_carriers']:
-                ftl_carriers.append({
-                    'carrier': c.get('carrier_name'),
-                    'rate_per_km': c.get('avg_carrier_price_per_km'),
-                    'total_price': c.get('avg_carrier_amount'),
-                    'currency': c.get('carrier_currency', 'EUR'),
-                    'order_count': c.get('order_count', 0)
-                })
-        
-        result['ftl'] = {
-            'has_data': True,
-            'avg_rate_per_km': ftl.get('avg_price_per_km', {}).get('carrier'),
-            'avg_amount': ftl.get('total_price', {}).get('carrier'),  # Użyj total_price z API
-            'carriers': ftl_carriers
-        }
+        result['ftl'] = _transform_historical_segment(ftl)
         result['has_data'] = True
     
-    # LTL
     if ltl:
-        ltl_carriers = []
-        if ltl.get('top_carriers'):
-            for c in ltl['top_carriers']:
-                ltl_carriers.append({
-                    'carrier': c.get('carrier_name'),
-                    'rate_per_km': c.get('avg_carrier_price_per_km'),
-                    'total_price': c.get('avg_carrier_amount'),
-                    'currency': c.get('carrier_currency', 'EUR'),
-                    'order_count': c.get('order_count', 0)
-                })
-        
-        result['ltl'] = {
-            'has_data': True,
-            'avg_rate_per_km': ltl.get('avg_price_per_km', {}).get('carrier'),
-            'avg_amount': ltl.get('total_price', {}).get('carrier'),  # Użyj total_price z API
-            'carriers': ltl_carriers
-        }
+        result['ltl'] = _transform_historical_segment(ltl)
         result['has_data'] = True
     
     return result
 
 
+def aws_route_request(start_coords, end_coords):
+    """
+    Klucz cache i parametry zapytania AWS Location Service dla pary współrzędnych
+    (wspólne dla wersji Flask i ASGI)
+    
+    Returns:
+        (cache_key, url, json, headers)
+    """
+    cache_key = (
+        round(float(start_coords[0]), 5), round(float(start_coords[1]), 5),
+        round(float(end_coords[0]), 5), round(float(end_coords[1]), 5)
+    )
+    url = f"https://routes.geo.{AWS_REGION}.amazonaws.com/routes/v0/calculators/CargoScoutCalculator/calculate/route"
+    payload = {
+        'Origin': {'Position': [start_coords[1], start_coords[0]]},
+        'Destination': {'Position': [end_coords[1], end_coords[0]]},
+        'TravelMode': 'Truck'
+    }
+    headers = {
+        'Content-Type': 'application/json',
+        'X-Amz-Api-Key': AWS_LOCATION_API_KEY
+    }
+    return cache_key, url, payload, headers
+
+
+def distance_result(aws_data):
+    """Odpowiedź /api/calculate-distance z danych AWS"""
+    distance_km = aws_data.get('Summary', {}).get('Distance', 0) / 1000
+    return {
+        'success': True,
+        'distance': round(distance_km, 2),
+        'method': 'aws'
+    }
+
+
 @app.route('/api/calculate-distance', methods=['POST'])
 def calculate_distance():
     """AWS Location Service - obliczanie dystansu"""
@@ -343,31 +682,17 @@ def calculate_distance():
         return jsonify({'success': False, 'error': 'Brak danych lub konfiguracji'}), 400
     
     try:
-        url = f"https://routes.geo.{AWS_REGION}.amazonaws.com/routes/v0/calculators/CargoScoutCalculator/calculate/route"
+        cache_key, url, payload, headers = aws_route_request(start_coords, end_coords)
+        cached = distance_cache.get(cache_key)
+        if cached is not None:
+            return jsonify(cached)
         
-        response = requests.post(
-            url,
-            json={
-                'Origin': {'Position': [start_coords[1], start_coords[0]]},
-                'Destination': {'Position': [end_coords[1], end_coords[0]]},
-                'TravelMode': 'Truck'
-            },
-            headers={
-                'Content-Type': 'application/json',
-                'X-Amz-Api-Key': AWS_LOCATION_API_KEY
-            },
-            timeout=30
-        )
+        response = get_http_session().post(url, json=payload, headers=headers, timeout=30)
         
         if response.status_code == 200:
-            aws_data = response.json()
-            distance_km = aws_data.get('Summary', {}).get('Distance', 0) / 1000
-            
-            return jsonify({
-                'success': True,
-                'distance': round(distance_km, 2),
-                'method': 'aws'
-            })
+            result = distance_result(response.json())
+            distance_cache.set(cache_key, result)
+            return jsonify(result)
         else:
             return jsonify({'success': False, 'error': 'AWS error'}), response.status_code
             
@@ -375,6 +700,147 @@ def calculate_distance():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+def parse_historical_orders_query(args):
+    """
+    Walidacja parametrów /api/historical-orders
+    
+    Returns:
+        ((start, end), kwargs dla query_historical_orders, None)
+        lub (None, None, (treść błędu, status))
+    """
+    normalized_start = normalize_postal_code(args.get('start_location'))
+    normalized_end = normalize_postal_code(args.get('end_location'))
+    
+    if not normalized_start or not normalized_end:
+        return None, None, ({
+            'error': 'Nieprawidłowy format kodów pocztowych',
+            'message': 'Użyj formatu: <KRAJ><CYFRY> np. PL20, DE49'
+        }, 400)
+    
+    sort = args.get('sort', 'date')
+    if sort not in HISTORICAL_ORDERS_SORT_FIELDS:
+        return None, None, ({'error': f"Nieobsługiwane sortowanie '{sort}'",
+                             'message': f"Dostępne: {', '.join(HISTORICAL_ORDERS_SORT_FIELDS)}"}, 400)
+    
+    order_type = args.get('type')
+    if order_type and order_type.upper() not in ('FTL', 'LTL'):
+        return None, None, ({'error': 'Parametr type musi być FTL lub LTL'}, 400)
+    
+    try:
+        limit = int(args.get('limit', HISTORICAL_ORDERS_PAGE_SIZE))
+    except ValueError:
+        return None, None, ({'error': 'Parametr limit musi być liczbą'}, 400)
+    limit = max(1, min(limit, HISTORICAL_ORDERS_MAX_PAGE_SIZE))
+    
+    query = {
+        'sort': sort,
+        'descending': args.get('order', 'desc').lower() != 'asc',
+        'order_type': order_type,
+        'carrier': args.get('carrier'),
+        'date_from': args.get('date_from'),
+        'date_to': args.get('date_to'),
+        'cursor': args.get('cursor'),
+        'limit': limit
+    }
+    return (normalized_start, normalized_end), query, None
+
+
+@app.route('/api/historical-orders', methods=['GET'])
+def historical_orders():
+    """
+    Zlecenia historyczne trasy - paginacja kursorem, sortowanie i filtry
+    
+    Query: start_location, end_location (wymagane), cursor, limit,
+           sort=date|rate_per_km|amount, order=asc|desc,
+           type=FTL|LTL, carrier, date_from, date_to (yyyy-mm-dd)
+    """
+    lane, query, error = parse_historical_orders_query(request.args)
+    if error is not None:
+        body, status = error
+        return jsonify(body), status
+    
+    if not BACKEND_API_URL or not BACKEND_API_KEY:
+        return jsonify({
+            'error': 'Brak konfiguracji Backend API',
+            'message': 'Ustaw API_URL i API_KEY w .env'
+        }), 500
+    
+    backend_data, error = load_lane_pricing(*lane)
+    if error is not None:
+        return error
+    
+    try:
+        page = query_historical_orders(backend_data, **query)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify(page)
+
+
+def _is_admin_request():
+    """Endpointy administracyjne - wymagają X-Admin-Key jeśli ustawiono ADMIN_API_KEY"""
+    if not ADMIN_API_KEY:
+        return True
+    return request.headers.get('X-Admin-Key') == ADMIN_API_KEY
+
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """Statystyki cache wycen i dystansów (hit/miss/eviction) oraz deduplikacji wywołań"""
+    return jsonify({
+        'pricing': pricing_cache.stats(),
+        'distance': distance_cache.stats(),
+        'coalescing': backend_flight.stats()
+    })
+
+
+@app.route('/api/cache/invalidate', methods=['POST'])
+def cache_invalidate():
+    """
+    Ręczne unieważnienie cache wycen
+    Body: {"start_location": "PL20", "end_location": "DE49"} - jedna trasa
+    Pusty body - cały cache wycen
+    {"cache": "distance"} - cały cache dystansów
+    """
+    if not _is_admin_request():
+        return jsonify({'error': 'Brak uprawnień'}), 403
+    
+    body, status = invalidate_caches(request.get_json(silent=True) or {})
+    return jsonify(body), status
+
+
+def invalidate_caches(data):
+    """Unieważnienie według body /api/cache/invalidate - (odpowiedź, status); używa też asgi_app.py"""
+    if data.get('cache') == 'distance':
+        cache, label = distance_cache, 'Cache dystansów'
+        removed = distance_cache.invalidate()
+    else:
+        start = normalize_postal_code(data.get('start_location'))
+        end = normalize_postal_code(data.get('end_location'))
+        
+        if data.get('start_location') or data.get('end_location'):
+            if not start or not end:
+                return {'error': 'Nieprawidłowy format kodów pocztowych'}, 400
+            removed = pricing_cache.invalidate((start, end))
+        else:
+            removed = pricing_cache.invalidate()
+        cache, label = pricing_cache, 'Cache'
+    
+    if removed is None:
+        # SQLiteCache: błąd bazy (np. zablokowana) - nic nie zostało usunięte
+        return {'success': False, 'error': f"Nie udało się unieważnić cache '{cache.name}'",
+                'message': 'Spróbuj ponownie'}, 503
+    
+    print(f"🧹 {label}: usunięto {removed} wpisów")
+    return {'success': True, 'removed': removed}, 200
+
+
+@app.route('/api/http-pool-stats', methods=['GET'])
+def http_pool_stats():
+    """Statystyki puli połączeń HTTP bieżącego workera"""
+    return jsonify(get_pool_stats())
+
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     print(f"🚀 Cargo Scout UI - Port {port}")
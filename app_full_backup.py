@@ -4,8 +4,21 @@ Frontend który tylko normalizuje kody pocztowe i wywołuje Backend API
 """
 from flask import Flask, render_template, jsonify, request
 import os
+import random
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+import numpy as np
+import psycopg2
+from psycopg2.extras import RealDictCursor
 from dotenv import load_dotenv
+from db_pool import PoolTimeout, get_pool
+from freight_api import get_current_offers
+from price_cube import price_cubes
+from region_mapping import UNMAPPED, transeu_to_timocom
 import requests
 
 # Załaduj zmienne środowiskowe
@@ -13,6 +26,20 @@ load_dotenv()
 
 app = Flask(__name__)
 
+# Konfiguracja połączenia z bazą danych
+DB_HOST = os.getenv("POSTGRES_HOST")
+DB_PORT = os.getenv("POSTGRES_PORT")
+DB_USER = os.getenv("POSTGRES_USER")
+DB_NAME = os.getenv("POSTGRES_DB")
+DB_PASSWORD = os.getenv("POSTGRES_PASSWORD")
+
+# Równoległe zapytania do giełd (get_aggregated_exchange_data_by_days) - limit czasu na giełdę w sekundach
+TIMOCOM_QUERY_TIMEOUT = float(os.getenv("TIMOCOM_QUERY_TIMEOUT", "5"))
+TRANSEU_QUERY_TIMEOUT = float(os.getenv("TRANSEU_QUERY_TIMEOUT", "5"))
+EXCHANGE_FETCH_WORKERS = int(os.getenv("EXCHANGE_FETCH_WORKERS", "8"))
+
+_exchange_executor = ThreadPoolExecutor(max_workers=EXCHANGE_FETCH_WORKERS, thread_name_prefix="exchange-fetch")
+
 # Konfiguracja Backend API
 BACKEND_API_URL = os.getenv("API_URL")
 BACKEND_API_KEY = os.getenv("API_KEY")
@@ -185,313 +212,335 @@ def get_aws_route_distance(start_lat: float, start_lng: float, end_lat: float, e
         traceback.print_exc()
         return None
 
-# Załaduj mapowanie Trans.eu -> TimoCom z pliku JSON
+# Mapowanie Trans.eu -> TimoCom skompilowane do tablicy (region_mapping.py)
 _TRANSEU_TO_TIMOCOM_MAPPING = None
 
 def _load_transeu_timocom_mapping():
-    """Ładuje mapowanie Trans.eu -> TimoCom z pliku JSON"""
+    """Ładuje i waliduje mapowanie Trans.eu -> TimoCom (static/data/transeu_to_timocom_mapping.json)"""
     global _TRANSEU_TO_TIMOCOM_MAPPING
     
     if _TRANSEU_TO_TIMOCOM_MAPPING is not None:
         return _TRANSEU_TO_TIMOCOM_MAPPING
     
     try:
-        import json
-        mapping_path = os.path.join(os.path.dirname(__file__), 'static', 'data', 'transeu_to_timocom_mapping.json')
-        with open(mapping_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            # Konwertuj klucze ze string na int
-            _TRANSEU_TO_TIMOCOM_MAPPING = {int(k): v['timocom_id'] for k, v in data.items()}
-        print(f"✓ Załadowano mapowanie Trans.eu -> TimoCom ({len(_TRANSEU_TO_TIMOCOM_MAPPING)} regionów)")
+        _TRANSEU_TO_TIMOCOM_MAPPING = transeu_to_timocom()
+        coverage = _TRANSEU_TO_TIMOCOM_MAPPING.coverage
+        print(f"✓ Załadowano mapowanie Trans.eu -> TimoCom: {coverage.summary()}")
+        if coverage.unmapped:
+            print(f"⚠ Regiony Trans.eu bez regionu TimoCom w promieniu {coverage.max_distance_km:g} km: {coverage.unmapped}")
     except Exception as e:
         print(f"⚠ Nie udało się załadować mapowania Trans.eu -> TimoCom: {e}")
-        _TRANSEU_TO_TIMOCOM_MAPPING = {}
+        return None
     
     return _TRANSEU_TO_TIMOCOM_MAPPING
 
 # Funkcja do mapowania Trans.eu ID na TimoCom ID
-def map_transeu_to_timocom_id(transeu_id: int):
+def map_transeu_to_timocom_id(transeu_id: int) -> Optional[int]:
     """Mapuje Trans.eu region ID na TimoCom region ID
     
-    Używa wygenerowanego pliku mapowania opartego na odległościach geograficznych
+    Używa wygenerowanego pliku mapowania opartego na odległościach geograficznych.
+    None, gdy w promieniu TRANSEU_TIMOCOM_MAX_DISTANCE_KM nie ma regionu TimoCom -
+    ID Trans.eu nie jest ID TimoCom, więc nie jest przekazywane dalej.
     """
     mapping = _load_transeu_timocom_mapping()
-    
-    # Zwróć zmapowane ID lub oryginalne jeśli brak w mapowaniu
-    return mapping.get(transeu_id, transeu_id)
+    return mapping.map_one(transeu_id) if mapping is not None else None
 
-# Funkcja do pobierania danych z TimoCom
-def get_timocom_data(start_region_id: int, end_region_id: int, distance: float, days: int = 7):
-    """Pobiera dane cenowe TimoCom z bazy danych PostgreSQL
-    
-    UWAGA: start_region_id i end_region_id to Trans.eu ID!
-    Funkcja konwertuje je na TimoCom ID przed zapytaniem do bazy.
+def map_transeu_to_timocom_ids(transeu_ids):
+    """Wektorowa wersja map_transeu_to_timocom_id - tablica numpy, UNMAPPED (-1) dla regionów bez odpowiednika"""
+    mapping = _load_transeu_timocom_mapping()
+    if mapping is None:
+        return np.full(len(transeu_ids), UNMAPPED, dtype=np.int64)
+    return mapping.map_many(transeu_ids)
+
+# Okresy (dni) liczone razem dla wyceny - patrz get_aggregated_exchange_data_by_days
+EXCHANGE_DATA_PERIODS = (7, 30, 90)
+
+# Kolumny agregatów TimoCom i Trans.eu: (wyrażenie z miejscem na FILTER, alias)
+TIMOCOM_WINDOW_COLUMNS = (
+    ("ROUND(AVG(o.trailer_avg_price_per_km) {filter}, 4)", "avg_trailer_price"),
+    ("ROUND(AVG(o.vehicle_up_to_3_5_t_avg_price_per_km) {filter}, 4)", "avg_3_5t_price"),
+    ("ROUND(AVG(o.vehicle_up_to_12_t_avg_price_per_km) {filter}, 4)", "avg_12t_price"),
+    ("SUM(o.number_of_offers_total) {filter}", "total_offers"),
+    ("COUNT(DISTINCT o.enlistment_date) {filter}", "days_count"),
+)
+TRANSEU_WINDOW_COLUMNS = (
+    ("ROUND(AVG(o.lorry_avg_price_per_km) {filter}, 4)", "avg_lorry_price"),
+    ("COUNT(DISTINCT o.enlistment_date) {filter}", "days_count"),
+)
+
+
+def _window_query(table: str, columns, periods: List[int]) -> str:
     """
+    Jedno zapytanie dla wszystkich okresów: każdy agregat liczony z
+    FILTER (WHERE enlistment_date >= CURRENT_DATE - N), a WHERE ogranicza skan
+    do najdłuższego okresu - koszt jak pojedyncze zapytanie 90-dniowe.
+    Kolumny wyniku: <alias>_<dni>, np. avg_trailer_price_30
+    """
+    select = ",\n                ".join(
+        expression.format(filter=f"FILTER (WHERE o.enlistment_date >= CURRENT_DATE - {days})") + f" AS {alias}_{days}"
+        for days in periods
+        for expression, alias in columns
+    )
+    return f"""
+            SELECT
+                {select}
+            FROM {table} AS o
+            WHERE o.starting_id = %s
+              AND o.destination_id = %s
+              AND o.enlistment_date >= CURRENT_DATE - {max(periods)};
+        """
+
+
+def _window_result(row, columns, days: int) -> Optional[Dict[str, Any]]:
+    """Wyciąga z wiersza zapytania okienkowego kolumny jednego okresu (bez sufiksu _<dni>)"""
+    if row is None:
+        return None
+    return {alias: row[f"{alias}_{days}"] for _, alias in columns}
+
+
+def _normalize_periods(periods) -> List[int]:
+    return sorted({int(days) for days in periods})
+
+
+def _no_exchange_data(days: int, data_source: str, message: str) -> Dict[str, Any]:
+    return {
+        'has_data': False,
+        'offers': [],
+        'average_rate_per_km': None,
+        'average_total_price': None,
+        'average_offers_per_day': None,
+        'days': days,
+        'data_source': data_source,
+        'message': message
+    }
+
+
+def _timeout_exchange_data(periods: List[int], timeout: Optional[float] = None) -> Dict[int, Dict[str, Any]]:
+    limit = f" ({timeout}s)" if timeout is not None else " (statement_timeout)"
+    return {days: _no_exchange_data(days, 'timeout', f'Przekroczono limit czasu zapytania{limit}') for days in periods}
+
+
+def _unmapped_timocom_data(periods: List[int]) -> Dict[int, Dict[str, Any]]:
+    return {
+        days: _no_exchange_data(days, 'unmapped', 'Brak regionu TimoCom w pobliżu wybranego regionu Trans.eu')
+        for days in periods
+    }
+
+
+def _exchange_offers(base_rate: float, distance: float, offers_per_day) -> List[Dict[str, Any]]:
+    """Oferty dla różnych giełd - BEZ losowania, deterministyczne warianty od base_rate"""
+    exchanges = ['Trans.eu', 'TimoCom']  # Tylko TimoCom i Trans.eu
+    # Każda giełda ma stałą wariancję od base_rate
+    exchange_offsets = {
+        'Trans.eu': -0.02,     # 2 centy taniej
+        'TimoCom': 0.00        # Bazowa cena
+    }
+
+    offers = []
+    for exchange in exchanges:
+        rate_per_km = base_rate + exchange_offsets[exchange]
+        total_price = rate_per_km * distance
+
+        offers.append({
+            'exchange': exchange,
+            'rate_per_km': round(rate_per_km, 2),
+            'total_price': round(total_price, 2),
+            'currency': 'EUR',
+            'date': datetime.now().strftime('%Y-%m-%d'),  # Dzisiejsza data (bez losowania)
+            'offers_per_day': offers_per_day
+        })
+    return offers
+
+
+def _timocom_exchange_data(result, distance: float, days: int, route: str) -> Dict[str, Any]:
+    """Przekształca agregaty TimoCom z bazy na format aplikacji"""
+    if not result or (not result['avg_trailer_price'] and not result['avg_3_5t_price'] and not result['avg_12t_price']):
+        print(f"Brak danych w bazie dla trasy {route} ({days} dni).")
+        return _no_exchange_data(days, 'database', 'Brak danych dla tej trasy w wybranym okresie')
+
+    # Pobierz średnie ceny bezpośrednio z wyniku
+    avg_trailer = float(result['avg_trailer_price']) if result['avg_trailer_price'] else None
+    avg_3_5t = float(result['avg_3_5t_price']) if result['avg_3_5t_price'] else None
+    avg_12t = float(result['avg_12t_price']) if result['avg_12t_price'] else None
+
+    # Użyj najlepszej dostępnej średniej (priorytet: naczepa > 12t > 3.5t)
+    base_rate = avg_trailer or avg_12t or avg_3_5t or 0.50
+
+    # Pobierz faktyczną liczbę ofert z bazy
+    total_offers_sum = int(result['total_offers']) if result['total_offers'] else 0
+
+    # Liczba dni z danymi
+    num_days = int(result['days_count']) if result['days_count'] else 0
+    offers_per_day_estimate = round(total_offers_sum / num_days, 1) if num_days > 0 else 0
+
+    offers = _exchange_offers(base_rate, distance, offers_per_day_estimate)
+
+    # Średnie są teraz deterministyczne (zawsze takie same)
+    avg_rate = sum(o['rate_per_km'] for o in offers) / len(offers)
+    avg_total = sum(o['total_price'] for o in offers) / len(offers)
+    avg_offers_per_day = offers_per_day_estimate  # Nie uśredniaj - to i tak ta sama wartość
+
+    print(f"✓ Pobrano dane TimoCom z bazy ({days} dni): {num_days} dni z danymi, {total_offers_sum} ofert, średnia stawka: {avg_rate:.2f} EUR/km")
+
+    return {
+        'has_data': True,
+        'offers': offers,
+        'average_rate_per_km': round(avg_rate, 2),
+        'average_total_price': round(avg_total, 2),
+        'average_offers_per_day': round(avg_offers_per_day, 1),
+        'days': days,
+        'data_source': 'database_timocom',
+        'records_count': num_days,
+        'total_offers_sum': total_offers_sum
+    }
+
+
+def _transeu_exchange_data(result, distance: float, days: int, route: str) -> Dict[str, Any]:
+    """Przekształca agregaty Trans.eu z bazy na format aplikacji"""
+    if not result or not result['avg_lorry_price']:
+        print(f"Brak danych Trans.eu w bazie dla trasy {route} ({days} dni).")
+        return _no_exchange_data(days, 'database_transeu', 'Brak danych dla tej trasy w wybranym okresie')
+
+    # Pobierz średnią cenę bezpośrednio z wyniku
+    avg_lorry = float(result['avg_lorry_price']) if result['avg_lorry_price'] else None
+    num_days = int(result['days_count']) if result['days_count'] else 0
+
+    # Użyj średniej lorry jako base rate
+    base_rate = avg_lorry or 0.50
+
+    # Trans.eu nie ma danych o liczbie ofert w bazie
+    offers = _exchange_offers(base_rate, distance, None)
+
+    # Średnie są teraz deterministyczne (zawsze takie same)
+    avg_rate = sum(o['rate_per_km'] for o in offers) / len(offers)
+    avg_total = sum(o['total_price'] for o in offers) / len(offers)
+
+    print(f"✓ Pobrano dane Trans.eu z bazy ({days} dni): {num_days} dni z danymi, średnia stawka: {avg_rate:.2f} EUR/km")
+
+    return {
+        'has_data': True,
+        'offers': offers,
+        'average_rate_per_km': round(avg_rate, 2),
+        'average_total_price': round(avg_total, 2),
+        'average_offers_per_day': None,  # Trans.eu nie ma danych o liczbie ofert
+        'days': days,
+        'data_source': 'database_transeu',
+        'records_count': num_days
+    }
+
+
+def _fetch_timocom_windows(conn, start_region_id: int, end_region_id: int, distance: float, periods: List[int]):
+    """Dane TimoCom dla wszystkich okresów jednym zapytaniem; start/end to Trans.eu ID"""
     # Konwertuj Trans.eu ID na TimoCom ID
     timocom_start_id = map_transeu_to_timocom_id(start_region_id)
     timocom_end_id = map_transeu_to_timocom_id(end_region_id)
-    
+    route = f"TimoCom {timocom_start_id} -> {timocom_end_id} (Trans.eu {start_region_id} -> {end_region_id})"
+
     print(f"🔄 Mapowanie: Trans.eu [{start_region_id} -> {end_region_id}] → TimoCom [{timocom_start_id} -> {timocom_end_id}]")
-    
-    conn = _get_db_connection()
-    
-    # Jeśli brak połączenia, zwróć informację o braku danych
-    if not conn:
+    if timocom_start_id is None or timocom_end_id is None:
+        return _unmapped_timocom_data(periods)
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                _window_query("public.offers", TIMOCOM_WINDOW_COLUMNS, periods),
+                (timocom_start_id, timocom_end_id),
+            )
+            row = cur.fetchone()
+    except psycopg2.errors.QueryCanceled:
+        # statement_timeout (_fetch_exchange_pooled) - wolna giełda, nie błąd zapytania
+        print("⏱ TimoCom: zapytanie przerwane po statement_timeout")
+        conn.rollback()
+        return _timeout_exchange_data(periods)
+    except Exception as exc:
+        print(f"Błąd podczas pobierania danych TimoCom z bazy: {exc}")
+        conn.rollback()
         return {
-            'has_data': False,
-            'offers': [],
-            'average_rate_per_km': None,
-            'average_total_price': None,
-            'average_offers_per_day': None,
-            'days': days,
-            'data_source': 'no_connection',
-            'message': 'Brak połączenia z bazą danych'
+            days: _no_exchange_data(days, 'error', f'Błąd zapytania do bazy: {str(exc)}')
+            for days in periods
         }
-    
+
+    return {
+        days: _timocom_exchange_data(_window_result(row, TIMOCOM_WINDOW_COLUMNS, days), distance, days, route)
+        for days in periods
+    }
+
+
+def _fetch_transeu_windows(conn, start_region_id: int, end_region_id: int, distance: float, periods: List[int]):
+    """Dane Trans.eu dla wszystkich okresów jednym zapytaniem (własne ID regionów, bez konwersji)"""
+    print(f"🔄 Trans.eu: Zapytanie dla regionów {start_region_id} -> {end_region_id}")
+    route = f"{start_region_id} -> {end_region_id}"
+
     try:
         with conn.cursor() as cur:
-            # Zapytanie do bazy - agregacja średnich cen dla różnych typów pojazdów
-            # Używamy enlistment_date (format yyyy-mm-dd) do filtrowania po okresie
-            # Zoptymalizowane - agregujemy bezpośrednio bez grupowania po datach
-            
-            query = """
-                SELECT
-                    ROUND(AVG(o.trailer_avg_price_per_km), 4) AS avg_trailer_price,
-                    ROUND(AVG(o.vehicle_up_to_3_5_t_avg_price_per_km), 4) AS avg_3_5t_price,
-                    ROUND(AVG(o.vehicle_up_to_12_t_avg_price_per_km), 4) AS avg_12t_price,
-                    SUM(o.number_of_offers_total) AS total_offers,
-                    COUNT(DISTINCT o.enlistment_date) AS days_count
-                FROM public.offers AS o
-                WHERE o.starting_id = %s
-                  AND o.destination_id = %s
-                  AND o.enlistment_date >= CURRENT_DATE - CAST(%s AS INTEGER);
-            """
-            
-            cur.execute(query, (timocom_start_id, timocom_end_id, days))
-            result = cur.fetchone()
-            
-            if not result or (not result['avg_trailer_price'] and not result['avg_3_5t_price'] and not result['avg_12t_price']):
-                print(f"Brak danych w bazie dla trasy TimoCom {timocom_start_id} -> {timocom_end_id} (Trans.eu {start_region_id} -> {end_region_id}).")
-                return {
-                    'has_data': False,
-                    'offers': [],
-                    'average_rate_per_km': None,
-                    'average_total_price': None,
-                    'average_offers_per_day': None,
-                    'days': days,
-                    'data_source': 'database',
-                    'message': 'Brak danych dla tej trasy w wybranym okresie'
-                }
-            
-            # Konwersja wyników z bazy na format aplikacji
-            # Symulacja ofert dla różnych giełd na podstawie średnich z bazy
-            exchanges = ['Trans.eu', 'TimoCom']  # Tylko TimoCom i Trans.eu
-            offers = []
-            
-            # Pobierz średnie ceny bezpośrednio z wyniku
-            avg_trailer = float(result['avg_trailer_price']) if result['avg_trailer_price'] else None
-            avg_3_5t = float(result['avg_3_5t_price']) if result['avg_3_5t_price'] else None
-            avg_12t = float(result['avg_12t_price']) if result['avg_12t_price'] else None
-            
-            # Użyj najlepszej dostępnej średniej (priorytet: naczepa > 12t > 3.5t)
-            base_rate = avg_trailer or avg_12t or avg_3_5t or 0.50
-            
-            # Pobierz faktyczną liczbę ofert z bazy
-            total_offers_sum = int(result['total_offers']) if result['total_offers'] else 0
-            
-            # Liczba dni z danymi
-            num_days = int(result['days_count']) if result['days_count'] else 0
-            offers_per_day_estimate = round(total_offers_sum / num_days, 1) if num_days > 0 else 0
-            
-            # Generuj oferty dla różnych giełd - BEZ losowania, deterministyczne warianty
-            # Każda giełda ma stałą wariancję od base_rate
-            exchange_offsets = {
-                'Trans.eu': -0.02,     # 2 centy taniej
-                'TimoCom': 0.00        # Bazowa cena
-            }
-            
-            for exchange in exchanges:
-                offset = exchange_offsets[exchange]
-                rate_per_km = base_rate + offset
-                total_price = rate_per_km * distance
-                
-                offers.append({
-                    'exchange': exchange,
-                    'rate_per_km': round(rate_per_km, 2),
-                    'total_price': round(total_price, 2),
-                    'currency': 'EUR',
-                    'date': datetime.now().strftime('%Y-%m-%d'),  # Dzisiejsza data (bez losowania)
-                    'offers_per_day': offers_per_day_estimate
-                })
-            
-            # Średnie są teraz deterministyczne (zawsze takie same)
-            avg_rate = sum(o['rate_per_km'] for o in offers) / len(offers)
-            avg_total = sum(o['total_price'] for o in offers) / len(offers)
-            avg_offers_per_day = offers_per_day_estimate  # Nie uśredniaj - to i tak ta sama wartość
-            
-            print(f"✓ Pobrano dane TimoCom z bazy ({days} dni): {num_days} dni z danymi, {total_offers_sum} ofert, średnia stawka: {avg_rate:.2f} EUR/km")
-            
-            return {
-                'has_data': True,
-                'offers': offers,
-                'average_rate_per_km': round(avg_rate, 2),
-                'average_total_price': round(avg_total, 2),
-                'average_offers_per_day': round(avg_offers_per_day, 1),
-                'days': days,
-                'data_source': 'database_timocom',
-                'records_count': num_days,
-                'total_offers_sum': total_offers_sum
-            }
-            
+            # Trans.eu ma tylko jedną kolumnę cenową i nie ma number_of_offers_total
+            cur.execute(
+                _window_query('public."OffersTransEU"', TRANSEU_WINDOW_COLUMNS, periods),
+                (start_region_id, end_region_id),
+            )
+            row = cur.fetchone()
+    except psycopg2.errors.QueryCanceled:
+        print("⏱ Trans.eu: zapytanie przerwane po statement_timeout")
+        conn.rollback()
+        return _timeout_exchange_data(periods)
     except Exception as exc:
-        print(f"Błąd podczas pobierania danych TimoCom z bazy: {exc}")
+        print(f"Błąd podczas pobierania danych Trans.eu z bazy: {exc}")
+        conn.rollback()
         return {
-            'has_data': False,
-            'offers': [],
-            'average_rate_per_km': None,
-            'average_total_price': None,
-            'average_offers_per_day': None,
-            'days': days,
-            'data_source': 'error',
-            'message': f'Błąd zapytania do bazy: {str(exc)}'
+            days: _no_exchange_data(days, 'error', f'Błąd zapytania do bazy Trans.eu: {str(exc)}')
+            for days in periods
         }
+
+    return {
+        days: _transeu_exchange_data(_window_result(row, TRANSEU_WINDOW_COLUMNS, days), distance, days, route)
+        for days in periods
+    }
+
+
+# Funkcja do pobierania danych z TimoCom
+def get_timocom_data(start_region_id: int, end_region_id: int, distance: float, days: int = 7):
+    """Pobiera dane cenowe TimoCom z bazy danych PostgreSQL
+
+    UWAGA: start_region_id i end_region_id to Trans.eu ID!
+    Funkcja konwertuje je na TimoCom ID przed zapytaniem do bazy.
+    """
+    days = int(days)
+    conn = _get_db_connection()
+
+    # Jeśli brak połączenia, zwróć informację o braku danych
+    if not conn:
+        return _no_exchange_data(days, 'no_connection', 'Brak połączenia z bazą danych')
+
+    try:
+        return _fetch_timocom_windows(conn, start_region_id, end_region_id, distance, [days])[days]
     finally:
         conn.close()
 
+
 # Funkcja do pobierania danych z Trans.eu
 def get_transeu_data(start_region_id: int, end_region_id: int, distance: float, days: int = 7):
     """Pobiera dane cenowe Trans.eu z bazy danych PostgreSQL
-    
+
     Trans.eu używa własnych ID regionów (bez konwersji)
     """
-    print(f"🔄 Trans.eu: Zapytanie dla regionów {start_region_id} -> {end_region_id}")
-    
+    days = int(days)
     conn = _get_db_connection()
-    
+
     # Jeśli brak połączenia, zwróć informację o braku danych
     if not conn:
-        return {
-            'has_data': False,
-            'offers': [],
-            'average_rate_per_km': None,
-            'average_total_price': None,
-            'average_offers_per_day': None,
-            'days': days,
-            'data_source': 'no_connection',
-            'message': 'Brak połączenia z bazą danych'
-        }
-    
+        return _no_exchange_data(days, 'no_connection', 'Brak połączenia z bazą danych')
+
     try:
-        with conn.cursor() as cur:
-            # Zapytanie do bazy Trans.eu - tabela OffersTransEU
-            # Trans.eu ma tylko jedną kolumnę cenową: lorry_avg_price_per_km
-            # UWAGA: Trans.eu nie ma kolumny number_of_offers_total, więc nie liczymy ofert
-            # Używamy enlistment_date (format yyyy-mm-dd) do filtrowania po okresie
-            # Zoptymalizowane - agregujemy bezpośrednio bez grupowania po datach
-            
-            query = """
-                SELECT
-                    ROUND(AVG(o.lorry_avg_price_per_km), 4) AS avg_lorry_price,
-                    COUNT(DISTINCT o.enlistment_date) AS days_count
-                FROM public."OffersTransEU" AS o
-                WHERE o.starting_id = %s
-                  AND o.destination_id = %s
-                  AND o.enlistment_date >= CURRENT_DATE - CAST(%s AS INTEGER);
-            """
-            
-            cur.execute(query, (start_region_id, end_region_id, days))
-            result = cur.fetchone()
-            
-            if not result or not result['avg_lorry_price']:
-                print(f"Brak danych Trans.eu w bazie dla trasy {start_region_id} -> {end_region_id}.")
-                return {
-                    'has_data': False,
-                    'offers': [],
-                    'average_rate_per_km': None,
-                    'average_total_price': None,
-                    'average_offers_per_day': None,
-                    'days': days,
-                    'data_source': 'database_transeu',
-                    'message': 'Brak danych dla tej trasy w wybranym okresie'
-                }
-            
-            # Konwersja wyników z bazy na format aplikacji
-            exchanges = ['Trans.eu', 'TimoCom']  # Tylko TimoCom i Trans.eu
-            offers = []
-            
-            # Pobierz średnią cenę bezpośrednio z wyniku
-            avg_lorry = float(result['avg_lorry_price']) if result['avg_lorry_price'] else None
-            num_days = int(result['days_count']) if result['days_count'] else 0
-            
-            # Użyj średniej lorry jako base rate
-            base_rate = avg_lorry or 0.50
-            
-            # Generuj oferty dla różnych giełd - BEZ losowania, deterministyczne warianty
-            # Każda giełda ma stałą wariancję od base_rate
-            exchange_offsets = {
-                'Trans.eu': -0.02,     # 2 centy taniej
-                'TimoCom': 0.00        # Bazowa cena
-            }
-            
-            for exchange in exchanges:
-                offset = exchange_offsets[exchange]
-                rate_per_km = base_rate + offset
-                total_price = rate_per_km * distance
-                
-                offers.append({
-                    'exchange': exchange,
-                    'rate_per_km': round(rate_per_km, 2),
-                    'total_price': round(total_price, 2),
-                    'currency': 'EUR',
-                    'date': datetime.now().strftime('%Y-%m-%d'),  # Dzisiejsza data (bez losowania)
-                    'offers_per_day': None  # Trans.eu nie ma danych o liczbie ofert w bazie
-                })
-            
-            # Średnie są teraz deterministyczne (zawsze takie same)
-            avg_rate = sum(o['rate_per_km'] for o in offers) / len(offers)
-            avg_total = sum(o['total_price'] for o in offers) / len(offers)
-            
-            print(f"✓ Pobrano dane Trans.eu z bazy ({days} dni): {num_days} dni z danymi, średnia stawka: {avg_rate:.2f} EUR/km")
-            
-            return {
-                'has_data': True,
-                'offers': offers,
-                'average_rate_per_km': round(avg_rate, 2),
-                'average_total_price': round(avg_total, 2),
-                'average_offers_per_day': None,  # Trans.eu nie ma danych o liczbie ofert
-                'days': days,
-                'data_source': 'database_transeu',
-                'records_count': num_days
-            }
-            
-    except Exception as exc:
-        print(f"Błąd podczas pobierania danych Trans.eu z bazy: {exc}")
-        return {
-            'has_data': False,
-            'offers': [],
-            'average_rate_per_km': None,
-            'average_total_price': None,
-            'average_offers_per_day': None,
-            'days': days,
-            'data_source': 'error',
-            'message': f'Błąd zapytania do bazy Trans.eu: {str(exc)}'
-        }
+        return _fetch_transeu_windows(conn, start_region_id, end_region_id, distance, [days])[days]
     finally:
         conn.close()
 
-# Funkcja agregująca dane z różnych giełd
-def get_aggregated_exchange_data(start_region_id: int, end_region_id: int, distance: float, days: int = 7):
-    """Agreguje dane z różnych giełd (TimoCom, Trans.eu, etc.)"""
-    
-    # Pobierz dane z TimoCom
-    timocom_data = get_timocom_data(start_region_id, end_region_id, distance, days)
-    
-    # Pobierz dane z Trans.eu
-    transeu_data = get_transeu_data(start_region_id, end_region_id, distance, days)
-    
+
+def _merge_exchange_data(timocom_data: Dict[str, Any], transeu_data: Dict[str, Any], days: int) -> Dict[str, Any]:
+    """Łączy dane TimoCom i Trans.eu jednego okresu"""
     # Agreguj oferty z różnych źródeł
     all_offers = []
-    
+
     # Dodaj oferty TimoCom jeśli są dostępne
     if timocom_data['has_data']:
         # Filtruj tylko TimoCom z ofert i dodaj total_offers_sum
@@ -512,7 +561,7 @@ def get_aggregated_exchange_data(start_region_id: int, end_region_id: int, dista
             'total_offers_sum': 0,
             'records_count': 0
         })
-    
+
     # Dodaj oferty Trans.eu jeśli są dostępne
     if transeu_data['has_data']:
         transeu_offers = [o for o in transeu_data['offers'] if o['exchange'] == 'Trans.eu']
@@ -533,32 +582,32 @@ def get_aggregated_exchange_data(start_region_id: int, end_region_id: int, dista
             'total_offers_sum': 0,
             'records_count': 0
         })
-    
+
     # Agregacja danych - priorytet dla danych, które faktycznie istnieją
     has_any_data = timocom_data['has_data'] or transeu_data['has_data']
-    
+
     if has_any_data:
         # Oblicz średnie z dostępnych źródeł
         rates = []
         totals = []
         offers_per_day = []
-        
+
         if timocom_data['has_data']:
             rates.append(timocom_data['average_rate_per_km'])
             totals.append(timocom_data['average_total_price'])
             if timocom_data['average_offers_per_day'] is not None:
                 offers_per_day.append(timocom_data['average_offers_per_day'])
-        
+
         if transeu_data['has_data']:
             rates.append(transeu_data['average_rate_per_km'])
             totals.append(transeu_data['average_total_price'])
             if transeu_data['average_offers_per_day'] is not None:
                 offers_per_day.append(transeu_data['average_offers_per_day'])
-        
+
         avg_rate = sum(rates) / len(rates) if rates else None
         avg_total = sum(totals) / len(totals) if totals else None
         avg_offers = sum(offers_per_day) / len(offers_per_day) if offers_per_day else None
-        
+
         # Określ źródło danych
         if timocom_data['has_data'] and transeu_data['has_data']:
             data_source = 'both'
@@ -566,11 +615,11 @@ def get_aggregated_exchange_data(start_region_id: int, end_region_id: int, dista
             data_source = 'timocom_only'
         else:
             data_source = 'transeu_only'
-        
+
         # Pobierz total_offers_sum i records_count z TimoCom (Trans.eu nie ma tych danych)
         total_offers_sum = timocom_data.get('total_offers_sum', 0) if timocom_data['has_data'] else 0
         records_count = timocom_data.get('records_count', 0) if timocom_data['has_data'] else 0
-        
+
         return {
             'has_data': True,
             'offers': all_offers,
@@ -597,6 +646,99 @@ def get_aggregated_exchange_data(start_region_id: int, end_region_id: int, dista
             'message': 'Brak danych dla tej trasy w wybranym okresie'
         }
 
+
+def _fetch_exchange_pooled(fetch, timeout: float, start_region_id: int, end_region_id: int, distance: float, periods: List[int]):
+    """Fetcher jednej giełdy na własnym połączeniu z puli, zapytanie przerywane po timeout sekundach"""
+    pool = get_pool()
+    if pool is None:
+        return {days: _no_exchange_data(days, 'no_connection', 'Brak połączenia z bazą danych') for days in periods}
+
+    with pool.connection(timeout=timeout) as conn:
+        with conn.cursor() as cur:
+            # SET LOCAL - obowiązuje do końca transakcji, pula cofa ją przy zwrocie połączenia
+            cur.execute("SET LOCAL statement_timeout = %s;", (int(timeout * 1000),))
+        return fetch(conn, start_region_id, end_region_id, distance, periods)
+
+
+def _exchange_result(name: str, future, timeout: float, started: float, periods: List[int]):
+    """Wynik fetchera albo wpisy has_data: False - wolna lub niedziałająca giełda nie blokuje drugiej"""
+    try:
+        return future.result(timeout=max(0.0, started + timeout - time.monotonic()))
+    except FutureTimeout:
+        print(f"⏱ {name}: przekroczono limit {timeout}s - zwracam brak danych")
+        return _timeout_exchange_data(periods, timeout)
+    except PoolTimeout as exc:
+        print(f"⏱ {name}: brak wolnego połączenia w puli: {exc}")
+        return {days: _no_exchange_data(days, 'no_connection', 'Brak wolnego połączenia z bazą danych') for days in periods}
+    except Exception as exc:
+        print(f"Błąd podczas pobierania danych {name} z bazy: {exc}")
+        return {days: _no_exchange_data(days, 'error', f'Błąd zapytania do bazy: {str(exc)}') for days in periods}
+
+
+def _exchange_from_cube(exchange: str, start_region_id: int, end_region_id: int, distance: float, periods: List[int],
+                        to_exchange_data, route: str):
+    """Dane giełdy z kostki cen (price_cube.py) albo None, gdy kostka nie obejmuje któregoś okresu"""
+    cube = price_cubes.get(exchange)
+    results = {}
+    for days in periods:
+        result = cube.lookup(start_region_id, end_region_id, days)
+        if result is None:
+            return None
+        results[days] = to_exchange_data(result, distance, days, route)
+    return results
+
+
+def get_aggregated_exchange_data_by_days(start_region_id: int, end_region_id: int, distance: float, periods):
+    """Agreguje dane z giełd dla wielu okresów naraz
+
+    Po jednym zapytaniu na giełdę (FILTER per okres) zamiast osobnego połączenia
+    i skanu dla każdej giełdy i każdego okresu. TimoCom i Trans.eu liczone
+    równolegle, każda na własnym połączeniu z puli i z własnym limitem czasu
+    (TIMOCOM_QUERY_TIMEOUT / TRANSEU_QUERY_TIMEOUT) - czas wyceny to wolniejsza
+    z giełd, a nie suma obu. Okna z kostki cen (price_cube.py, domyślnie 7/30/90
+    dni) czytane są z pamięci bez zapytania do bazy.
+    Zwraca słownik {dni: dane jak z get_aggregated_exchange_data}
+    """
+    periods = _normalize_periods(periods)
+    price_cubes.ensure_started()
+    timocom_start_id = map_transeu_to_timocom_id(start_region_id)
+    timocom_end_id = map_transeu_to_timocom_id(end_region_id)
+    by_days = {
+        'TimoCom': _exchange_from_cube(
+            'timocom', timocom_start_id, timocom_end_id, distance, periods, _timocom_exchange_data,
+            f"TimoCom {timocom_start_id} -> {timocom_end_id} (kostka cen)",
+        ) if timocom_start_id is not None and timocom_end_id is not None else _unmapped_timocom_data(periods),
+        'Trans.eu': _exchange_from_cube(
+            'transeu', start_region_id, end_region_id, distance, periods, _transeu_exchange_data,
+            f"{start_region_id} -> {end_region_id} (kostka cen)",
+        ),
+    }
+
+    # Okresy spoza kostki (albo kostka jeszcze niezaładowana) - zapytanie do bazy
+    started = time.monotonic()
+    futures = {
+        name: _exchange_executor.submit(
+            _fetch_exchange_pooled, fetch, timeout, start_region_id, end_region_id, distance, periods
+        )
+        for name, fetch, timeout in (
+            ('TimoCom', _fetch_timocom_windows, TIMOCOM_QUERY_TIMEOUT),
+            ('Trans.eu', _fetch_transeu_windows, TRANSEU_QUERY_TIMEOUT),
+        )
+        if by_days[name] is None
+    }
+    for name, timeout in (('TimoCom', TIMOCOM_QUERY_TIMEOUT), ('Trans.eu', TRANSEU_QUERY_TIMEOUT)):
+        if name in futures:
+            by_days[name] = _exchange_result(name, futures[name], timeout, started, periods)
+    timocom_by_days, transeu_by_days = by_days['TimoCom'], by_days['Trans.eu']
+
+    return {days: _merge_exchange_data(timocom_by_days[days], transeu_by_days[days], days) for days in periods}
+
+
+# Funkcja agregująca dane z różnych giełd
+def get_aggregated_exchange_data(start_region_id: int, end_region_id: int, distance: float, days: int = 7):
+    """Agreguje dane z różnych giełd (TimoCom, Trans.eu, etc.)"""
+    return get_aggregated_exchange_data_by_days(start_region_id, end_region_id, distance, [days])[int(days)]
+
 # Funkcja do generowania przykładowych współrzędnych trasy
 def generate_route_coordinates(start_location, end_location):
     """Generuje przykładowe współrzędne trasy między lokalizacjami"""
@@ -856,10 +998,14 @@ def calculate_route():
     # Jeśli mamy ID regionów, użyj faktycznych danych z bazy, w przeciwnym razie losowe
     if start_region_id and end_region_id:
         print(f"📊 Pobieranie danych z bazy dla regionów: {start_region_id} -> {end_region_id}")
-        exchange_data = get_aggregated_exchange_data(start_region_id, end_region_id, distance, days)
-        exchange_data_7 = get_aggregated_exchange_data(start_region_id, end_region_id, distance, 7)
-        exchange_data_30 = get_aggregated_exchange_data(start_region_id, end_region_id, distance, 30)
-        exchange_data_90 = get_aggregated_exchange_data(start_region_id, end_region_id, distance, 90)
+        # Wszystkie okresy naraz: jedno połączenie, jedno zapytanie na giełdę
+        exchange_by_days = get_aggregated_exchange_data_by_days(
+            start_region_id, end_region_id, distance, (days,) + EXCHANGE_DATA_PERIODS
+        )
+        exchange_data = exchange_by_days[int(days)]
+        exchange_data_7 = exchange_by_days[7]
+        exchange_data_30 = exchange_by_days[30]
+        exchange_data_90 = exchange_by_days[90]
     else:
         print("⚠ Brak ID regionów - używam losowych danych")
         exchange_data = generate_exchange_data(distance, days)
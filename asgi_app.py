@@ -0,0 +1,368 @@
+"""
+Cargo Scout Wycena - wersja ASGI (asyncio) frontendu
+
+Te same trasy i format odpowiedzi co app.py, ale wywołania Backend API i AWS
+idą przez nieblokujący klient (httpx.AsyncClient). Czekająca wycena nie
+zajmuje wątku workera, więc jeden proces obsłuży setki równoczesnych wycen
+przy wolnym backendzie.
+
+Logika (normalizacja, przekształcenia, cache, paginacja) pochodzi z app.py -
+tu jest tylko warstwa HTTP. Pliki statyczne idą z tych samych wariantów
+brotli / gzip co w app.py (compression.py, ETag i 304), a cache SQLite
+(czekający na blokadę pliku) jest wywoływany w puli wątków, nie w pętli zdarzeń.
+
+Uruchomienie:
+    uvicorn asgi_app:app --host 0.0.0.0 --port 8000
+    gunicorn asgi_app:app -k uvicorn.workers.UvicornWorker
+"""
+import contextlib
+import os
+import time
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
+from fastapi.staticfiles import StaticFiles
+from flask import render_template
+
+import app as wsgi
+from compression import COMPRESSION_MIN_SIZE, negotiate_encoding, not_modified, static_variant
+from singleflight import AsyncSingleFlight
+
+# Limit połączeń do Backend API / AWS na proces (ile wycen może czekać naraz)
+ASGI_HTTP_MAX_CONNECTIONS = int(os.getenv("ASGI_HTTP_MAX_CONNECTIONS", "500"))
+ASGI_HTTP_MAX_KEEPALIVE = int(os.getenv("ASGI_HTTP_MAX_KEEPALIVE", "50"))
+BACKEND_TIMEOUT = 30
+
+backend_flight = AsyncSingleFlight('backend_pricing')
+http_client = None
+
+
+@contextlib.asynccontextmanager
+async def lifespan(_):
+    global http_client
+    http_client = httpx.AsyncClient(
+        timeout=BACKEND_TIMEOUT,
+        limits=httpx.Limits(
+            max_connections=ASGI_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=ASGI_HTTP_MAX_KEEPALIVE,
+        ),
+    )
+    print(f"🔌 httpx: max {ASGI_HTTP_MAX_CONNECTIONS} połączeń, keep-alive {ASGI_HTTP_MAX_KEEPALIVE}")
+    try:
+        yield
+    finally:
+        await http_client.aclose()
+
+
+app = FastAPI(lifespan=lifespan, docs_url=None, redoc_url=None, openapi_url=None)
+# Odpowiedzi z Content-Encoding (pliki statyczne) GZipMiddleware przepuszcza bez zmian
+app.add_middleware(GZipMiddleware, minimum_size=COMPRESSION_MIN_SIZE)
+# Pliki, których compression.py nie trzyma w pamięci (obrazki itp.)
+static_files = StaticFiles(directory=wsgi.app.static_folder)
+
+# Szablon nie zależy od żądania - renderujemy raz
+with wsgi.app.test_request_context('/'):
+    INDEX_HTML = render_template('index.html')
+
+
+def json_response(obj, status_code=200, headers=None):
+    """JSON w dokładnie tym samym formacie co jsonify() w app.py"""
+    with wsgi.app.app_context():
+        body = wsgi.app.json.response(obj).get_data()
+    return Response(body, status_code=status_code, media_type='application/json', headers=headers)
+
+
+async def cache_call(cache, method, *args):
+    """Metoda cache - SQLiteCache w puli wątków (może czekać na blokadę pliku), TTLCache od razu"""
+    if cache.backend == 'sqlite':
+        return await run_in_threadpool(getattr(cache, method), *args)
+    return getattr(cache, method)(*args)
+
+
+async def read_json(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _is_admin_request(request):
+    if not wsgi.ADMIN_API_KEY:
+        return True
+    return request.headers.get('X-Admin-Key') == wsgi.ADMIN_API_KEY
+
+
+def _debug_requested(request):
+    if wsgi.DEBUG_API_RESPONSE:
+        return True
+    if request.headers.get('X-Debug', '').lower() in ('1', 'true'):
+        return _is_admin_request(request)
+    return False
+
+
+def _stream_format(request):
+    stream = request.query_params.get('stream', '').lower()
+    if stream in ('1', 'true', 'json'):
+        return 'json'
+    if stream == 'ndjson' or 'application/x-ndjson' in request.headers.get('Accept', ''):
+        return 'ndjson'
+    return None
+
+
+async def fetch_backend_pricing(normalized_start, normalized_end):
+    """Odpowiednik app.fetch_backend_pricing na httpx.AsyncClient"""
+    print(f"🌐 Backend API: {normalized_start} -> {normalized_end}")
+
+    response = await http_client.post(
+        wsgi.BACKEND_API_URL,
+        json={
+            'start_postal_code': normalized_start,
+            'end_postal_code': normalized_end
+        },
+        headers={'X-API-Key': wsgi.BACKEND_API_KEY},
+    )
+
+    print(f"📥 Status: {response.status_code}")
+
+    if response.status_code != 200:
+        return response.status_code, response.text
+
+    api_data = response.json()
+    if api_data.get('success'):
+        await cache_call(wsgi.pricing_cache, 'set', (normalized_start, normalized_end), api_data.get('data', {}))
+    return 200, api_data
+
+
+async def load_lane_pricing(normalized_start, normalized_end):
+    """
+    Dane Backend API dla trasy - z cache albo z jednego (współdzielonego) wywołania
+
+    Returns:
+        (backend_data, None) lub (None, odpowiedź błędu)
+    """
+    cache_key = (normalized_start, normalized_end)
+    backend_data = await cache_call(wsgi.pricing_cache, 'get', cache_key)
+    if backend_data is not None:
+        print(f"⚡ Cache: {normalized_start} -> {normalized_end}")
+        return backend_data, None
+
+    try:
+        (status_code, payload), shared = await backend_flight.do(
+            cache_key, lambda: fetch_backend_pricing(normalized_start, normalized_end)
+        )
+        if shared:
+            print(f"🔗 Współdzielona odpowiedź: {normalized_start} -> {normalized_end}")
+
+        backend_data, error = wsgi.pricing_result(status_code, payload)
+        if error is not None:
+            body, status = error
+            return None, json_response(body, status)
+        return backend_data, None
+
+    except httpx.TimeoutException:
+        return None, json_response({'error': 'Backend API timeout'}, 504)
+    except httpx.NetworkError:
+        return None, json_response({'error': f'Nie można połączyć z {wsgi.BACKEND_API_URL}'}, 503)
+    except Exception as e:
+        print(f"❌ {e}")
+        return None, json_response({'error': str(e)}, 500)
+
+
+def quote_response(request, data, backend_data):
+    """Odpowiednik app.quote_response - te same nagłówki pomiarowe"""
+    include_debug = _debug_requested(request)
+    stream_format = _stream_format(request)
+
+    started = time.perf_counter()
+    result = wsgi.build_quote_response(
+        data, backend_data,
+        include_orders=stream_format is None,
+        include_debug=include_debug
+    )
+    built = time.perf_counter()
+
+    if stream_format is not None:
+        media_type = 'application/x-ndjson' if stream_format == 'ndjson' else 'application/json'
+        return StreamingResponse(
+            wsgi.iter_quote_stream(result, backend_data, stream_format),
+            media_type=media_type,
+            headers={'Server-Timing': f"build;dur={(built - started) * 1000:.2f}"},
+        )
+
+    response = json_response(result)
+    serialized = time.perf_counter()
+    payload_bytes = len(response.body)
+
+    response.headers['Server-Timing'] = (
+        f"build;dur={(built - started) * 1000:.2f}, serialize;dur={(serialized - built) * 1000:.2f}"
+    )
+    response.headers['X-Payload-Bytes'] = str(payload_bytes)
+    if include_debug:
+        response.headers['X-Backend-Payload-Bytes'] = str(len(wsgi.app.json.dumps(backend_data).encode('utf-8')))
+
+    print(f"📤 Odpowiedź: {payload_bytes} B, serializacja {(serialized - built) * 1000:.2f} ms"
+          f"{' (debug)' if include_debug else ''}")
+    return response
+
+
+def backend_config_error():
+    if not wsgi.BACKEND_API_URL or not wsgi.BACKEND_API_KEY:
+        return json_response({
+            'error': 'Brak konfiguracji Backend API',
+            'message': 'Ustaw API_URL i API_KEY w .env'
+        }, 500)
+    return None
+
+
+@app.get('/static/{filename:path}')
+async def static(request: Request, filename: str):
+    """Plik statyczny - wariant brotli / gzip wg Accept-Encoding, ETag i 304 jak w app.py"""
+    entry = wsgi.static_precompressor.get(filename) if wsgi.static_precompressor else None
+    if entry is None:
+        return await static_files.get_response(filename, request.scope)
+
+    encoding = negotiate_encoding(request.headers.get('Accept-Encoding', '')) if len(entry['variants']) > 1 else None
+    body, headers = static_variant(entry, filename, encoding)
+    if not_modified(request.headers.get('If-None-Match'), headers['ETag']):
+        return Response(status_code=304, headers={
+            key: value for key, value in headers.items() if key in ('ETag', 'Cache-Control', 'Vary')
+        })
+    return Response(body, headers=headers)
+
+
+@app.get('/', response_class=HTMLResponse)
+async def index():
+    """Strona główna"""
+    return HTMLResponse(INDEX_HTML)
+
+
+@app.post('/api/calculate')
+async def calculate_route(request: Request):
+    """Proxy do Backend API - patrz app.calculate_route"""
+    data = await read_json(request)
+    if data is None:
+        return json_response({'error': 'Nieprawidłowe dane JSON'}, 400)
+
+    start_location = data.get('start_location', '')
+    end_location = data.get('end_location', '')
+
+    normalized_start = wsgi.normalize_postal_code(start_location)
+    normalized_end = wsgi.normalize_postal_code(end_location)
+
+    print(f"📝 {start_location} -> {normalized_start}, {end_location} -> {normalized_end}")
+
+    if not normalized_start or not normalized_end:
+        return json_response({
+            'error': 'Nieprawidłowy format kodów pocztowych',
+            'message': 'Użyj formatu: <KRAJ><CYFRY> np. PL20, DE49'
+        }, 400)
+
+    error = backend_config_error()
+    if error is not None:
+        return error
+
+    backend_data, error = await load_lane_pricing(normalized_start, normalized_end)
+    if error is not None:
+        return error
+
+    try:
+        return quote_response(request, data, backend_data)
+    except Exception as e:
+        print(f"❌ {e}")
+        return json_response({'error': str(e)}, 500)
+
+
+@app.post('/api/calculate-distance')
+async def calculate_distance(request: Request):
+    """AWS Location Service - obliczanie dystansu"""
+    data = await read_json(request) or {}
+    start_coords = data.get('start_coords')
+    end_coords = data.get('end_coords')
+
+    if not start_coords or not end_coords or not wsgi.AWS_LOCATION_API_KEY:
+        return json_response({'success': False, 'error': 'Brak danych lub konfiguracji'}, 400)
+
+    try:
+        cache_key, url, payload, headers = wsgi.aws_route_request(start_coords, end_coords)
+        cached = await cache_call(wsgi.distance_cache, 'get', cache_key)
+        if cached is not None:
+            return json_response(cached)
+
+        response = await http_client.post(url, json=payload, headers=headers)
+
+        if response.status_code == 200:
+            result = wsgi.distance_result(response.json())
+            await cache_call(wsgi.distance_cache, 'set', cache_key, result)
+            return json_response(result)
+        return json_response({'success': False, 'error': 'AWS error'}, response.status_code)
+
+    except Exception as e:
+        return json_response({'success': False, 'error': str(e)}, 500)
+
+
+@app.get('/api/historical-orders')
+async def historical_orders(request: Request):
+    """Zlecenia historyczne trasy - patrz app.historical_orders"""
+    lane, query, error = wsgi.parse_historical_orders_query(request.query_params)
+    if error is not None:
+        body, status = error
+        return json_response(body, status)
+
+    error = backend_config_error()
+    if error is not None:
+        return error
+
+    backend_data, error = await load_lane_pricing(*lane)
+    if error is not None:
+        return error
+
+    try:
+        page = wsgi.query_historical_orders(backend_data, **query)
+    except ValueError as e:
+        return json_response({'error': str(e)}, 400)
+
+    return json_response(page)
+
+
+@app.get('/api/cache/stats')
+async def cache_stats():
+    """Statystyki cache wycen i dystansów oraz deduplikacji wywołań"""
+    return json_response({
+        'pricing': await cache_call(wsgi.pricing_cache, 'stats'),
+        'distance': await cache_call(wsgi.distance_cache, 'stats'),
+        'coalescing': backend_flight.stats(),
+    })
+
+
+@app.post('/api/cache/invalidate')
+async def cache_invalidate(request: Request):
+    """Ręczne unieważnienie cache - body jak w app.cache_invalidate"""
+    if not _is_admin_request(request):
+        return json_response({'error': 'Brak uprawnień'}, 403)
+
+    data = await read_json(request) or {}
+    body, status = await run_in_threadpool(wsgi.invalidate_caches, data)
+    return json_response(body, status)
+
+
+@app.get('/api/http-pool-stats')
+async def http_pool_stats():
+    """Statystyki puli połączeń httpx bieżącego workera (odpowiednik app.http_pool_stats)"""
+    # Pula httpcore pod AsyncClient - bez publicznego API, więc ostrożnie
+    pool = getattr(getattr(http_client, '_transport', None), '_pool', None)
+    connections = list(getattr(pool, 'connections', []))
+    idle = sum(1 for connection in connections if connection.is_idle())
+    return json_response({
+        'pid': os.getpid(),
+        'config': {
+            'max_connections': ASGI_HTTP_MAX_CONNECTIONS,
+            'max_keepalive_connections': ASGI_HTTP_MAX_KEEPALIVE,
+            'timeout': BACKEND_TIMEOUT,
+        },
+        'totals': {'in_use': len(connections) - idle, 'idle': idle, 'connections': len(connections)},
+        'connections': [connection.info() for connection in connections],
+    })
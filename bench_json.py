@@ -0,0 +1,71 @@
+"""
+Benchmark serializacji odpowiedzi - stdlib json vs orjson (json_provider.py)
+
+Bez argumentów używa payloadów o kształcie odpowiedzi /api/calculate
+(zbudowanych przez build_quote_response z danych jak z Backend API).
+Można podać zapisane odpowiedzi, np.:
+    curl -s -X POST localhost:5000/api/calculate -H 'X-Debug: 1' ... > quote.json
+    python bench_json.py quote.json
+"""
+import contextlib
+import io
+import json
+import sys
+import timeit
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import app
+    from bench_quote_response import make_backend_data
+    from json_provider import OrjsonProvider, orjson
+
+from flask.json.provider import DefaultJSONProvider
+
+
+def sample_payloads():
+    """Odpowiedzi /api/calculate: typowa, z debug (_api_response) i z dużą historią"""
+    request_data = {'start_location': 'PL20-123', 'end_location': 'DE49876',
+                    'start_coords': [51.25, 22.57], 'end_coords': [52.27, 8.05]}
+    payloads = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        backend = make_backend_data(carriers=10, orders=200)
+        payloads['typowa (1. strona zleceń)'] = app.build_quote_response(request_data, backend)
+        payloads['debug (_api_response)'] = app.build_quote_response(request_data, backend, include_debug=True)
+        big = make_backend_data(carriers=50, orders=5000)
+        result = app.build_quote_response(request_data, big, include_orders=False)
+        result['historical_orders'] = list(app.iter_historical_orders(big))
+        payloads['pełna historia (5000 zleceń)'] = result
+    return payloads
+
+
+def load_payloads(paths):
+    payloads = {}
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            payloads[path] = json.load(f)
+    return payloads
+
+
+def main():
+    payloads = load_payloads(sys.argv[1:]) if len(sys.argv) > 1 else sample_payloads()
+    providers = {'stdlib': DefaultJSONProvider(app.app)}
+    if orjson is not None:
+        providers['orjson'] = OrjsonProvider(app.app)
+    else:
+        print("⚠ orjson nie jest zainstalowany - tylko stdlib")
+
+    with app.app.app_context():
+        for name, payload in payloads.items():
+            size = len(providers['stdlib'].dumps(payload, separators=(',', ':')))
+            print(f"\n{name}: {size / 1024:.1f} KiB")
+            timings = {}
+            for label, provider in providers.items():
+                number = 50
+                seconds = min(timeit.repeat(lambda: provider.response(payload), number=number, repeat=5)) / number
+                timings[label] = seconds
+                print(f"  {label:8} {seconds * 1000:8.3f} ms")
+            if 'orjson' in timings:
+                print(f"  orjson szybszy x{timings['stdlib'] / timings['orjson']:.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Micro-benchmark budowania odpowiedzi /api/calculate
+
+Porównuje poprzedni sposób (transform_to_ui_format x4, transform_historical x4)
+z build_period_views (każdy okres liczony raz) na dużym payloadzie `pricing`.
+
+Uruchomienie: python bench_quote_response.py [liczba_przewoźników] [liczba_zleceń]
+"""
+import contextlib
+import io
+import sys
+import timeit
+import tracemalloc
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import app
+
+
+def make_backend_data(carriers=500, orders=2000):
+    """Payload o kształcie odpowiedzi Backend API (patrz API_DOCUMENTATION.md)"""
+    def period(scale):
+        return {
+            'avg_price_per_km': {'3_5t': 0.71 * scale, '12t': 0.93 * scale, 'trailer': 1.12 * scale},
+            'total_price': {'3_5t': 610.0 * scale, '12t': 790.0 * scale, 'trailer': 950.0 * scale},
+            'offers_by_vehicle_type': {'3_5t': 120, '12t': 340, 'trailer': 785},
+            'total_offers': 1245,
+            'days_with_data': 28,
+        }
+
+    def segment(kind):
+        return {
+            'avg_price_per_km': {'client': 0.95, 'carrier': 0.85},
+            'total_price': {'client': 810.0, 'carrier': 720.0},
+            'total_orders': carriers * 3,
+            'top_carriers': [
+                {
+                    'carrier_name': f'{kind} Przewoźnik {i} Sp. z o.o.',
+                    'avg_carrier_price_per_km': 0.8 + (i % 30) / 100,
+                    'avg_carrier_amount': 700.0 + i,
+                    'carrier_currency': 'EUR',
+                    'order_count': 1 + i % 17,
+                }
+                for i in range(carriers)
+            ],
+        }
+
+    return {
+        'route_distance': {'distance_km': 850.4},
+        'pricing': {
+            'timocom': {'7d': period(1.02), '30d': period(1.0), '90d': period(0.97)},
+            'transeu': {
+                '7d': {'avg_price_per_km': {'lorry': 0.88}, 'total_offers': 2100},
+                '30d': {'avg_price_per_km': {'lorry': 0.87}, 'total_offers': 9240},
+                '90d': {'avg_price_per_km': {'lorry': 0.86}, 'total_offers': 25110},
+            },
+            'historical': {
+                '180d': {
+                    'FTL': segment('FTL'),
+                    'LTL': segment('LTL'),
+                    'orders': [
+                        {
+                            'order_date': f'2025-{1 + i % 12:02d}-{1 + i % 28:02d}T08:00:00',
+                            'carrier_name': f'Przewoźnik {i % 50}',
+                            'order_type': 'FTL' if i % 3 else 'LTL',
+                            'cargo_type': 'palety',
+                            'carrier_price_per_km': 0.8 + (i % 40) / 100,
+                            'carrier_amount': 650.0 + i % 300,
+                            'carrier_currency': 'EUR',
+                            'route_distance': 850,
+                        }
+                        for i in range(orders)
+                    ],
+                }
+            },
+        },
+    }
+
+
+def legacy_periods(pricing, distance):
+    """Poprzedni wzorzec: osobne wywołanie dla każdego klucza odpowiedzi"""
+    return {
+        'exchange_rates': app.transform_to_ui_format(pricing, distance, 30),
+        'exchange_rates_by_days': {
+            '7': app.transform_to_ui_format(pricing, distance, 7),
+            '30': app.transform_to_ui_format(pricing, distance, 30),
+            '90': app.transform_to_ui_format(pricing, distance, 90),
+        },
+        'historical_rates': app.transform_historical(pricing),
+        'historical_rates_by_days': {
+            '7': app.transform_historical(pricing),
+            '30': app.transform_historical(pricing),
+            '90': app.transform_historical(pricing),
+        },
+    }
+
+
+def measure(label, fn, number):
+    seconds = min(timeit.repeat(fn, number=number, repeat=5)) / number
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{label:28} {seconds * 1e6:10.1f} µs/req   peak alloc {peak / 1024:8.1f} KiB")
+    return seconds, peak
+
+
+def main():
+    carriers = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    orders = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    backend_data = make_backend_data(carriers, orders)
+    pricing = backend_data['pricing']
+    distance = backend_data['route_distance']['distance_km']
+    request_data = {'start_location': 'PL20', 'end_location': 'DE49'}
+
+    assert legacy_periods(pricing, distance) == app.build_period_views(pricing, distance)
+
+    print(f"Payload: {carriers} przewoźników / segment, {orders} zleceń")
+    legacy_t, legacy_mem = measure("okresy: poprzednio", lambda: legacy_periods(pricing, distance), 200)
+    new_t, new_mem = measure("okresy: jeden przebieg", lambda: app.build_period_views(pricing, distance), 200)
+    print(f"{'':28} CPU x{legacy_t / new_t:.2f} mniej, alokacje x{legacy_mem / new_mem:.2f} mniej")
+
+    def full_response():
+        # build_quote_response loguje liczbę zleceń - wycisz wyjście
+        with contextlib.redirect_stdout(io.StringIO()):
+            app.build_quote_response(request_data, backend_data)
+
+    measure("build_quote_response", full_response, 20)
+
+
+if __name__ == '__main__':
+    main()
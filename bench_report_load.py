@@ -0,0 +1,139 @@
+"""
+Load test for POST /route-general-report - psycopg2 (threadpool) vs asyncpg.
+
+Starts the service under uvicorn once per DB_DRIVER against the PostgreSQL
+configured in POSTGRES_*, fires requests at a fixed concurrency and prints
+throughput and latency percentiles.
+
+Usage:
+    python bench_report_load.py [--service "main 1"] [--concurrency 200]
+                                [--requests 5000] [--drivers psycopg2,asyncpg]
+                                [--start-id 1 --destination-id 2]
+    python bench_report_load.py --url http://127.0.0.1:8000   # already running service
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+
+import httpx
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(url: str, proc: subprocess.Popen, timeout: float = 20) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Service exited with code {proc.returncode}")
+        try:
+            if httpx.get(f"{url}/health", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Service at {url} did not become ready")
+
+
+async def run_load(url: str, payload: dict, concurrency: int, total: int) -> dict:
+    latencies = []
+    statuses = Counter()
+    issued = 0
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=60, limits=limits) as client:
+        # Warm-up: open the pool and the first DB connections
+        await asyncio.gather(*(client.post("/route-general-report", json=payload) for _ in range(min(concurrency, 20))))
+
+        async def worker():
+            nonlocal issued
+            while issued < total:
+                issued += 1
+                started = time.perf_counter()
+                try:
+                    response = await client.post("/route-general-report", json=payload)
+                    statuses[response.status_code] += 1
+                except httpx.HTTPError as exc:
+                    statuses[type(exc).__name__] += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+        pool_stats = (await client.get("/db-pool-stats")).json()
+
+    latencies.sort()
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    return {
+        "requests": len(latencies),
+        "seconds": elapsed,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "mean_ms": statistics.fmean(latencies) * 1000,
+        "statuses": dict(statuses),
+        "pool": pool_stats,
+    }
+
+
+def print_result(label: str, result: dict) -> None:
+    print(
+        f"{label:10} {result['rps']:8.1f} req/s   p50 {result['p50_ms']:7.1f} ms   "
+        f"p95 {result['p95_ms']:7.1f} ms   p99 {result['p99_ms']:7.1f} ms   {result['statuses']}"
+    )
+    pool = result["pool"]
+    if "max" in pool:
+        print(f"{'':10} pool {pool.get('name')}: size {pool.get('size')}/{pool.get('max')}, "
+              f"waits {pool.get('waits')}, avg wait {pool.get('avg_wait_ms')} ms, timeouts {pool.get('timeouts')}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Benchmark an already running service instead of starting one")
+    parser.add_argument("--service", default="main 1", help="Module with the FastAPI app (default: 'main 1')")
+    parser.add_argument("--drivers", default="psycopg2,asyncpg")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--start-id", type=int, default=1)
+    parser.add_argument("--destination-id", type=int, default=2)
+    args = parser.parse_args()
+
+    payload = {"starting_id": args.start_id, "destination_id": args.destination_id}
+    print(f"Concurrency {args.concurrency}, {args.requests} requests, payload {payload}")
+
+    if args.url:
+        print_result("service", asyncio.run(run_load(args.url, payload, args.concurrency, args.requests)))
+        return
+
+    for driver in args.drivers.split(","):
+        port = _free_port()
+        url = f"http://127.0.0.1:{port}"
+        env = dict(os.environ, DB_DRIVER=driver)
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", f"{args.service}:app", "--port", str(port), "--log-level", "warning"],
+            env=env,
+        )
+        try:
+            _wait_ready(url, proc)
+            print_result(driver, asyncio.run(run_load(url, payload, args.concurrency, args.requests)))
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == "__main__":
+    main()
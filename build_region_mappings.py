@@ -0,0 +1,250 @@
+"""
+Rebuilds the region mapping files in static/data from the region GeoJSON files.
+
+- postal_code_to_region_transeu.json: every point of filtered_postal_codes.geojson goes
+  to the Trans.eu (Voronoi) region whose polygon contains it - a true point-in-polygon
+  test on the candidates whose bounding box holds the point. Points outside every
+  polygon (coast, edge of the clipped area) go to the nearest region centre.
+  distance_km is measured to the centre of the chosen region.
+- postal_code_to_region_timocom.json: the 2, 3 and 4 character prefixes and the full
+  postal code of every TimoCom region; a prefix shared by two regions belongs to the
+  first one in timocom_regions.geojson.
+- transeu_to_timocom_mapping.json: the nearest TimoCom region centre in the same
+  country (in any country when it has no TimoCom region). Read by region_mapping.py.
+
+Nearest-centre queries use a KD-tree over unit-sphere coordinates (chord length orders
+points exactly like great-circle distance). Entries follow the order of the source
+GeoJSON and ties go to the earlier region, so the output is deterministic and a
+rebuild can be diffed against the committed files.
+
+Usage:
+    python build_region_mappings.py [--data-dir static/data] [--out-dir DIR] [--check]
+
+--check writes nothing and exits 1 when any file would change.
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from region_mapping import DATA_DIR, EARTH_RADIUS_KM, haversine_km
+
+TIMOCOM_PREFIX_LENGTHS = (2, 3, 4)
+
+
+def _unit_vectors(lats, lons) -> np.ndarray:
+    lat, lon = np.radians(np.asarray(lats, dtype=np.float64)), np.radians(np.asarray(lons, dtype=np.float64))
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+class KDTree:
+    """Static 3-d tree of points on the unit sphere; nearest() visits O(log n) nodes."""
+
+    def __init__(self, lats: Sequence[float], lons: Sequence[float]):
+        self.points = [tuple(point) for point in _unit_vectors(lats, lons).tolist()]
+        # node: [point index, split axis, left node, right node]
+        self.nodes: List[List[int]] = []
+        self.root = self._build(list(range(len(self.points))), 0)
+
+    def _build(self, indices: List[int], depth: int) -> int:
+        if not indices:
+            return -1
+        axis = depth % 3
+        indices = sorted(indices, key=lambda index: (self.points[index][axis], index))
+        middle = len(indices) // 2
+        node = len(self.nodes)
+        self.nodes.append([indices[middle], axis, -1, -1])
+        self.nodes[node][2] = self._build(indices[:middle], depth + 1)
+        self.nodes[node][3] = self._build(indices[middle + 1:], depth + 1)
+        return node
+
+    def nearest(self, lat: float, lon: float) -> Tuple[int, float]:
+        """(index of the nearest point, great-circle distance in km); ties go to the lower index."""
+        query = tuple(_unit_vectors(lat, lon).tolist())
+        best = [-1, math.inf]
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node < 0:
+                continue
+            index, axis, left, right = self.nodes[node]
+            point = self.points[index]
+            chord = sum((a - b) ** 2 for a, b in zip(point, query))
+            if chord < best[1] or (chord == best[1] and index < best[0]):
+                best = [index, chord]
+            delta = query[axis] - point[axis]
+            near, far = (left, right) if delta < 0 else (right, left)
+            # Far side only when the splitting plane is within the best distance
+            if delta * delta <= best[1]:
+                stack.append(far)
+            stack.append(near)
+        return best[0], 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(best[1]) / 2))
+
+
+def _ring_contains(ring: np.ndarray, x: float, y: float) -> bool:
+    """Even-odd ray casting against one ring of (lon, lat) vertices."""
+    xs, ys = ring[:, 0], ring[:, 1]
+    next_xs, next_ys = np.roll(xs, -1), np.roll(ys, -1)
+    crosses = (ys > y) != (next_ys > y)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        intersect_x = xs + (y - ys) * (next_xs - xs) / (next_ys - ys)
+    return bool(np.count_nonzero(crosses & (x < intersect_x)) % 2)
+
+
+class RegionPolygons:
+    """Polygons of the Voronoi regions with a bounding-box prefilter for point-in-polygon."""
+
+    def __init__(self, features: List[Dict[str, Any]]):
+        self.polygons = []
+        boxes = []
+        for feature in features:
+            geometry = feature["geometry"]
+            parts = [geometry["coordinates"]] if geometry["type"] == "Polygon" else geometry["coordinates"]
+            rings = [[np.asarray(ring, dtype=np.float64)[:, :2] for ring in part] for part in parts]
+            vertices = np.concatenate([part[0] for part in rings])
+            self.polygons.append(rings)
+            boxes.append((*vertices.min(axis=0), *vertices.max(axis=0)))
+        self.boxes = np.array(boxes, dtype=np.float64).reshape(len(boxes), 4)
+
+    def containing(self, lon: float, lat: float) -> Optional[int]:
+        """Index of the first region containing the point (outer ring in, not in a hole)."""
+        min_x, min_y, max_x, max_y = self.boxes.T
+        for index in np.flatnonzero((min_x <= lon) & (lon <= max_x) & (min_y <= lat) & (lat <= max_y)):
+            for outer, *holes in self.polygons[index]:
+                if _ring_contains(outer, lon, lat) and not any(_ring_contains(hole, lon, lat) for hole in holes):
+                    return int(index)
+        return None
+
+
+def _features(path: str) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["features"]
+
+
+def _coordinates(features: List[Dict[str, Any]]) -> Tuple[List[float], List[float]]:
+    return [f["properties"]["latitude"] for f in features], [f["properties"]["longitude"] for f in features]
+
+
+def postal_codes_to_transeu(postal_codes: List[Dict[str, Any]], regions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    polygons = RegionPolygons(regions)
+    lats, lons = _coordinates(regions)
+    tree = KDTree(lats, lons)
+    result = {}
+    for feature in postal_codes:
+        properties = feature["properties"]
+        lat, lon = properties["latitude"], properties["longitude"]
+        index = polygons.containing(lon, lat)
+        if index is None:
+            index, _ = tree.nearest(lat, lon)
+        result[f"{properties['country_code']}{properties['postal_code']}"] = {
+            "region_id": regions[index]["properties"]["id"],
+            "distance_km": round(float(haversine_km(lat, lon, lats[index], lons[index])), 2),
+        }
+    return result
+
+
+def postal_codes_to_timocom(regions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    result = {}
+    for feature in regions:
+        properties = feature["properties"]
+        postal_code = properties["postal_code"]
+        for length in sorted({*TIMOCOM_PREFIX_LENGTHS, len(postal_code)}):
+            if length <= len(postal_code):
+                result.setdefault(
+                    f"{properties['country_code']}{postal_code[:length]}",
+                    {"region_id": properties["id"], "distance_km": 0.0},
+                )
+    return result
+
+
+def transeu_to_timocom(transeu_regions: List[Dict[str, Any]], timocom_regions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    by_country: Dict[str, List[int]] = {}
+    for index, feature in enumerate(timocom_regions):
+        by_country.setdefault(feature["properties"]["country_code"], []).append(index)
+    lats, lons = _coordinates(timocom_regions)
+    trees = {
+        country: (indices, KDTree([lats[i] for i in indices], [lons[i] for i in indices]))
+        for country, indices in by_country.items()
+    }
+    everywhere = (list(range(len(timocom_regions))), KDTree(lats, lons))
+
+    result = {}
+    for feature in transeu_regions:
+        properties = feature["properties"]
+        indices, tree = trees.get(properties["country_code"], everywhere)
+        position, distance = tree.nearest(properties["latitude"], properties["longitude"])
+        result[str(properties["id"])] = {
+            "timocom_id": timocom_regions[indices[position]]["properties"]["id"],
+            "distance_km": round(distance, 2),
+            "trans_country": properties["country_code"],
+            "trans_city": properties["city_name"],
+        }
+    return result
+
+
+def build(data_dir: str) -> Dict[str, Dict[str, Any]]:
+    transeu_regions = _features(os.path.join(data_dir, "voronoi_regions.geojson"))
+    timocom_regions = _features(os.path.join(data_dir, "timocom_regions.geojson"))
+    postal_codes = _features(os.path.join(data_dir, "filtered_postal_codes.geojson"))
+    return {
+        "postal_code_to_region_transeu.json": postal_codes_to_transeu(postal_codes, transeu_regions),
+        "postal_code_to_region_timocom.json": postal_codes_to_timocom(timocom_regions),
+        "transeu_to_timocom_mapping.json": transeu_to_timocom(transeu_regions, timocom_regions),
+    }
+
+
+def _dumps(data: Dict[str, Any]) -> str:
+    return json.dumps(data, indent=2, ensure_ascii=False)
+
+
+def _changes(path: str, data: Dict[str, Any]) -> str:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            current = json.load(f)
+    except (OSError, ValueError):
+        return "new file"
+    changed = sum(1 for key in data.keys() & current.keys() if data[key] != current[key])
+    added, removed = len(data.keys() - current.keys()), len(current.keys() - data.keys())
+    return f"{changed} changed, {added} added, {removed} removed"
+
+
+def main(argv) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default=DATA_DIR, help="Directory with the source GeoJSON files")
+    parser.add_argument("--out-dir", help="Where to write the mappings (default: --data-dir)")
+    parser.add_argument("--check", action="store_true", help="Only report which files would change")
+    args = parser.parse_args(argv)
+    out_dir = args.out_dir or args.data_dir
+
+    started = time.perf_counter()
+    outputs = build(args.data_dir)
+    print(f"Built {len(outputs)} mappings in {time.perf_counter() - started:.2f}s")
+
+    stale = 0
+    for name, data in outputs.items():
+        path = os.path.join(out_dir, name)
+        text = _dumps(data)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                unchanged = f.read() == text
+        except OSError:
+            unchanged = False
+        if unchanged:
+            print(f"✅ {name}: {len(data)} entries, unchanged")
+            continue
+        stale += 1
+        print(f"{'❌' if args.check else '✏️'} {name}: {len(data)} entries, {_changes(path, data)}")
+        if not args.check:
+            os.makedirs(out_dir, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+    return 1 if args.check and stale else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
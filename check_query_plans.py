@@ -0,0 +1,222 @@
+"""
+EXPLAIN ANALYZE check of the production queries against the offers / destinations tables.
+
+Every query runs once (read-only, inside a rolled back transaction) with sample
+parameters taken from the data. The check fails if the plan reads a checked table
+with a sequential scan instead of an index (see db_migrations.py). Tables below
+--small-table-rows rows are exempt - there a sequential scan is the right plan.
+
+Checked queries are built by the code that runs them:
+- "main 1.py": destination lookups, the route report (id / name mode, freight_exchange=Both,
+  lane_rollup.py when installed) and the batch report
+- app_full_backup.py: the 7/30/90-day quote aggregate (_window_query)
+- price_cube.py: the changed-days aggregate read by refresh and, when installed, the cube
+  rebuild (the full-window rebuild of `price_cube.py rebuild` reads the whole window - not checked)
+
+Usage:
+    python check_query_plans.py [--small-table-rows 10000] [--verbose]
+
+Exit code 0 when every query uses an index, 1 otherwise.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import sys
+from typing import Any, Dict, Iterable, List, Tuple
+
+import psycopg2
+
+import lane_rollup
+import price_cube
+from db_pool import connect_kwargs_from_env
+
+CHECKED_TABLES = {"offers", "OffersTransEU", "destinations", "DestinationsTransEU"}
+
+OFFERS_TABLES = {"timocom": "public.offers", "transeu": 'public."OffersTransEU"'}
+DESTINATIONS_TABLES = {"timocom": "public.destinations", "transeu": 'public."DestinationsTransEU"'}
+
+
+def _load_quote_service():
+    # The Flask quote app - imported only for its query builders
+    return importlib.import_module("app_full_backup")
+
+
+def _load_report_service():
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main 1.py")
+    spec = importlib.util.spec_from_file_location("route_report_service", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _sample_lane(cur, exchange: str) -> Tuple[int, int, str, str]:
+    """Any lane present in the offers table, with its city names."""
+    cur.execute(
+        f"""
+        SELECT o.starting_id, o.destination_id, sd.city_name AS start_name, dd.city_name AS dest_name
+        FROM {OFFERS_TABLES[exchange]} AS o
+        JOIN {DESTINATIONS_TABLES[exchange]} AS sd ON sd.id = o.starting_id
+        JOIN {DESTINATIONS_TABLES[exchange]} AS dd ON dd.id = o.destination_id
+        LIMIT 1;
+        """
+    )
+    row = cur.fetchone()
+    if row is None:
+        raise LookupError(f"No offers in {OFFERS_TABLES[exchange]}")
+    return row["starting_id"], row["destination_id"], row["start_name"], row["dest_name"]
+
+
+def _report_query(service, exchange: str, passing_city_name: bool, lane: Dict[str, Any]):
+    """Report query on the raw offers table, whatever REPORT_ROLLUP says."""
+    saved = lane_rollup.REPORT_ROLLUP
+    try:
+        lane_rollup.REPORT_ROLLUP = "off"
+        if exchange == "both":
+            return service._build_both_report_query(passing_city_name, lane)
+        return service._build_report_query(exchange, passing_city_name, **lane)
+    finally:
+        lane_rollup.REPORT_ROLLUP = saved
+
+
+def _installed(cur, table: str) -> bool:
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL AS installed;", (table,))
+    return cur.fetchone()["installed"]
+
+
+def production_queries(cur, service, quote_service) -> Iterable[Tuple[str, str, Tuple[Any, ...]]]:
+    lanes = {}
+    for exchange in ("timocom", "transeu"):
+        start_id, dest_id, start_name, dest_name = _sample_lane(cur, exchange)
+        table = DESTINATIONS_TABLES[exchange]
+
+        yield f"{exchange}: destination by id", f"SELECT city_name FROM {table} WHERE id = %s LIMIT 1;", (start_id,)
+        yield (
+            f"{exchange}: destination by name",
+            f"SELECT id FROM {table} WHERE city_name = %s ORDER BY id LIMIT 1;",
+            (start_name,),
+        )
+        yield f"{exchange}: all ids for name", f"SELECT id FROM {table} WHERE city_name = %s ORDER BY id;", (start_name,)
+        cur.execute(f"SELECT id FROM {table} WHERE city_name = %s ORDER BY id;", (start_name,))
+        start_ids = [row["id"] for row in cur.fetchall()]
+        cur.execute(f"SELECT id FROM {table} WHERE city_name = %s ORDER BY id;", (dest_name,))
+        dest_ids = [row["id"] for row in cur.fetchall()]
+        lanes[exchange] = {
+            "start_id": start_id, "start_name": start_name, "dest_id": dest_id, "dest_name": dest_name,
+            "start_ids": start_ids, "dest_ids": dest_ids,
+        }
+        for passing_city_name in (False, True):
+            mode = "name" if passing_city_name else "id"
+            query, params = _report_query(service, exchange, passing_city_name, lanes[exchange])
+            yield f"{exchange}: report ({mode} mode)", query, params
+
+            if lane_rollup.use_rollup(exchange):
+                yield (
+                    f"{exchange}: report from rollup ({mode} mode)",
+                    lane_rollup.report_query(exchange, passing_city_name),
+                    params,
+                )
+        batch_params = ([0], [start_id], [dest_id])
+        yield f"{exchange}: batch report", service._BATCH_REPORT_QUERIES[exchange], batch_params
+        if lane_rollup.use_rollup(exchange):
+            yield f"{exchange}: batch report from rollup", lane_rollup.batch_report_query(exchange), batch_params
+
+        periods = list(quote_service.EXCHANGE_DATA_PERIODS)
+        offers_table, columns = {
+            "timocom": (OFFERS_TABLES["timocom"], quote_service.TIMOCOM_WINDOW_COLUMNS),
+            "transeu": (OFFERS_TABLES["transeu"], quote_service.TRANSEU_WINDOW_COLUMNS),
+        }[exchange]
+        yield (
+            f"{exchange}: quote {'/'.join(map(str, periods))}-day aggregate",
+            quote_service._window_query(offers_table, columns, periods),
+            (start_id, dest_id),
+        )
+
+        spec = price_cube.CUBES[exchange]
+        yield (
+            f"{exchange}: price cube daily (changed days)",
+            price_cube.daily_select_sql(spec, "o.enlistment_date = ANY(%s::date[])"),
+            ([],),
+        )
+        if _installed(cur, spec.daily):
+            yield f"{exchange}: price cube rebuild", price_cube.cube_select_sql(spec), ()
+
+    for passing_city_name in (False, True):
+        mode = "name" if passing_city_name else "id"
+        query, params = _report_query(service, "both", passing_city_name, lanes)
+        yield f"both: report ({mode} mode)", query, params
+
+
+def _scans(plan: Dict[str, Any]) -> Iterable[Dict[str, Any]]:
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _scans(child)
+
+
+def seq_scans(plan: Dict[str, Any]) -> List[str]:
+    """Checked tables read with a sequential scan (partitions count as their table)."""
+    offending = []
+    for node in _scans(plan):
+        if node.get("Node Type") != "Seq Scan":
+            continue
+        relation = node.get("Relation Name", "")
+        if relation in CHECKED_TABLES or any(relation.startswith(f"{table}_") for table in CHECKED_TABLES):
+            offending.append(relation)
+    return offending
+
+
+def _estimated_rows(cur, relation: str) -> float:
+    cur.execute("SELECT COALESCE(MAX(reltuples), 0) AS rows FROM pg_class WHERE relname = %s;", (relation,))
+    return cur.fetchone()["rows"]
+
+
+def index_nodes(plan: Dict[str, Any]) -> List[str]:
+    return [
+        f"{node['Node Type']} {node.get('Index Name', '')}".strip()
+        for node in _scans(plan)
+        if "Index" in node.get("Node Type", "")
+    ]
+
+
+def main(argv) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--small-table-rows", type=int, default=10000)
+    parser.add_argument("--verbose", action="store_true", help="Print full plans")
+    args = parser.parse_args(argv)
+
+    connect_kwargs = connect_kwargs_from_env()
+    if connect_kwargs is None:
+        print("Database environment variables are not fully configured.")
+        return 1
+
+    service = _load_report_service()
+    quote_service = _load_quote_service()
+    conn = psycopg2.connect(**connect_kwargs)
+    failures = 0
+    try:
+        lane_rollup.detect_installed(conn)
+        with conn.cursor() as cur:
+            for label, query, params in production_queries(cur, service, quote_service):
+                cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query.strip().rstrip(";"), params)
+                result = cur.fetchone()["QUERY PLAN"][0]
+                plan = result["Plan"]
+                bad = [
+                    relation for relation in seq_scans(plan)
+                    if _estimated_rows(cur, relation) >= args.small_table_rows
+                ]
+                failures += bool(bad)
+                used = ", ".join(index_nodes(plan)) or "no index"
+                print(f"{'❌' if bad else '✅'} {label:45} {result['Execution Time']:9.2f} ms   {used}"
+                      + (f"   Seq Scan on {', '.join(bad)}" if bad else ""))
+                if args.verbose:
+                    print(json.dumps(plan, indent=2))
+    finally:
+        conn.rollback()
+        conn.close()
+
+    print(f"\n{'All queries use indexes' if not failures else f'{failures} query(ies) without index'}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
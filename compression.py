@@ -0,0 +1,240 @@
+"""
+Kompresja odpowiedzi (brotli / gzip), silne ETagi i warunkowe GET (304).
+
+- odpowiedzi dynamiczne (np. /api/calculate) są kompresowane w after_request,
+  jeśli są większe niż COMPRESSION_MIN_SIZE
+- pliki statyczne (static/data/*.geojson, *.json, js, css) są kompresowane raz
+  przy starcie i serwowane z pamięci w wariancie wybranym przez klienta
+- każdy wariant (identity / gzip / br) ma własny silny ETag
+
+negotiate_encoding / static_variant / not_modified działają bez Flaska -
+tych samych wariantów i ETagów używa asgi_app.py.
+"""
+import gzip
+import hashlib
+import os
+import tempfile
+
+from flask import request, send_from_directory
+from werkzeug.http import parse_accept_header, parse_etags, quote_etag
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - zależność opcjonalna
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "5"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+# Pliki statyczne kompresujemy raz, więc maksymalny poziom
+STATIC_GZIP_LEVEL = 9
+STATIC_BROTLI_QUALITY = 11
+STATIC_MAX_AGE = int(os.getenv("STATIC_MAX_AGE", "3600"))
+# Skompresowane warianty zapisujemy na dysku (klucz = hash treści),
+# żeby kolejne workery gunicorna nie kompresowały plików od nowa
+STATIC_PRECOMPRESS_DIR = os.getenv(
+    "STATIC_PRECOMPRESS_DIR", os.path.join(tempfile.gettempdir(), "cargoscout_static")
+)
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/geo+json',
+    'application/javascript',
+    'application/x-ndjson',
+    'image/svg+xml',
+    'text/css',
+    'text/html',
+    'text/javascript',
+    'text/plain',
+}
+COMPRESSIBLE_EXTENSIONS = ('.json', '.geojson', '.js', '.css', '.svg', '.html', '.txt')
+
+SUPPORTED_ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def _compress(body, encoding, static=False):
+    if encoding == 'br':
+        quality = STATIC_BROTLI_QUALITY if static else COMPRESSION_BROTLI_QUALITY
+        return brotli.compress(body, quality=quality)
+    level = STATIC_GZIP_LEVEL if static else COMPRESSION_GZIP_LEVEL
+    # mtime=0 - ten sam wynik dla tych samych danych (stabilny ETag)
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+def negotiate_encoding(accept_encoding):
+    """Najlepsze kodowanie dla nagłówka Accept-Encoding lub None"""
+    return parse_accept_header(accept_encoding).best_match(SUPPORTED_ENCODINGS)
+
+
+def _negotiate_encoding():
+    """Najlepsze kodowanie wg Accept-Encoding klienta lub None"""
+    return request.accept_encodings.best_match(SUPPORTED_ENCODINGS)
+
+
+def _variant_etag(digest, encoding):
+    return f"{digest}-{encoding}" if encoding else digest
+
+
+def _static_mimetype(filename):
+    if filename.endswith('.geojson'):
+        return 'application/geo+json'
+    if filename.endswith('.json'):
+        return 'application/json'
+    if filename.endswith('.js'):
+        return 'text/javascript'
+    if filename.endswith('.css'):
+        return 'text/css'
+    if filename.endswith('.svg'):
+        return 'image/svg+xml'
+    if filename.endswith('.html'):
+        return 'text/html'
+    return 'text/plain'
+
+
+def _add_vary(response):
+    response.vary.add('Accept-Encoding')
+
+
+def static_variant(entry, filename, encoding):
+    """
+    Treść i nagłówki wariantu pliku statycznego (encoding None = bez kompresji):
+    Content-Type, silny ETag wariantu, Cache-Control, Content-Encoding i Vary
+    """
+    mimetype = _static_mimetype(filename)
+    headers = {
+        'Content-Type': f"{mimetype}; charset=utf-8" if mimetype.startswith('text/') else mimetype,
+        'ETag': quote_etag(_variant_etag(entry['digest'], encoding)),
+        'Cache-Control': f"public, max-age={STATIC_MAX_AGE}",
+    }
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    if len(entry['variants']) > 1:
+        headers['Vary'] = 'Accept-Encoding'
+    return entry['variants'][encoding], headers
+
+
+def not_modified(if_none_match, etag):
+    """Czy klient ma już wariant o tym ETagu (If-None-Match) - odpowiedź 304"""
+    return bool(if_none_match) and parse_etags(if_none_match).contains_raw(etag)
+
+
+class StaticPrecompressor:
+    """Pliki statyczne skompresowane w pamięci - {ścieżka: warianty}"""
+
+    def __init__(self, static_folder, min_size=COMPRESSION_MIN_SIZE):
+        self.static_folder = static_folder
+        self.min_size = min_size
+        self._files = {}
+
+    def _load(self, relpath):
+        full_path = os.path.join(self.static_folder, relpath)
+        stat = os.stat(full_path)
+        with open(full_path, 'rb') as f:
+            body = f.read()
+
+        digest = hashlib.sha1(body).hexdigest()
+        variants = {None: body}
+        if len(body) >= self.min_size:
+            for encoding in SUPPORTED_ENCODINGS:
+                variants[encoding] = self._compressed_variant(body, digest, encoding)
+
+        entry = {'mtime': stat.st_mtime, 'digest': digest, 'variants': variants}
+        self._files[relpath] = entry
+        return entry
+
+    @staticmethod
+    def _compressed_variant(body, digest, encoding):
+        cache_path = os.path.join(STATIC_PRECOMPRESS_DIR, f"{digest}.{encoding}")
+        try:
+            with open(cache_path, 'rb') as f:
+                return f.read()
+        except OSError:
+            pass
+
+        compressed = _compress(body, encoding, static=True)
+        try:
+            os.makedirs(STATIC_PRECOMPRESS_DIR, exist_ok=True)
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(compressed)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"⚠ Nie udało się zapisać {cache_path}: {e}")
+        return compressed
+
+    def precompress_all(self):
+        """Kompresuje wszystkie pliki statyczne nadające się do kompresji"""
+        before = after = 0
+        for root, _, files in os.walk(self.static_folder):
+            for name in files:
+                if not name.endswith(COMPRESSIBLE_EXTENSIONS):
+                    continue
+                relpath = os.path.relpath(os.path.join(root, name), self.static_folder).replace(os.sep, '/')
+                entry = self._load(relpath)
+                before += len(entry['variants'][None])
+                after += min(len(v) for v in entry['variants'].values())
+        print(f"🗜️ Static: {len(self._files)} plików, {before / 1024:.0f} KiB -> {after / 1024:.0f} KiB")
+
+    def get(self, relpath):
+        """Wpis dla pliku (przeładowany, jeśli plik zmienił się na dysku) lub None"""
+        entry = self._files.get(relpath)
+        if entry is None:
+            return None
+        try:
+            if os.stat(os.path.join(self.static_folder, relpath)).st_mtime != entry['mtime']:
+                entry = self._load(relpath)
+        except OSError:
+            self._files.pop(relpath, None)
+            return None
+        return entry
+
+
+def init_compression(app, precompress_static=True):
+    """Rejestruje kompresję odpowiedzi i (opcjonalnie) serwowanie skompresowanych plików statycznych"""
+    precompressor = None
+    if precompress_static and app.static_folder:
+        precompressor = StaticPrecompressor(app.static_folder)
+        precompressor.precompress_all()
+
+        def static_view(filename):
+            entry = precompressor.get(filename)
+            if entry is None:
+                return send_from_directory(app.static_folder, filename, max_age=STATIC_MAX_AGE)
+
+            encoding = _negotiate_encoding() if len(entry['variants']) > 1 else None
+            body, headers = static_variant(entry, filename, encoding)
+            response = app.response_class(body, headers=headers)
+            return response.make_conditional(request)
+
+        app.view_functions['static'] = static_view
+
+    @app.after_request
+    def compress_response(response):
+        if (response.direct_passthrough or response.is_streamed
+                or response.status_code != 200
+                or 'Content-Encoding' in response.headers
+                or response.get_etag()[0]):
+            return response
+
+        if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+            return response
+
+        body = response.get_data()
+        digest = hashlib.sha1(body).hexdigest()
+        encoding = _negotiate_encoding() if len(body) >= COMPRESSION_MIN_SIZE else None
+
+        _add_vary(response)
+        response.set_etag(_variant_etag(digest, encoding))
+        response = response.make_conditional(request)
+        if response.status_code == 304:
+            return response
+
+        if encoding:
+            response.set_data(_compress(body, encoding))
+            response.headers['Content-Encoding'] = encoding
+        return response
+
+    return precompressor
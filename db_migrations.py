@@ -0,0 +1,443 @@
+"""
+Versioned schema migrations for the offers / destinations tables.
+
+Applied versions are recorded in public.schema_migrations. Index migrations use
+CREATE INDEX CONCURRENTLY (no write lock on offers), so they run outside a
+transaction; an invalid index left by an interrupted run is dropped and rebuilt.
+
+Usage:
+    python db_migrations.py status
+    python db_migrations.py migrate [--to VERSION]
+    python db_migrations.py partition <timocom|transeu> [--months-ahead 3]
+
+`partition` is optional and not part of `migrate`: it converts the offers table
+into one partitioned by month of enlistment_date (or, if it already is, adds the
+upcoming monthly partitions - run it from cron). Date-range queries then touch only
+the partitions in range. The conversion copies the primary key (extended with
+enlistment_date, which every unique key of a partitioned table must contain),
+NOT NULL / CHECK / foreign key constraints and defaults, hands the id sequence
+over to the new table and moves the lane_rollup.py / price_cube.py triggers -
+all in one transaction.
+
+check_query_plans.py confirms with EXPLAIN ANALYZE that the production queries
+use these indexes.
+"""
+import argparse
+import sys
+from dataclasses import dataclass
+from datetime import date
+from typing import Callable, List, Optional, Sequence, Union
+
+import psycopg2
+
+import lane_rollup
+import price_cube
+from db_pool import connect_kwargs_from_env
+
+Step = Union[str, Callable]
+
+OFFERS_TABLES = {
+    "timocom": {
+        "table": "offers",
+        "price_columns": (
+            "trailer_avg_price_per_km",
+            "vehicle_up_to_3_5_t_avg_price_per_km",
+            "vehicle_up_to_12_t_avg_price_per_km",
+        ),
+        "date_columns": ("number_of_offers_total",),
+    },
+    "transeu": {
+        "table": '"OffersTransEU"',
+        "price_columns": ("lorry_avg_price_per_km",),
+        "date_columns": (),
+    },
+}
+
+
+@dataclass
+class Migration:
+    version: int
+    name: str
+    steps: Sequence[Step]
+    # False for CREATE INDEX CONCURRENTLY, which cannot run inside a transaction
+    transactional: bool = True
+
+
+def create_index_concurrently(name: str, table: str, definition: str) -> Callable:
+    def step(conn):
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT NOT i.indisvalid AS invalid
+                FROM pg_index AS i
+                JOIN pg_class AS c ON c.oid = i.indexrelid
+                JOIN pg_namespace AS n ON n.oid = c.relnamespace
+                WHERE n.nspname = 'public' AND c.relname = %s;
+                """,
+                (name,),
+            )
+            row = cur.fetchone()
+            if row and row["invalid"]:
+                print(f"   dropping invalid index {name} left by an interrupted build")
+                cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS public.{name};")
+            cur.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON public.{table} {definition};")
+
+    return step
+
+
+def _offers_indexes(exchange: str, prefix: str) -> List[Step]:
+    spec = OFFERS_TABLES[exchange]
+    prices = ", ".join(spec["price_columns"])
+    date_include = ", ".join(spec["price_columns"] + spec["date_columns"])
+    return [
+        # /route-general-report: lane equality, rows come out ordered by hour for GROUP BY
+        create_index_concurrently(
+            f"ix_{prefix}_lane_hour", spec["table"],
+            f"(starting_id, destination_id, enlistment_hour) INCLUDE ({prices})",
+        ),
+        # get_timocom_data / get_transeu_data: lane equality + enlistment_date >= CURRENT_DATE - N
+        create_index_concurrently(
+            f"ix_{prefix}_lane_date", spec["table"],
+            f"(starting_id, destination_id, enlistment_date) INCLUDE ({date_include})",
+        ),
+    ]
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(
+        1, "offers covering indexes",
+        _offers_indexes("timocom", "offers"),
+        transactional=False,
+    ),
+    Migration(
+        2, "OffersTransEU covering indexes",
+        _offers_indexes("transeu", "offers_transeu"),
+        transactional=False,
+    ),
+    Migration(
+        3, "destinations city_name indexes",
+        [
+            # Name lookups (ORDER BY id LIMIT 1) and all ids of a name (PassingCityName reports)
+            create_index_concurrently("ix_destinations_city_name", "destinations", "(city_name, id)"),
+            create_index_concurrently(
+                "ix_destinations_transeu_city_name", '"DestinationsTransEU"', "(city_name, id)"
+            ),
+        ],
+        transactional=False,
+    ),
+    Migration(
+        4, "destinations change notifications",
+        [
+            # Consumed by destinations_index.py (LISTEN destinations_changed)
+            """
+            CREATE OR REPLACE FUNCTION public.notify_destinations_changed() RETURNS trigger
+            LANGUAGE plpgsql AS $$
+            BEGIN
+                PERFORM pg_notify('destinations_changed', TG_TABLE_NAME);
+                RETURN NULL;
+            END
+            $$;
+            """,
+            "DROP TRIGGER IF EXISTS destinations_changed ON public.destinations;",
+            """
+            CREATE TRIGGER destinations_changed
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON public.destinations
+            FOR EACH STATEMENT EXECUTE FUNCTION public.notify_destinations_changed();
+            """,
+            'DROP TRIGGER IF EXISTS destinations_changed ON public."DestinationsTransEU";',
+            """
+            CREATE TRIGGER destinations_changed
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON public."DestinationsTransEU"
+            FOR EACH STATEMENT EXECUTE FUNCTION public.notify_destinations_changed();
+            """,
+        ],
+    ),
+    Migration(
+        5, "offers enlistment_date indexes",
+        [
+            # price_cube.py refresh: changed days (enlistment_date = ANY(...)) and the full-window rebuild
+            create_index_concurrently("ix_offers_enlistment_date", "offers", "(enlistment_date)"),
+            create_index_concurrently(
+                "ix_offers_transeu_enlistment_date", '"OffersTransEU"', "(enlistment_date)"
+            ),
+        ],
+        transactional=False,
+    ),
+]
+
+
+def _connect():
+    connect_kwargs = connect_kwargs_from_env()
+    if connect_kwargs is None:
+        raise SystemExit("Database environment variables are not fully configured.")
+    return psycopg2.connect(**connect_kwargs)
+
+
+def _ensure_table(conn) -> None:
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS public.schema_migrations (
+                version    integer PRIMARY KEY,
+                name       text NOT NULL,
+                applied_at timestamptz NOT NULL DEFAULT now()
+            );
+            """
+        )
+    conn.commit()
+
+
+def applied_versions(conn) -> set:
+    with conn.cursor() as cur:
+        cur.execute("SELECT version FROM public.schema_migrations;")
+        versions = {row["version"] for row in cur.fetchall()}
+    conn.commit()
+    return versions
+
+
+def _run_step(conn, step: Step) -> None:
+    if callable(step):
+        step(conn)
+    else:
+        with conn.cursor() as cur:
+            cur.execute(step)
+
+
+def apply(conn, migration: Migration) -> None:
+    print(f"▶ {migration.version:03d} {migration.name}")
+    conn.autocommit = not migration.transactional
+    try:
+        for step in migration.steps:
+            _run_step(conn, step)
+        with conn.cursor() as cur:
+            cur.execute(
+                "INSERT INTO public.schema_migrations (version, name) VALUES (%s, %s);",
+                (migration.version, migration.name),
+            )
+        if migration.transactional:
+            conn.commit()
+    except Exception:
+        if migration.transactional:
+            conn.rollback()
+        raise
+    finally:
+        conn.autocommit = False
+
+
+def migrate(conn, target: Optional[int] = None) -> int:
+    _ensure_table(conn)
+    done = applied_versions(conn)
+    pending = [m for m in MIGRATIONS if m.version not in done and (target is None or m.version <= target)]
+    for migration in pending:
+        apply(conn, migration)
+    print(f"✅ {len(pending)} migration(s) applied" if pending else "✅ Schema up to date")
+    return len(pending)
+
+
+def status(conn) -> None:
+    _ensure_table(conn)
+    done = applied_versions(conn)
+    for migration in MIGRATIONS:
+        print(f"{'✓' if migration.version in done else '·'} {migration.version:03d} {migration.name}")
+
+
+def _month_start(day: date, offset: int = 0) -> date:
+    month = day.month - 1 + offset
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def _constraints(cur, table: str) -> List[dict]:
+    """Primary key and foreign keys of a table - LIKE copies neither."""
+    cur.execute(
+        """
+        SELECT c.conname::text AS name, c.contype::text AS type, pg_get_constraintdef(c.oid) AS definition,
+               ARRAY(
+                   SELECT a.attname::text
+                   FROM unnest(c.conkey) WITH ORDINALITY AS k(attnum, position)
+                   JOIN pg_attribute AS a ON a.attrelid = c.conrelid AND a.attnum = k.attnum
+                   ORDER BY k.position
+               ) AS columns
+        FROM pg_constraint AS c
+        WHERE c.conrelid = %s::regclass AND c.contype IN ('p', 'f')
+        ORDER BY c.contype DESC, c.conname;
+        """,
+        (f"public.{table}",),
+    )
+    return cur.fetchall()
+
+
+def _owned_sequences(cur, table: str) -> List[dict]:
+    """Sequences of serial (OWNED BY) and identity columns."""
+    cur.execute(
+        """
+        SELECT a.attname::text AS column_name, s.oid::regclass::text AS sequence, d.deptype = 'i' AS identity
+        FROM pg_depend AS d
+        JOIN pg_class AS s ON s.oid = d.objid AND s.relkind = 'S'
+        JOIN pg_attribute AS a ON a.attrelid = d.refobjid AND a.attnum = d.refobjsubid
+        WHERE d.classid = 'pg_class'::regclass AND d.refobjid = %s::regclass AND d.deptype IN ('a', 'i');
+        """,
+        (f"public.{table}",),
+    )
+    return cur.fetchall()
+
+
+def _installed_triggers(cur, exchange: str) -> List[tuple]:
+    """(module, spec) of the lane_rollup / price_cube triggers installed on the offers table."""
+    installed = []
+    for module, spec, target in (
+        (lane_rollup, lane_rollup.ROLLUPS[exchange], lane_rollup.ROLLUPS[exchange].target),
+        (price_cube, price_cube.CUBES[exchange], price_cube.CUBES[exchange].daily),
+    ):
+        cur.execute("SELECT to_regclass(%s) IS NOT NULL AS installed;", (target,))
+        if cur.fetchone()["installed"]:
+            installed.append((module, spec))
+    return installed
+
+
+def partition_offers(conn, exchange: str, months_ahead: int = 3) -> None:
+    """Converts the offers table to monthly RANGE partitions on enlistment_date, or extends them."""
+    spec = OFFERS_TABLES[exchange]
+    table = spec["table"]
+    base = table.strip('"')
+
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT c.relkind FROM pg_class AS c JOIN pg_namespace AS n ON n.oid = c.relnamespace "
+            "WHERE n.nspname = 'public' AND c.relname = %s;",
+            (base,),
+        )
+        row = cur.fetchone()
+        if row is None:
+            raise SystemExit(f"Table public.{table} does not exist")
+        already_partitioned = row["relkind"] == "p"
+
+        if already_partitioned:
+            first = _month_start(date.today())
+        else:
+            cur.execute(f"LOCK TABLE public.{table} IN SHARE MODE;")
+            cur.execute(f"SELECT MIN(enlistment_date) AS first FROM public.{table};")
+            first = _month_start(cur.fetchone()["first"] or date.today())
+            staged = f'"{base}_partitioned"'
+            # NOT NULL always comes along; CHECK constraints, defaults (serial nextval) and identity explicitly
+            cur.execute(
+                f"CREATE TABLE public.{staged} (LIKE public.{table} INCLUDING DEFAULTS INCLUDING GENERATED "
+                f"INCLUDING IDENTITY INCLUDING CONSTRAINTS) PARTITION BY RANGE (enlistment_date);"
+            )
+            cur.execute(f'CREATE TABLE public."{base}_default" PARTITION OF public.{staged} DEFAULT;')
+
+        parent = table if already_partitioned else staged
+        last = _month_start(date.today(), months_ahead)
+        month = first
+        created = 0
+        while month <= last:
+            name = f'"{base}_{month:%Y_%m}"'
+            cur.execute(
+                f"CREATE TABLE IF NOT EXISTS public.{name} PARTITION OF public.{parent} "
+                f"FOR VALUES FROM (%s) TO (%s);",
+                (month, _month_start(month, 1)),
+            )
+            created += 1
+            month = _month_start(month, 1)
+
+        if not already_partitioned:
+            constraints = _constraints(cur, table)
+            sequences = _owned_sequences(cur, table)
+            triggers = _installed_triggers(cur, exchange)
+            # Ids are copied as they are, identity columns included
+            cur.execute(f"INSERT INTO public.{staged} OVERRIDING SYSTEM VALUE SELECT * FROM public.{table};")
+            # The rollup / cube already reflect these rows - the old table just stops feeding them
+            for module, derived in triggers:
+                for statement in module.drop_triggers_sql(derived):
+                    cur.execute(statement)
+
+            cur.execute(f'ALTER TABLE public.{table} RENAME TO "{base}_unpartitioned";')
+            cur.execute(f"ALTER TABLE public.{staged} RENAME TO {table};")
+            for constraint in constraints:
+                if constraint["type"] == "p":
+                    # Index names are per schema - the old key gives its name up to the new one
+                    cur.execute(
+                        f'ALTER TABLE public."{base}_unpartitioned" RENAME CONSTRAINT "{constraint["name"]}" '
+                        f'TO "{base}_unpartitioned_pkey";'
+                    )
+                    columns = constraint["columns"]
+                    if "enlistment_date" not in columns:
+                        columns = columns + ["enlistment_date"]
+                    key = ", ".join(f'"{column}"' for column in columns)
+                    cur.execute(f'ALTER TABLE public.{table} ADD CONSTRAINT "{base}_pkey" PRIMARY KEY ({key});')
+                else:
+                    cur.execute(
+                        f'ALTER TABLE public.{table} ADD CONSTRAINT "{constraint["name"]}" {constraint["definition"]};'
+                    )
+            for sequence in sequences:
+                if sequence["identity"]:
+                    # LIKE ... INCLUDING IDENTITY creates a new sequence - continue where the old one stopped
+                    cur.execute(f"SELECT last_value, is_called FROM {sequence['sequence']};")
+                    state = cur.fetchone()
+                    cur.execute(
+                        "SELECT setval(pg_get_serial_sequence(%s, %s), %s, %s);",
+                        (f"public.{table}", sequence["column_name"], state["last_value"], state["is_called"]),
+                    )
+                else:
+                    # serial: the copied default still calls the old sequence - it must not go with the old table
+                    cur.execute(
+                        f'ALTER SEQUENCE {sequence["sequence"]} OWNED BY public.{table}."{sequence["column_name"]}";'
+                    )
+            for module, derived in triggers:
+                for statement in module.triggers_sql(derived):
+                    cur.execute(statement)
+
+            # Partitioned indexes are inherited by every partition, including future ones
+            prices = ", ".join(spec["price_columns"])
+            date_include = ", ".join(spec["price_columns"] + spec["date_columns"])
+            prefix = "offers" if exchange == "timocom" else "offers_transeu"
+            cur.execute(
+                f"CREATE INDEX ix_{prefix}_p_lane_hour ON public.{table} "
+                f"(starting_id, destination_id, enlistment_hour) INCLUDE ({prices});"
+            )
+            cur.execute(
+                f"CREATE INDEX ix_{prefix}_p_lane_date ON public.{table} "
+                f"(starting_id, destination_id, enlistment_date) INCLUDE ({date_include});"
+            )
+            # price_cube.py refresh: changed days (migration 5 on the old table)
+            cur.execute(f"CREATE INDEX ix_{prefix}_p_enlistment_date ON public.{table} (enlistment_date);")
+            cur.execute(f"ANALYZE public.{table};")
+    conn.commit()
+
+    if already_partitioned:
+        print(f"✅ public.{table}: monthly partitions ensured up to {last:%Y-%m}")
+    else:
+        print(f"✅ public.{table} partitioned by month ({created} partitions + default); "
+              f"old table kept as public.\"{base}_unpartitioned\"")
+        if triggers:
+            print(f"   Triggers moved to the new table: {', '.join(module.__name__ for module, _ in triggers)}")
+
+
+def main(argv) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status")
+    migrate_parser = sub.add_parser("migrate")
+    migrate_parser.add_argument("--to", type=int)
+    partition_parser = sub.add_parser("partition")
+    partition_parser.add_argument("exchange", choices=sorted(OFFERS_TABLES))
+    partition_parser.add_argument("--months-ahead", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    conn = _connect()
+    try:
+        if args.command == "status":
+            status(conn)
+        elif args.command == "migrate":
+            migrate(conn, args.to)
+        else:
+            partition_offers(conn, args.exchange, args.months_ahead)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,328 @@
+"""
+PostgreSQL connection pool for the FastAPI report services (mainaPI.py, "main 1.py")
+and the exchange-data fetchers of app_full_backup.py.
+
+Bounded (DB_POOL_MIN..DB_POOL_MAX connections), thread-safe, shared by every
+endpoint in the process:
+- checkout waits up to DB_POOL_TIMEOUT seconds for a free connection
+- a connection idle for longer than DB_POOL_CHECK_AFTER seconds is verified
+  with SELECT 1 before it is handed out; broken ones are replaced
+- connections older than DB_POOL_MAX_LIFETIME seconds are recycled
+- on return an open transaction is rolled back, a broken connection is discarded
+- wait time, timeouts and reuse counters are exposed through stats()
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+import psycopg2
+from dotenv import load_dotenv
+from psycopg2 import extensions
+from psycopg2.extras import RealDictCursor
+
+# Services import this module before calling load_dotenv() themselves
+load_dotenv()
+
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_CHECK_AFTER = float(os.getenv("DB_POOL_CHECK_AFTER", "30"))
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "1800"))
+
+
+class PoolTimeout(Exception):
+    """No connection became free within the checkout timeout."""
+
+
+class _Entry:
+    __slots__ = ("conn", "created_at", "last_used", "uses")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = self.last_used = time.monotonic()
+        self.uses = 0
+
+
+class ConnectionPool:
+    def __init__(
+        self,
+        connect_kwargs: Dict[str, Any],
+        minconn: int = DB_POOL_MIN,
+        maxconn: int = DB_POOL_MAX,
+        timeout: float = DB_POOL_TIMEOUT,
+        check_after: float = DB_POOL_CHECK_AFTER,
+        max_lifetime: float = DB_POOL_MAX_LIFETIME,
+        name: str = "postgres",
+    ):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError(f"Invalid pool size: min={minconn}, max={maxconn}")
+        self.connect_kwargs = connect_kwargs
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.check_after = check_after
+        self.max_lifetime = max_lifetime
+        self.name = name
+
+        self._cond = threading.Condition()
+        self._idle = []
+        self._in_use = {}
+        self._size = 0
+        self._waiting = 0
+        self._closed = False
+        self._pid = os.getpid()
+
+        self.created = 0
+        self.checkouts = 0
+        self.health_checks = 0
+        self.discarded = 0
+        self.recycled = 0
+        self.timeouts = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+        for _ in range(minconn):
+            with self._cond:
+                self._size += 1
+            try:
+                entry = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                raise
+            with self._cond:
+                self._idle.append(entry)
+
+    def _connect(self) -> _Entry:
+        conn = psycopg2.connect(**self.connect_kwargs)
+        with self._cond:
+            self.created += 1
+        return _Entry(conn)
+
+    @staticmethod
+    def _close(entry: _Entry) -> None:
+        try:
+            entry.conn.close()
+        except Exception:
+            pass
+
+    def _reset_after_fork(self) -> None:
+        # Sockets inherited from the parent process must not be used (or closed) here
+        if self._pid != os.getpid():
+            self._idle = []
+            self._in_use = {}
+            self._size = 0
+            self._waiting = 0
+            self._pid = os.getpid()
+
+    def _expired(self, entry: _Entry, now: float) -> bool:
+        return self.max_lifetime > 0 and now - entry.created_at > self.max_lifetime
+
+    def _healthy(self, entry: _Entry, now: float) -> bool:
+        if entry.conn.closed:
+            return False
+        if now - entry.last_used < self.check_after:
+            return True
+        with self._cond:
+            self.health_checks += 1
+        try:
+            with entry.conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            entry.conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def getconn(self, timeout: Optional[float] = None):
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        waited = False
+
+        while True:
+            entry = None
+            with self._cond:
+                if self._closed:
+                    raise psycopg2.InterfaceError(f"Pool '{self.name}' is closed")
+                self._reset_after_fork()
+
+                while not self._idle and self._size >= self.maxconn:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise PoolTimeout(
+                            f"Pool '{self.name}': no free connection within {timeout:g}s "
+                            f"({self._size}/{self.maxconn} in use)"
+                        )
+                    waited = True
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+
+                if self._idle:
+                    entry = self._idle.pop()
+                else:
+                    # Reserve the slot, connect outside the lock
+                    self._size += 1
+
+            if entry is None:
+                try:
+                    entry = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            else:
+                now = time.monotonic()
+                if self._expired(entry, now) or not self._healthy(entry, now):
+                    with self._cond:
+                        if self._expired(entry, now):
+                            self.recycled += 1
+                        else:
+                            self.discarded += 1
+                        self._size -= 1
+                    self._close(entry)
+                    continue
+
+            elapsed = time.monotonic() - started
+            with self._cond:
+                entry.uses += 1
+                self._in_use[id(entry.conn)] = entry
+                self.checkouts += 1
+                if waited:
+                    self.waits += 1
+                    self.wait_seconds += elapsed
+                    self.max_wait_seconds = max(self.max_wait_seconds, elapsed)
+            return entry.conn
+
+    def putconn(self, conn, discard: bool = False) -> None:
+        with self._cond:
+            entry = self._in_use.pop(id(conn), None)
+        if entry is None:
+            # Connection from before a fork or from another pool
+            try:
+                conn.close()
+            except Exception:
+                pass
+            return
+
+        if not discard and not conn.closed:
+            status = conn.info.transaction_status
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                discard = True
+            elif status != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except Exception:
+                    discard = True
+
+        now = time.monotonic()
+        recycle = not discard and self._expired(entry, now)
+        if discard or conn.closed or recycle or self._closed:
+            with self._cond:
+                if recycle:
+                    self.recycled += 1
+                elif not self._closed:
+                    self.discarded += 1
+                self._size -= 1
+                self._cond.notify()
+            self._close(entry)
+            return
+
+        entry.last_used = now
+        with self._cond:
+            self._idle.append(entry)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None):
+        """Checked-out connection; discarded if the block fails with a connection error."""
+        conn = self.getconn(timeout)
+        discard = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            discard = True
+            raise
+        finally:
+            self.putconn(conn, discard=discard)
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for entry in idle:
+            self._close(entry)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            self._reset_after_fork()
+            return {
+                "name": self.name,
+                "pid": os.getpid(),
+                "min": self.minconn,
+                "max": self.maxconn,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": len(self._in_use),
+                "waiting": self._waiting,
+                "created": self.created,
+                "checkouts": self.checkouts,
+                "reuse_ratio": round(1 - self.created / self.checkouts, 4) if self.checkouts else None,
+                "health_checks": self.health_checks,
+                "discarded": self.discarded,
+                "recycled": self.recycled,
+                "timeouts": self.timeouts,
+                "waits": self.waits,
+                "avg_wait_ms": round(self.wait_seconds / self.waits * 1000, 2) if self.waits else 0.0,
+                "max_wait_ms": round(self.max_wait_seconds * 1000, 2),
+            }
+
+
+def connect_kwargs_from_env() -> Optional[Dict[str, Any]]:
+    """psycopg2.connect() arguments from POSTGRES_*; None if not fully configured."""
+    params = {
+        "host": os.getenv("POSTGRES_HOST"),
+        "port": os.getenv("POSTGRES_PORT"),
+        "user": os.getenv("POSTGRES_USER"),
+        "password": os.getenv("POSTGRES_PASSWORD"),
+        "database": os.getenv("POSTGRES_DB"),
+    }
+    if not all(params.values()):
+        return None
+    params["cursor_factory"] = RealDictCursor
+    return params
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> Optional[ConnectionPool]:
+    """Process-wide pool, created on first use; None if POSTGRES_* is incomplete."""
+    global _pool
+    if _pool is not None:
+        return _pool
+    with _pool_lock:
+        if _pool is None:
+            connect_kwargs = connect_kwargs_from_env()
+            if connect_kwargs is None:
+                return None
+            _pool = ConnectionPool(connect_kwargs)
+        return _pool
+
+
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
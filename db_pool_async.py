@@ -0,0 +1,170 @@
+"""
+asyncpg pool for the FastAPI report services - used when DB_DRIVER=asyncpg.
+
+Same POSTGRES_* and DB_POOL_* settings as db_pool.py. The handlers become
+`async def`, so concurrent reports are no longer capped by FastAPI's
+threadpool, only by DB_POOL_MAX.
+
+DB_POOL_MAX_LIFETIME recycles connections by age, as in db_pool.py. asyncpg has no
+such option (its max_inactive_connection_lifetime is an idle timeout), so the age is
+checked when a connection is returned: one older than the limit is closed and the
+pool opens a new one on demand. db_pool.py also checks at checkout, here an expired
+connection may serve that one last checkout. Idle connections are closed after the
+same number of seconds - by then they are past the age limit anyway.
+"""
+import asyncio
+import itertools
+import os
+import re
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+from db_pool import (
+    DB_POOL_MAX,
+    DB_POOL_MAX_LIFETIME,
+    DB_POOL_MIN,
+    DB_POOL_TIMEOUT,
+    PoolTimeout,
+    connect_kwargs_from_env,
+)
+
+try:
+    import asyncpg
+except ImportError:  # pragma: no cover - optional dependency
+    asyncpg = None
+
+DB_DRIVER = os.getenv("DB_DRIVER", "psycopg2").lower()
+
+if DB_DRIVER == "asyncpg" and asyncpg is None:
+    print("⚠ DB_DRIVER=asyncpg, but asyncpg is not installed - using psycopg2")
+elif DB_DRIVER not in ("psycopg2", "asyncpg"):
+    print(f"⚠ Unknown DB_DRIVER '{DB_DRIVER}' - using psycopg2")
+
+USE_ASYNCPG = DB_DRIVER == "asyncpg" and asyncpg is not None
+
+# Checkouts slower than this count as waits for a free connection
+WAIT_THRESHOLD = 0.001
+
+
+def to_asyncpg_query(query: str) -> str:
+    """psycopg2 placeholders (%s) -> asyncpg ($1, $2, ...); %% (a literal %) -> %."""
+    numbers = itertools.count(1)
+    return re.sub(r"%[s%]", lambda match: "%" if match.group() == "%%" else f"${next(numbers)}", query)
+
+
+class AsyncConnectionPool:
+    def __init__(self, pool=None, timeout: float = DB_POOL_TIMEOUT, max_lifetime: float = DB_POOL_MAX_LIFETIME):
+        self._pool = pool
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        # Backend pid -> when the connection was opened (asyncpg proxies cannot carry attributes)
+        self._opened_at: Dict[int, float] = {}
+        self.checkouts = 0
+        self.timeouts = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.recycled = 0
+
+    @classmethod
+    async def create(cls, connect_kwargs: Dict[str, Any]) -> "AsyncConnectionPool":
+        self = cls()
+        self._pool = await asyncpg.create_pool(
+            host=connect_kwargs["host"],
+            port=int(connect_kwargs["port"]),
+            user=connect_kwargs["user"],
+            password=connect_kwargs["password"],
+            database=connect_kwargs["database"],
+            min_size=DB_POOL_MIN,
+            max_size=DB_POOL_MAX,
+            max_inactive_connection_lifetime=max(DB_POOL_MAX_LIFETIME, 0),
+            init=self._opened,
+        )
+        return self
+
+    async def _opened(self, conn) -> None:
+        self._opened_at[conn.get_server_pid()] = time.monotonic()
+
+    def _expired(self, conn) -> bool:
+        opened_at = self._opened_at.get(conn.get_server_pid())
+        return self.max_lifetime > 0 and opened_at is not None and time.monotonic() - opened_at > self.max_lifetime
+
+    async def _release(self, conn) -> None:
+        if not conn.is_closed() and self._expired(conn):
+            self.recycled += 1
+            self._opened_at.pop(conn.get_server_pid(), None)
+            # A closed connection goes back as a free slot, reconnected on the next acquire
+            try:
+                await conn.close(timeout=self.timeout)
+            except Exception:
+                conn.terminate()
+        await self._pool.release(conn)
+
+    @asynccontextmanager
+    async def connection(self):
+        started = time.monotonic()
+        try:
+            conn = await self._pool.acquire(timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise PoolTimeout(
+                f"Pool 'asyncpg': no free connection within {self.timeout:g}s "
+                f"({self._pool.get_size()}/{self._pool.get_max_size()} in use)"
+            )
+
+        elapsed = time.monotonic() - started
+        self.checkouts += 1
+        if elapsed > WAIT_THRESHOLD:
+            self.waits += 1
+            self.wait_seconds += elapsed
+            self.max_wait_seconds = max(self.max_wait_seconds, elapsed)
+        try:
+            yield conn
+        finally:
+            await self._release(conn)
+
+    async def close(self) -> None:
+        await self._pool.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": "asyncpg",
+            "pid": os.getpid(),
+            "min": self._pool.get_min_size(),
+            "max": self._pool.get_max_size(),
+            "size": self._pool.get_size(),
+            "idle": self._pool.get_idle_size(),
+            "in_use": self._pool.get_size() - self._pool.get_idle_size(),
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "waits": self.waits,
+            "avg_wait_ms": round(self.wait_seconds / self.waits * 1000, 2) if self.waits else 0.0,
+            "max_wait_ms": round(self.max_wait_seconds * 1000, 2),
+            "recycled": self.recycled,
+        }
+
+
+_pool: Optional[AsyncConnectionPool] = None
+_pool_lock = asyncio.Lock()
+
+
+async def get_async_pool() -> Optional[AsyncConnectionPool]:
+    """Process-wide asyncpg pool, created on first use; None if POSTGRES_* is incomplete."""
+    global _pool
+    if _pool is not None:
+        return _pool
+    async with _pool_lock:
+        if _pool is None:
+            connect_kwargs = connect_kwargs_from_env()
+            if connect_kwargs is None:
+                return None
+            _pool = await AsyncConnectionPool.create(connect_kwargs)
+        return _pool
+
+
+async def close_async_pool() -> None:
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
@@ -0,0 +1,242 @@
+"""
+In-process id <-> city_name index of the destinations tables (Timocom and Trans.eu).
+
+`_resolve_city_identifiers` in the report services answers from here, without a
+database round trip. The index is loaded at startup and refreshed:
+- every DESTINATIONS_REFRESH_SECONDS (default 15 min), and
+- right away on NOTIFY <DESTINATIONS_NOTIFY_CHANNEL> (default destinations_changed),
+  e.g. from the trigger installed by db_migrations.py
+
+Name lookups match the exact city_name first, then a case- and
+diacritic-insensitive key ("Łódź" == "lodz"). For duplicate names the lowest id
+wins, like the original `ORDER BY id LIMIT 1` query; `ids_for_name` returns every
+id with the exact name (PassingCityName reports). Misses fall back to the
+database, so cities added since the last refresh still resolve.
+"""
+import os
+import select
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, Optional, Tuple
+
+import psycopg2
+
+from db_pool import connect_kwargs_from_env
+
+DESTINATIONS_REFRESH_SECONDS = float(os.getenv("DESTINATIONS_REFRESH_SECONDS", "900"))
+DESTINATIONS_NOTIFY_CHANNEL = os.getenv("DESTINATIONS_NOTIFY_CHANNEL", "destinations_changed")
+
+DESTINATION_TABLES = {
+    "timocom": "public.destinations",
+    "transeu": 'public."DestinationsTransEU"',
+}
+
+# Letters that NFKD does not split into base letter + combining mark
+_FOLD = str.maketrans({"ł": "l", "đ": "d", "ø": "o", "ħ": "h", "ı": "i", "æ": "ae", "œ": "oe", "þ": "th"})
+
+
+def name_key(name: str) -> str:
+    """Case- and diacritic-insensitive lookup key for a city name."""
+    decomposed = unicodedata.normalize("NFKD", name.casefold())
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(stripped.translate(_FOLD).split())
+
+
+class DestinationsIndex:
+    """Immutable snapshot swapped atomically on refresh - lookups take no lock."""
+
+    def __init__(self, table: str):
+        self.table = table
+        self._snapshot = ({}, {}, {}, {})
+        self.loaded_at: Optional[float] = None
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, conn) -> int:
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT id, city_name FROM {self.table} ORDER BY id DESC;")
+            rows = cur.fetchall()
+
+        by_id, by_name, by_key, all_ids = {}, {}, {}, {}
+        # Descending ids: the lowest id is written last and wins for duplicate names
+        for row in rows:
+            city_id, city_name = row["id"], row["city_name"]
+            by_id[city_id] = city_name
+            if city_name is not None:
+                by_name[city_name] = city_id
+                by_key[name_key(city_name)] = city_id
+                all_ids.setdefault(city_name, []).append(city_id)
+
+        all_ids = {city_name: tuple(reversed(ids)) for city_name, ids in all_ids.items()}
+        self._snapshot = (by_id, by_name, by_key, all_ids)
+        self.loaded_at = time.time()
+        return len(by_id)
+
+    def name_for_id(self, identifier: int) -> Optional[str]:
+        name = self._snapshot[0].get(identifier)
+        if name is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return name
+
+    def id_for_name(self, name: str) -> Optional[Tuple[int, str]]:
+        """(id, canonical city_name) for an exact or normalized name match."""
+        by_id, by_name, by_key, _ = self._snapshot
+        city_id = by_name.get(name)
+        if city_id is None:
+            city_id = by_key.get(name_key(name))
+        if city_id is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return city_id, by_id[city_id]
+
+    def ids_for_name(self, name: str) -> Optional[Tuple[int, ...]]:
+        """All ids with exactly this city_name, ascending."""
+        ids = self._snapshot[3].get(name)
+        if ids is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return ids
+
+    def stats(self) -> Dict[str, Any]:
+        by_id, by_name, by_key, _ = self._snapshot
+        return {
+            "table": self.table,
+            "cities": len(by_id),
+            "names": len(by_name),
+            "normalized_names": len(by_key),
+            "loaded_at": self.loaded_at,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class DestinationsRegistry:
+    def __init__(
+        self,
+        tables: Dict[str, str] = DESTINATION_TABLES,
+        refresh_interval: float = DESTINATIONS_REFRESH_SECONDS,
+        channel: str = DESTINATIONS_NOTIFY_CHANNEL,
+    ):
+        self.indexes = {exchange: DestinationsIndex(table) for exchange, table in tables.items()}
+        self.refresh_interval = refresh_interval
+        self.channel = channel
+        self.refreshes = 0
+        self.notifications = 0
+        self.last_error: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._conn = None
+
+    def get(self, exchange: str) -> DestinationsIndex:
+        return self.indexes[exchange.lower()]
+
+    def _connection(self):
+        # Dedicated connection: LISTEN needs a session of its own, outside the pool
+        if self._conn is None or self._conn.closed:
+            connect_kwargs = connect_kwargs_from_env()
+            if connect_kwargs is None:
+                return None
+            self._conn = psycopg2.connect(**connect_kwargs)
+            self._conn.autocommit = True
+            if self.channel:
+                with self._conn.cursor() as cur:
+                    cur.execute(f"LISTEN {self.channel};")
+        return self._conn
+
+    def refresh(self) -> bool:
+        try:
+            conn = self._connection()
+        except Exception as exc:
+            self.last_error = str(exc)
+            print(f"⚠ Destinations refresh failed: {exc}")
+            self._close_connection()
+            return False
+        if conn is None:
+            return False
+
+        # Each table separately - a missing table must not block the other exchange
+        counts, errors = {}, {}
+        for exchange, index in self.indexes.items():
+            try:
+                counts[exchange] = index.load(conn)
+            except Exception as exc:
+                errors[exchange] = str(exc).strip()
+        if conn.closed:
+            self._close_connection()
+
+        self.refreshes += 1
+        self.last_error = "; ".join(f"{exchange}: {error}" for exchange, error in errors.items()) or None
+        print(f"🗺️ Destinations loaded: {counts}" + (f", failed: {errors}" if errors else ""))
+        return not errors
+
+    def _close_connection(self) -> None:
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+
+    def _wait_for_change(self, timeout: float) -> None:
+        """Returns on NOTIFY, after timeout or on stop()."""
+        deadline = time.monotonic() + timeout
+        while not self._stop.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            conn = self._conn
+            if conn is None or conn.closed or not self.channel:
+                self._stop.wait(remaining)
+                return
+            try:
+                # Wake up at least every second so stop() is noticed
+                if select.select([conn], [], [], min(remaining, 1.0))[0]:
+                    conn.poll()
+                    if conn.notifies:
+                        conn.notifies.clear()
+                        self.notifications += 1
+                        return
+            except Exception as exc:
+                print(f"⚠ Destinations LISTEN failed: {exc}")
+                self._close_connection()
+                return
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wait_for_change(self.refresh_interval if self.refreshes else min(self.refresh_interval, 30))
+            if not self._stop.is_set():
+                self.refresh()
+
+    def start(self) -> None:
+        """Initial load (blocking) and the background refresh thread."""
+        if self._thread is not None:
+            return
+        self.refresh()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="destinations-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self._close_connection()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "refresh_interval_seconds": self.refresh_interval,
+            "channel": self.channel,
+            "refreshes": self.refreshes,
+            "notifications": self.notifications,
+            "last_error": self.last_error,
+            "exchanges": {exchange: index.stats() for exchange, index in self.indexes.items()},
+        }
+
+
+destinations = DestinationsRegistry()
@@ -0,0 +1,169 @@
+"""
+Współdzielony klient HTTP dla proxy do Backend API i AWS Location Service.
+
+Jedna sesja `requests` na proces (worker gunicorna) z pulą połączeń
+keep-alive, dzięki czemu kolejne wyceny nie płacą za ponowny handshake
+TCP/TLS. Pula zbiera statystyki (in use / idle / created / reused).
+"""
+import os
+import socket
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# Konfiguracja puli (zmienne środowiskowe)
+# HTTP_POOL_CONNECTIONS - ile hostów (osobnych pul) trzymamy w pamięci
+# HTTP_POOL_MAXSIZE     - maksymalna liczba połączeń do jednego hosta
+# HTTP_POOL_BLOCK       - czy czekać na wolne połączenie zamiast otwierać dodatkowe
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "4"))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "10"))
+HTTP_POOL_BLOCK = os.getenv("HTTP_POOL_BLOCK", "false").lower() in ("1", "true", "yes")
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "0"))
+
+# TCP keep-alive - wykrywa martwe połączenia trzymane w puli
+_SOCKET_OPTIONS = HTTPConnectionPool.ConnectionCls.default_socket_options + [
+    (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+]
+
+
+class _CountingPoolMixin:
+    """Liczy połączenia utworzone, ponownie użyte i aktualnie wypożyczone"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.stats_created = 0
+        self.stats_checkouts = 0
+        self.stats_in_use = 0
+
+    def _new_conn(self):
+        with self._stats_lock:
+            self.stats_created += 1
+        return super()._new_conn()
+
+    def _get_conn(self, timeout=None):
+        conn = super()._get_conn(timeout=timeout)
+        with self._stats_lock:
+            self.stats_checkouts += 1
+            self.stats_in_use += 1
+        return conn
+
+    def _put_conn(self, conn):
+        with self._stats_lock:
+            self.stats_in_use = max(0, self.stats_in_use - 1)
+        return super()._put_conn(conn)
+
+    def idle_count(self):
+        """Liczba otwartych połączeń czekających w puli"""
+        queue = getattr(self, 'pool', None)
+        if queue is None:
+            return 0
+        with queue.mutex:
+            return sum(1 for conn in queue.queue if conn is not None)
+
+    def snapshot(self):
+        with self._stats_lock:
+            return {
+                'in_use': self.stats_in_use,
+                'idle': self.idle_count(),
+                'created': self.stats_created,
+                'reused': max(0, self.stats_checkouts - self.stats_created),
+                'requests': self.stats_checkouts,
+                'maxsize': self.pool.maxsize if self.pool is not None else 0,
+            }
+
+
+class _CountingHTTPConnectionPool(_CountingPoolMixin, HTTPConnectionPool):
+    pass
+
+
+class _CountingHTTPSConnectionPool(_CountingPoolMixin, HTTPSConnectionPool):
+    pass
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter z licznikami puli i TCP keep-alive"""
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        pool_kwargs.setdefault('socket_options', _SOCKET_OPTIONS)
+        super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _CountingHTTPConnectionPool,
+            'https': _CountingHTTPSConnectionPool,
+        }
+
+    def pool_stats(self):
+        """Statystyki per host: {'https://host:443': {...}}"""
+        stats = {}
+        pools = self.poolmanager.pools
+        with pools.lock:
+            items = [(key, pools._container[key]) for key in list(pools._container.keys())]
+        for key, pool in items:
+            if isinstance(pool, _CountingPoolMixin):
+                stats[f"{key.key_scheme}://{key.key_host}:{key.key_port}"] = pool.snapshot()
+        return stats
+
+
+_session = None
+_adapter = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def _build_session():
+    adapter = PooledHTTPAdapter(
+        pool_connections=HTTP_POOL_CONNECTIONS,
+        pool_maxsize=HTTP_POOL_MAXSIZE,
+        pool_block=HTTP_POOL_BLOCK,
+        max_retries=HTTP_MAX_RETRIES,
+    )
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['Connection'] = 'keep-alive'
+    return session, adapter
+
+
+def get_http_session():
+    """
+    Zwraca sesję HTTP współdzieloną w obrębie procesu.
+
+    Sesja jest tworzona leniwie i odtwarzana po forku (gunicorn),
+    żeby workery nie dzieliły gniazd odziedziczonych po masterze.
+    """
+    global _session, _adapter, _session_pid
+
+    pid = os.getpid()
+    if _session is not None and _session_pid == pid:
+        return _session
+
+    with _session_lock:
+        if _session is None or _session_pid != pid:
+            _session, _adapter = _build_session()
+            _session_pid = pid
+            print(f"🔌 HTTP pool: maxsize={HTTP_POOL_MAXSIZE}/host, hosts={HTTP_POOL_CONNECTIONS}, block={HTTP_POOL_BLOCK} (pid {pid})")
+    return _session
+
+
+def get_pool_stats():
+    """Statystyki puli połączeń bieżącego workera"""
+    get_http_session()
+    hosts = _adapter.pool_stats()
+    totals = {'in_use': 0, 'idle': 0, 'created': 0, 'reused': 0, 'requests': 0}
+    for host_stats in hosts.values():
+        for key in totals:
+            totals[key] += host_stats[key]
+
+    return {
+        'pid': _session_pid,
+        'config': {
+            'pool_connections': HTTP_POOL_CONNECTIONS,
+            'pool_maxsize': HTTP_POOL_MAXSIZE,
+            'pool_block': HTTP_POOL_BLOCK,
+            'max_retries': HTTP_MAX_RETRIES,
+        },
+        'totals': totals,
+        'hosts': hosts,
+    }
@@ -0,0 +1,152 @@
+"""
+Provider JSON dla Flaska - szybki enkoder (orjson), jeśli jest dostępny.
+
+Wybór przez JSON_ENCODER:
+- auto   - orjson jeśli zainstalowany, w przeciwnym razie stdlib (domyślnie)
+- orjson - wymuś orjson (bez niego ostrzeżenie i stdlib)
+- stdlib - zawsze wbudowany moduł json
+
+Wyjście jest bajt w bajt takie jak z DefaultJSONProvider: posortowane
+klucze, daty jako RFC 822, Decimal jako string, ensure_ascii (znaki spoza
+ASCII jako \\uXXXX, jak w stdlib). orjson jest używany tylko tam, gdzie
+potrafi dać ten sam wynik - pozostałe przypadki idą przez stdlib:
+- separators inne niż kompaktowe (',', ':') - także dumps() bez separators,
+  bo stdlib domyślnie wstawia spacje (', ', ': ')
+- indent inny niż 2, cls, allow_nan i pozostałe opcje json.dumps
+- NaN / Infinity (orjson zapisałby null, stdlib zapisuje NaN)
+- obiekty, których orjson nie obsłuży (np. liczby całkowite > 64 bit)
+Jedyna różnica: słownik z kluczami różnych typów (np. 1 i 'a') przy
+sort_keys - stdlib rzuca TypeError, orjson sortuje klucze jako stringi.
+"""
+import math
+import os
+import re
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - zależność opcjonalna
+    orjson = None
+
+JSON_ENCODER = os.getenv("JSON_ENCODER", "auto").lower()
+
+# json.dumps(ensure_ascii=True) escapuje wszystko poza spacja..'~' (także DEL);
+# znaki sterujące orjson escapuje już tak samo jak stdlib
+_NON_ASCII = re.compile('[^\x00-\x7e]')
+
+
+def _escape_non_ascii(match):
+    code = ord(match.group())
+    if code < 0x10000:
+        return '\\u%04x' % code
+    code -= 0x10000
+    return '\\u%04x\\u%04x' % (0xd800 | (code >> 10), 0xdc00 | (code & 0x3ff))
+
+
+def _ascii(text):
+    return text if text.isascii() and '\x7f' not in text else _NON_ASCII.sub(_escape_non_ascii, text)
+
+
+def _has_non_finite(obj):
+    """Czy w obiekcie jest float NaN / Infinity (orjson zapisałby go jako null)"""
+    if isinstance(obj, float):
+        return not math.isfinite(obj)
+    if isinstance(obj, dict):
+        return any(_has_non_finite(value) for value in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return any(_has_non_finite(value) for value in obj)
+    return False
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """DefaultJSONProvider z serializacją przez orjson"""
+
+    def _options(self, sort_keys=None, indent=None):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        if self.sort_keys if sort_keys is None else sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def _dumps_bytes(self, obj, sort_keys=None, indent=None, default=None, extra_option=0):
+        return orjson.dumps(
+            obj,
+            default=default or self.default,
+            option=self._options(sort_keys, indent) | extra_option,
+        )
+
+    @staticmethod
+    def _same_as_stdlib(kwargs):
+        """Czy orjson da dla tych opcji ten sam tekst co json.dumps"""
+        if set(kwargs) - {'sort_keys', 'indent', 'default', 'separators', 'ensure_ascii'}:
+            return False
+        indent = kwargs.get('indent')
+        separators = kwargs.get('separators')
+        separators = tuple(separators) if separators is not None else None
+        if indent is None:
+            return separators == (',', ':')
+        return indent == 2 and separators in (None, (',', ': '))
+
+    def _encode(self, obj, body, ensure_ascii):
+        """Tekst z wyjścia orjson albo None, gdy trzeba użyć stdlib (NaN / Infinity)"""
+        if b'null' in body and _has_non_finite(obj):
+            return None
+        text = body.decode('utf-8')
+        return _ascii(text) if ensure_ascii else text
+
+    def dumps(self, obj, **kwargs):
+        if not self._same_as_stdlib(kwargs):
+            return super().dumps(obj, **kwargs)
+
+        try:
+            body = self._dumps_bytes(
+                obj,
+                sort_keys=kwargs.get('sort_keys'),
+                indent=kwargs.get('indent'),
+                default=kwargs.get('default'),
+            )
+        except TypeError:
+            return super().dumps(obj, **kwargs)
+
+        text = self._encode(obj, body, kwargs.get('ensure_ascii', self.ensure_ascii))
+        return super().dumps(obj, **kwargs) if text is None else text
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+
+        try:
+            body = self._dumps_bytes(obj, indent=indent, extra_option=orjson.OPT_APPEND_NEWLINE)
+        except TypeError:
+            return super().response(*args, **kwargs)
+
+        if self.ensure_ascii or b'null' in body:
+            text = self._encode(obj, body, self.ensure_ascii)
+            if text is None:
+                return super().response(*args, **kwargs)
+            body = text.encode('utf-8')
+
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def configure_json(app):
+    """Ustawia app.json według JSON_ENCODER"""
+    if JSON_ENCODER in ('auto', 'orjson') and orjson is not None:
+        app.json = OrjsonProvider(app)
+        print(f"⚡ JSON: orjson {orjson.__version__}")
+        return app.json
+
+    if JSON_ENCODER == 'orjson':
+        print("⚠ JSON_ENCODER=orjson, ale orjson nie jest zainstalowany - używam stdlib")
+    elif JSON_ENCODER not in ('auto', 'stdlib'):
+        print(f"⚠ Nieznany JSON_ENCODER '{JSON_ENCODER}' - używam stdlib")
+
+    app.json = DefaultJSONProvider(app)
+    return app.json
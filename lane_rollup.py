@@ -0,0 +1,392 @@
+"""
+Hourly lane rollup for /route-general-report.
+
+For every (starting_id, destination_id, enlistment_hour) the rollup keeps SUM and
+COUNT of each price column of public.offers / "OffersTransEU". Statement-level
+triggers (transition tables) apply every INSERT / UPDATE / DELETE to the rollup in
+the same transaction, so it is always current and the report no longer scans raw
+offers.
+
+The report computes ROUND(sum / count, 4). PostgreSQL's AVG(numeric) is exactly
+that numeric division, so the numbers match the raw query. Name mode adds up
+sums and counts of every id carrying the name, just as the raw GROUP BY does.
+Offers with a NULL enlistment_hour are rolled up under NULL_HOUR (a primary key
+column cannot be NULL) and reported as NULL again, last like in the raw ORDER BY.
+Offers with a NULL starting_id or destination_id are not rolled up - the report
+never selects them.
+
+Usage:
+    python lane_rollup.py install [timocom|transeu ...]   # tables, triggers, backfill
+    python lane_rollup.py rebuild [timocom|transeu ...]   # recompute from raw offers
+    python lane_rollup.py verify <exchange> <start_id> <destination_id>
+    python lane_rollup.py drop [timocom|transeu ...]
+
+REPORT_ROLLUP=auto (default) reads from the rollup wherever it is installed,
+on assumes it is installed, off always queries raw offers.
+"""
+import os
+import sys
+from dataclasses import dataclass
+from typing import Dict, Iterable, Set, Tuple
+
+import psycopg2
+
+from db_pool import connect_kwargs_from_env
+
+REPORT_ROLLUP = os.getenv("REPORT_ROLLUP", "auto").lower()
+ROLLUP_SCHEMA = "report_rollup"
+
+
+@dataclass(frozen=True)
+class RollupSpec:
+    source: str
+    destinations: str
+    table: str
+    # price column -> alias in the report
+    columns: Tuple[Tuple[str, str], ...]
+
+    @property
+    def target(self) -> str:
+        return f"{ROLLUP_SCHEMA}.{self.table}"
+
+    @property
+    def function(self) -> str:
+        return f"{ROLLUP_SCHEMA}.{self.table}_apply"
+
+
+ROLLUPS: Dict[str, RollupSpec] = {
+    "timocom": RollupSpec(
+        source="public.offers",
+        destinations="public.destinations",
+        table="offers_hourly",
+        columns=(
+            ("trailer_avg_price_per_km", "avg_trailer_price"),
+            ("vehicle_up_to_3_5_t_avg_price_per_km", "avg_3_5t_price"),
+            ("vehicle_up_to_12_t_avg_price_per_km", "avg_12t_price"),
+        ),
+    ),
+    "transeu": RollupSpec(
+        source='public."OffersTransEU"',
+        destinations='public."DestinationsTransEU"',
+        table="offers_transeu_hourly",
+        columns=(("lorry_avg_price_per_km", "avg_lorry_price"),),
+    ),
+}
+
+# Rollup key of offers without an hour (hours are 0-23)
+NULL_HOUR = -1
+
+_KEYS = "starting_id, destination_id, enlistment_hour"
+_KEY_VALUES = f"starting_id, destination_id, COALESCE(enlistment_hour, {NULL_HOUR})"
+_KEYS_NOT_NULL = "starting_id IS NOT NULL AND destination_id IS NOT NULL"
+# enlistment_hour as the raw report returns it
+_REPORT_HOUR = f"NULLIF(r.enlistment_hour, {NULL_HOUR})"
+
+# Exchanges whose rollup is installed (filled by detect_installed() at startup)
+installed: Set[str] = set()
+
+
+def _aggregates(spec: RollupSpec, sign: str = "") -> str:
+    return ",\n".join(
+        f"{sign}COALESCE(SUM({column}), 0), {sign}COUNT({column})" for column, _ in spec.columns
+    )
+
+
+def _state_columns(spec: RollupSpec) -> str:
+    return ", ".join(f"{column}_sum, {column}_count" for column, _ in spec.columns)
+
+
+def _upsert_sql(spec: RollupSpec, rows: str, sign: str = "") -> str:
+    updates = ",\n".join(
+        f"{column}_sum = t.{column}_sum + EXCLUDED.{column}_sum, "
+        f"{column}_count = t.{column}_count + EXCLUDED.{column}_count"
+        for column, _ in spec.columns
+    )
+    return f"""
+        INSERT INTO {spec.target} AS t ({_KEYS}, {_state_columns(spec)})
+        SELECT {_KEY_VALUES}, {_aggregates(spec, sign)}
+        FROM {rows}
+        WHERE {_KEYS_NOT_NULL}
+        GROUP BY {_KEY_VALUES}
+        -- Rows locked in key order - concurrent bulk loads cannot deadlock on the rollup
+        ORDER BY {_KEY_VALUES}
+        ON CONFLICT ({_KEYS}) DO UPDATE SET
+        {updates}
+    """
+
+
+def install_sql(spec: RollupSpec) -> Iterable[str]:
+    yield f"CREATE SCHEMA IF NOT EXISTS {ROLLUP_SCHEMA};"
+    # Keys take the column types of the source table
+    yield f"""
+        CREATE TABLE IF NOT EXISTS {spec.target} AS
+        SELECT {_KEYS} FROM {spec.source} WITH NO DATA;
+    """
+    for column, _ in spec.columns:
+        yield f"ALTER TABLE {spec.target} ADD COLUMN IF NOT EXISTS {column}_sum numeric NOT NULL DEFAULT 0;"
+        yield f"ALTER TABLE {spec.target} ADD COLUMN IF NOT EXISTS {column}_count bigint NOT NULL DEFAULT 0;"
+    yield f"""
+        DO $$ BEGIN
+            ALTER TABLE {spec.target} ADD PRIMARY KEY ({_KEYS});
+        EXCEPTION WHEN invalid_table_definition THEN NULL;
+        END $$;
+    """
+    yield f"""
+        CREATE OR REPLACE FUNCTION {spec.function}() RETURNS trigger LANGUAGE plpgsql AS $fn$
+        BEGIN
+            IF TG_OP = 'TRUNCATE' THEN
+                DELETE FROM {spec.target};
+                RETURN NULL;
+            END IF;
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                {_upsert_sql(spec, "old_rows", sign="-")};
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                {_upsert_sql(spec, "new_rows")};
+            END IF;
+            RETURN NULL;
+        END
+        $fn$;
+    """
+    yield from triggers_sql(spec)
+
+
+def triggers_sql(spec: RollupSpec) -> Iterable[str]:
+    """Triggers on the source table - also reinstalled when db_migrations.py partitions it."""
+    trigger = f"{spec.table}_rollup"
+    # Transition tables allow a single event per trigger
+    yield from drop_triggers_sql(spec)
+    yield f"""
+        CREATE TRIGGER {trigger}_ins AFTER INSERT ON {spec.source}
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION {spec.function}();
+    """
+    yield f"""
+        CREATE TRIGGER {trigger}_upd AFTER UPDATE ON {spec.source}
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION {spec.function}();
+    """
+    yield f"""
+        CREATE TRIGGER {trigger}_del AFTER DELETE ON {spec.source}
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION {spec.function}();
+    """
+    yield f"""
+        CREATE TRIGGER {trigger}_trunc AFTER TRUNCATE ON {spec.source}
+        FOR EACH STATEMENT EXECUTE FUNCTION {spec.function}();
+    """
+
+
+def rebuild_sql(spec: RollupSpec) -> Iterable[str]:
+    # SHARE blocks writes to the source (and so the triggers) while the rollup is recomputed
+    yield f"LOCK TABLE {spec.source} IN SHARE MODE;"
+    yield f"DELETE FROM {spec.target};"
+    yield f"""
+        INSERT INTO {spec.target} ({_KEYS}, {_state_columns(spec)})
+        SELECT {_KEY_VALUES}, {_aggregates(spec)}
+        FROM {spec.source}
+        WHERE {_KEYS_NOT_NULL}
+        GROUP BY {_KEY_VALUES};
+    """
+    yield f"ANALYZE {spec.target};"
+
+
+def drop_triggers_sql(spec: RollupSpec) -> Iterable[str]:
+    trigger = f"{spec.table}_rollup"
+    for suffix in ("ins", "upd", "del", "trunc"):
+        yield f"DROP TRIGGER IF EXISTS {trigger}_{suffix} ON {spec.source};"
+
+
+def drop_sql(spec: RollupSpec) -> Iterable[str]:
+    yield from drop_triggers_sql(spec)
+    yield f"DROP FUNCTION IF EXISTS {spec.function}();"
+    yield f"DROP TABLE IF EXISTS {spec.target};"
+
+
+def report_query(exchange: str, passing_city_name: bool) -> str:
+    """
+    Rollup version of the report query; same parameters and output columns as the raw one:
+    (start_id, dest_id), or (start_name, dest_name, start_ids, dest_ids) in name mode.
+    """
+    spec = ROLLUPS[exchange]
+    if passing_city_name:
+        averages = ",\n".join(
+            f"ROUND(SUM(r.{column}_sum) / NULLIF(SUM(r.{column}_count), 0), 4) AS {alias}"
+            for column, alias in spec.columns
+        )
+        having = "\n    OR ".join(f"SUM(r.{column}_count) > 0" for column, _ in spec.columns)
+        # Ids of every city carrying the name are resolved by the caller - no joins with destinations
+        return f"""
+            SELECT
+                {_REPORT_HOUR} AS enlistment_hour,
+                CAST(%s AS text) AS starting_city,
+                CAST(%s AS text) AS destination_city,
+                {averages}
+            FROM {spec.target} AS r
+            WHERE r.starting_id = ANY(%s::bigint[])
+              AND r.destination_id = ANY(%s::bigint[])
+            GROUP BY  r.enlistment_hour
+            HAVING
+                {having}
+            ORDER BY  {_REPORT_HOUR};
+        """
+
+    averages = ",\n".join(
+        f"ROUND(r.{column}_sum / NULLIF(r.{column}_count, 0)::numeric, 4) AS {alias}"
+        for column, alias in spec.columns
+    )
+    having = "\n    OR ".join(f"r.{column}_count > 0" for column, _ in spec.columns)
+    return f"""
+        SELECT
+            {_REPORT_HOUR} AS enlistment_hour,
+            {averages}
+        FROM {spec.target} AS r
+        WHERE r.starting_id = %s
+          AND r.destination_id = %s
+          AND ({having})
+        ORDER BY  {_REPORT_HOUR};
+    """
+
+
+def batch_report_query(exchange: str) -> str:
+    """
+    Rollup version of the batch report query: parameters are parallel arrays
+    (lane numbers, starting ids, destination ids), one element per id pair.
+    """
+    spec = ROLLUPS[exchange]
+    averages = ",\n".join(
+        f"ROUND(SUM(r.{column}_sum) / NULLIF(SUM(r.{column}_count), 0), 4) AS {alias}"
+        for column, alias in spec.columns
+    )
+    having = "\n    OR ".join(f"SUM(r.{column}_count) > 0" for column, _ in spec.columns)
+    return f"""
+        SELECT
+            l.lane,
+            {_REPORT_HOUR} AS enlistment_hour,
+            {averages}
+        FROM unnest(%s::int[], %s::bigint[], %s::bigint[]) AS l(lane, starting_id, destination_id)
+        JOIN {spec.target} AS r
+          ON r.starting_id = l.starting_id
+         AND r.destination_id = l.destination_id
+        GROUP BY  l.lane, r.enlistment_hour
+        HAVING
+            {having}
+        ORDER BY  l.lane, {_REPORT_HOUR};
+    """
+
+
+def use_rollup(exchange: str) -> bool:
+    if REPORT_ROLLUP == "off":
+        return False
+    if REPORT_ROLLUP == "on":
+        return exchange in ROLLUPS
+    return exchange in installed
+
+
+def detect_installed(conn=None) -> Set[str]:
+    """Checks which rollup tables exist (REPORT_ROLLUP=auto)."""
+    installed.clear()
+    if REPORT_ROLLUP != "auto":
+        return installed
+
+    own_conn = conn is None
+    try:
+        if own_conn:
+            connect_kwargs = connect_kwargs_from_env()
+            if connect_kwargs is None:
+                return installed
+            conn = psycopg2.connect(**connect_kwargs)
+        with conn.cursor() as cur:
+            for exchange, spec in ROLLUPS.items():
+                cur.execute("SELECT to_regclass(%s) IS NOT NULL AS ok;", (spec.target,))
+                if cur.fetchone()["ok"]:
+                    installed.add(exchange)
+        conn.rollback()
+    except Exception as exc:
+        print(f"⚠ Lane rollup detection failed: {exc}")
+    finally:
+        if own_conn and conn is not None:
+            conn.close()
+
+    print(f"📊 Lane rollup: {sorted(installed) or 'not installed'} (REPORT_ROLLUP={REPORT_ROLLUP})")
+    return installed
+
+
+def _execute(conn, statements: Iterable[str]) -> None:
+    with conn.cursor() as cur:
+        for statement in statements:
+            cur.execute(statement)
+
+
+def _raw_query(spec: RollupSpec) -> str:
+    averages = ",\n".join(f"ROUND(AVG(o.{column}), 4) AS {alias}" for column, alias in spec.columns)
+    having = "\n    OR ".join(f"AVG(o.{column}) IS NOT NULL" for column, _ in spec.columns)
+    return f"""
+        SELECT o.enlistment_hour, {averages}
+        FROM {spec.source} AS o
+        WHERE o.starting_id = %s AND o.destination_id = %s
+        GROUP BY o.enlistment_hour
+        HAVING {having}
+        ORDER BY o.enlistment_hour;
+    """
+
+
+def verify(conn, exchange: str, start_id: int, destination_id: int) -> bool:
+    """Compares the rollup report with the raw AVG query for one lane."""
+    spec = ROLLUPS[exchange]
+    with conn.cursor() as cur:
+        cur.execute(_raw_query(spec), (start_id, destination_id))
+        raw = [dict(row) for row in cur.fetchall()]
+        cur.execute(report_query(exchange, False), (start_id, destination_id))
+        rolled = [dict(row) for row in cur.fetchall()]
+    conn.rollback()
+
+    ok = raw == rolled
+    print(f"{'✅' if ok else '❌'} {exchange} {start_id} -> {destination_id}: {len(raw)} raw rows, {len(rolled)} rollup rows")
+    if not ok:
+        for expected, actual in zip(raw, rolled):
+            if expected != actual:
+                print(f"   raw:    {expected}\n   rollup: {actual}")
+                break
+    return ok
+
+
+def main(argv) -> int:
+    if not argv or argv[0] not in ("install", "rebuild", "verify", "drop"):
+        print(__doc__)
+        return 2
+
+    connect_kwargs = connect_kwargs_from_env()
+    if connect_kwargs is None:
+        print("Database environment variables are not fully configured.")
+        return 1
+
+    command, args = argv[0], argv[1:]
+    conn = psycopg2.connect(**connect_kwargs)
+    try:
+        if command == "verify":
+            exchange, start_id, destination_id = args[0].lower(), int(args[1]), int(args[2])
+            return 0 if verify(conn, exchange, start_id, destination_id) else 1
+
+        for exchange in [a.lower() for a in args] or list(ROLLUPS):
+            spec = ROLLUPS[exchange]
+            if command == "drop":
+                statements = list(drop_sql(spec))
+            elif command == "install":
+                statements = [*install_sql(spec), *rebuild_sql(spec)]
+            else:
+                statements = list(rebuild_sql(spec))
+            # One transaction per exchange: triggers and backfill appear together
+            _execute(conn, statements)
+            conn.commit()
+            print(f"✅ {command}: {exchange} ({spec.target})")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,22 +1,29 @@
 import os
+import uuid
+from contextlib import AsyncExitStack, ExitStack, asynccontextmanager, contextmanager
 from decimal import Decimal
-from typing import Any, Dict, List, Optional, Tuple, Literal
+from functools import partial
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Literal
 
-import psycopg2
-from psycopg2.extras import RealDictCursor
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, ConfigDict, Field, model_validator
 
+from db_pool import PoolTimeout, close_pool, get_pool
+from db_pool_async import USE_ASYNCPG, close_async_pool, get_async_pool, to_asyncpg_query
+from destinations_index import destinations
+from lane_rollup import NULL_HOUR, batch_report_query, detect_installed, report_query, use_rollup
+from region_mapping import UNMAPPED, RegionMapping, transeu_to_timocom
+from report_stream import ClosingStreamingResponse, ReportStream, stream_format
+
 
 load_dotenv()
 
-DB_HOST = os.getenv("POSTGRES_HOST")
-DB_PORT = os.getenv("POSTGRES_PORT")
-DB_USER = os.getenv("POSTGRES_USER")
-DB_NAME = os.getenv("POSTGRES_DB")
-DB_PASSWORD = os.getenv("POSTGRES_PASSWORD")
+REPORT_BATCH_MAX_LANES = int(os.getenv("REPORT_BATCH_MAX_LANES", "5000"))
+REPORT_STREAM_BATCH_ROWS = int(os.getenv("REPORT_STREAM_BATCH_ROWS", "2000"))
 
 
 class RouteRequest(BaseModel):
@@ -27,9 +34,12 @@ class RouteRequest(BaseModel):
     starting_name: Optional[str] = Field(default=None, description="City name of the starting location.")
     destination_id: Optional[int] = Field(default=None, description="Identifier of the destination city.")
     destination_name: Optional[str] = Field(default=None, description="City name of the destination.")
-    freight_exchange: Literal["Timocom", "Transeu"] = Field(
+    freight_exchange: Literal["Timocom", "Transeu", "Both"] = Field(
         default="Timocom",
-        description="Select the freight exchange data source.",
+        description=(
+            "Select the freight exchange data source. Both: starting/destination are Trans.eu cities, "
+            "TimoCom uses the mapped regions and the hourly rows carry the prices of both exchanges."
+        ),
     )
 
     @model_validator(mode="after")
@@ -41,21 +51,51 @@ class RouteRequest(BaseModel):
         return self
 
 
+class BatchRouteRequest(BaseModel):
+    lanes: List[RouteRequest] = Field(
+        ...,
+        min_length=1,
+        max_length=REPORT_BATCH_MAX_LANES,
+        description="Lanes to report on; each one takes the same fields as /route-general-report.",
+    )
+
+
+@contextmanager
 def _get_db_connection():
-    if not all([DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_NAME]):
+    try:
+        pool = get_pool()
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=f"Database connection failed: {exc}")
+    if pool is None:
         raise HTTPException(status_code=500, detail="Database environment variables are not fully configured.")
 
     try:
-        return psycopg2.connect(
-            host=DB_HOST,
-            port=DB_PORT,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME,
-            cursor_factory=RealDictCursor,
-        )
+        conn = pool.getconn()
+    except PoolTimeout as exc:
+        raise HTTPException(status_code=503, detail=f"Database busy: {exc}")
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=f"Database connection failed: {exc}")
+
+    try:
+        yield conn
+    finally:
+        pool.putconn(conn)
+
+
+@asynccontextmanager
+async def _get_async_db_connection():
+    try:
+        pool = await get_async_pool()
     except Exception as exc:
         raise HTTPException(status_code=500, detail=f"Database connection failed: {exc}")
+    if pool is None:
+        raise HTTPException(status_code=500, detail="Database environment variables are not fully configured.")
+
+    try:
+        async with pool.connection() as conn:
+            yield conn
+    except PoolTimeout as exc:
+        raise HTTPException(status_code=503, detail=f"Database busy: {exc}")
 
 
 def _decimal_to_float(record: Dict[str, Any]) -> Dict[str, Any]:
@@ -72,10 +112,12 @@ _DESTINATION_QUERIES = {
     "timocom": {
         "by_id": "SELECT city_name FROM public.destinations WHERE id = %s LIMIT 1;",
         "by_name": "SELECT id FROM public.destinations WHERE city_name = %s ORDER BY id LIMIT 1;",
+        "ids_by_name": "SELECT id FROM public.destinations WHERE city_name = %s ORDER BY id;",
     },
     "transeu": {
         "by_id": 'SELECT city_name FROM public."DestinationsTransEU" WHERE id = %s LIMIT 1;',
         "by_name": 'SELECT id FROM public."DestinationsTransEU" WHERE city_name = %s ORDER BY id LIMIT 1;',
+        "ids_by_name": 'SELECT id FROM public."DestinationsTransEU" WHERE city_name = %s ORDER BY id;',
     },
 }
 
@@ -93,6 +135,17 @@ def _resolve_city_identifiers(
     if identifier is not None and name is not None:
         return identifier, name
 
+    # In-memory index first; a miss (city added since the last refresh) goes to the database
+    index = destinations.get(exchange_key)
+    if identifier is not None:
+        city_name = index.name_for_id(identifier)
+        if city_name is not None:
+            return identifier, city_name
+    else:
+        match = index.id_for_name(name)
+        if match is not None:
+            return match
+
     if identifier is not None:
         with conn.cursor() as cur:
             cur.execute(queries["by_id"], (identifier,))
@@ -110,6 +163,143 @@ def _resolve_city_identifiers(
         return row["id"], name
 
 
+async def _resolve_city_identifiers_async(
+    conn,
+    name: Optional[str],
+    identifier: Optional[int],
+    label: str,
+    exchange: str,
+) -> Tuple[int, str]:
+    exchange_key = exchange.lower()
+    queries = _DESTINATION_QUERIES[exchange_key]
+
+    if identifier is not None and name is not None:
+        return identifier, name
+
+    # In-memory index first; a miss (city added since the last refresh) goes to the database
+    index = destinations.get(exchange_key)
+    if identifier is not None:
+        city_name = index.name_for_id(identifier)
+        if city_name is not None:
+            return identifier, city_name
+    else:
+        match = index.id_for_name(name)
+        if match is not None:
+            return match
+
+    if identifier is not None:
+        row = await conn.fetchrow(to_asyncpg_query(queries["by_id"]), identifier)
+        if not row:
+            raise HTTPException(status_code=404, detail=f"No city found for {label} id {identifier}.")
+        return identifier, row["city_name"]
+
+    assert name is not None  # Guaranteed by validation
+    row = await conn.fetchrow(to_asyncpg_query(queries["by_name"]), name)
+    if not row:
+        raise HTTPException(status_code=404, detail=f"No city found matching {label} name '{name}'.")
+    return row["id"], name
+
+
+def _resolve_city_ids(conn, name: str, exchange: str) -> Tuple[int, ...]:
+    """Every id carrying the city name - the PassingCityName report aggregates over all of them."""
+    ids = destinations.get(exchange).ids_for_name(name)
+    if ids is not None:
+        return ids
+    with conn.cursor() as cur:
+        cur.execute(_DESTINATION_QUERIES[exchange.lower()]["ids_by_name"], (name,))
+        return tuple(row["id"] for row in cur.fetchall())
+
+
+async def _resolve_city_ids_async(conn, name: str, exchange: str) -> Tuple[int, ...]:
+    ids = destinations.get(exchange).ids_for_name(name)
+    if ids is not None:
+        return ids
+    rows = await conn.fetch(to_asyncpg_query(_DESTINATION_QUERIES[exchange.lower()]["ids_by_name"]), name)
+    return tuple(row["id"] for row in rows)
+
+
+def _transeu_to_timocom_mapping() -> RegionMapping:
+    try:
+        return transeu_to_timocom()
+    except (OSError, ValueError, KeyError) as exc:
+        raise HTTPException(status_code=500, detail=f"Trans.eu -> TimoCom mapping unavailable: {exc}")
+
+
+def _map_transeu_to_timocom(identifiers: Sequence[int]) -> Tuple[int, ...]:
+    # Regions with no TimoCom region within TRANSEU_TIMOCOM_MAX_DISTANCE_KM are left out
+    mapped = _transeu_to_timocom_mapping().map_many(identifiers)
+    return tuple(sorted({int(identifier) for identifier in mapped if identifier != UNMAPPED}))
+
+
+def _map_transeu_region(identifier: int, role: str) -> int:
+    mapping = _transeu_to_timocom_mapping()
+    timocom_id = mapping.map_one(identifier)
+    if timocom_id is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No TimoCom region within {mapping.coverage.max_distance_km:g} km of Trans.eu {role} region {identifier}",
+        )
+    return timocom_id
+
+
+def _lane(
+    start: Tuple[int, str], dest: Tuple[int, str], start_ids: Sequence[int] = (), dest_ids: Sequence[int] = ()
+) -> Dict[str, Any]:
+    return {
+        "start_id": start[0],
+        "start_name": start[1],
+        "dest_id": dest[0],
+        "dest_name": dest[1],
+        "start_ids": tuple(start_ids),
+        "dest_ids": tuple(dest_ids),
+    }
+
+
+def _resolve_both_lanes(conn, payload: RouteRequest) -> Dict[str, Dict[str, Any]]:
+    """The lane on Trans.eu as requested and on TimoCom through the Trans.eu -> TimoCom mapping."""
+    start = _resolve_city_identifiers(conn, payload.starting_name, payload.starting_id, "starting", "transeu")
+    dest = _resolve_city_identifiers(conn, payload.destination_name, payload.destination_id, "destination", "transeu")
+    start_ids = dest_ids = ()
+    if payload.PassingCityName:
+        start_ids = _resolve_city_ids(conn, start[1], "transeu")
+        dest_ids = _resolve_city_ids(conn, dest[1], "transeu")
+
+    timocom_start = _resolve_city_identifiers(conn, None, _map_transeu_region(start[0], "starting"), "starting", "timocom")
+    timocom_dest = _resolve_city_identifiers(conn, None, _map_transeu_region(dest[0], "destination"), "destination", "timocom")
+    return {
+        "transeu": _lane(start, dest, start_ids, dest_ids),
+        "timocom": _lane(
+            timocom_start, timocom_dest, _map_transeu_to_timocom(start_ids), _map_transeu_to_timocom(dest_ids)
+        ),
+    }
+
+
+async def _resolve_both_lanes_async(conn, payload: RouteRequest) -> Dict[str, Dict[str, Any]]:
+    start = await _resolve_city_identifiers_async(
+        conn, payload.starting_name, payload.starting_id, "starting", "transeu"
+    )
+    dest = await _resolve_city_identifiers_async(
+        conn, payload.destination_name, payload.destination_id, "destination", "transeu"
+    )
+    start_ids = dest_ids = ()
+    if payload.PassingCityName:
+        start_ids = await _resolve_city_ids_async(conn, start[1], "transeu")
+        dest_ids = await _resolve_city_ids_async(conn, dest[1], "transeu")
+
+    timocom_start = await _resolve_city_identifiers_async(
+        conn, None, _map_transeu_region(start[0], "starting"), "starting", "timocom"
+    )
+    timocom_dest = await _resolve_city_identifiers_async(
+        conn, None, _map_transeu_region(dest[0], "destination"), "destination", "timocom"
+    )
+    return {
+        "transeu": _lane(start, dest, start_ids, dest_ids),
+        "timocom": _lane(
+            timocom_start, timocom_dest, _map_transeu_to_timocom(start_ids), _map_transeu_to_timocom(dest_ids)
+        ),
+    }
+
+
 def _run_query(conn, query: str, params: Tuple[Any, ...]) -> List[Dict[str, Any]]:
     try:
         with conn.cursor() as cur:
@@ -121,111 +311,163 @@ def _run_query(conn, query: str, params: Tuple[Any, ...]) -> List[Dict[str, Any]
     return [_decimal_to_float(dict(row)) for row in results]
 
 
-app = FastAPI(title="Route General Report API")
+async def _run_query_async(conn, query: str, params: Tuple[Any, ...]) -> List[Dict[str, Any]]:
+    try:
+        results = await conn.fetch(to_asyncpg_query(query), *params)
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=f"Query execution failed: {exc}")
 
+    return [_decimal_to_float(dict(row)) for row in results]
 
-@app.post("/route-general-report")
-def get_route_general_report(payload: RouteRequest) -> Dict[str, Any]:
-    conn = _get_db_connection()
-    try:
-        exchange = payload.freight_exchange.lower()
-        if exchange not in {"timocom", "transeu"}:
-            raise HTTPException(status_code=400, detail=f"Unsupported freight exchange '{payload.freight_exchange}'.")
 
-        start_id, start_name = _resolve_city_identifiers(
-            conn, payload.starting_name, payload.starting_id, "starting", exchange
-        )
-        dest_id, dest_name = _resolve_city_identifiers(
-            conn, payload.destination_name, payload.destination_id, "destination", exchange
-        )
+@asynccontextmanager
+async def _lifespan(_: FastAPI):
+    destinations.start()
+    detect_installed()
+    yield
+    destinations.stop()
+    close_pool()
+    await close_async_pool()
 
-        if exchange == "timocom":
-            if payload.PassingCityName:
-                query = """
-                    SELECT
-
-                        o.enlistment_hour,
-                        sd.city_name AS starting_city,
-                        dd.city_name AS destination_city,
-                        ROUND(AVG(o.trailer_avg_price_per_km), 4)             AS avg_trailer_price,
-                        ROUND(AVG(o.vehicle_up_to_3_5_t_avg_price_per_km), 4) AS avg_3_5t_price,
-                        ROUND(AVG(o.vehicle_up_to_12_t_avg_price_per_km), 4)  AS avg_12t_price
-                    FROM public.offers AS o
-                    JOIN public.destinations AS sd ON sd.id = o.starting_id
-                    JOIN public.destinations AS dd ON dd.id = o.destination_id
-                    WHERE sd.city_name = %s
-                      AND dd.city_name = %s
-                    GROUP BY
-                        o.enlistment_hour,
-                        sd.city_name,
-                        dd.city_name
-                    HAVING
-                        AVG(o.trailer_avg_price_per_km) IS NOT NULL
-                    OR AVG(o.vehicle_up_to_3_5_t_avg_price_per_km) IS NOT NULL
-                    OR AVG(o.vehicle_up_to_12_t_avg_price_per_km) IS NOT NULL
-                    ORDER BY  o.enlistment_hour;
-                """
-                params = (start_name, dest_name)
-            else:
-                query = """
-                    SELECT
-                        o.enlistment_hour,
-                        ROUND(AVG(o.trailer_avg_price_per_km), 4)             AS avg_trailer_price,
-                        ROUND(AVG(o.vehicle_up_to_3_5_t_avg_price_per_km), 4) AS avg_3_5t_price,
-                        ROUND(AVG(o.vehicle_up_to_12_t_avg_price_per_km), 4)  AS avg_12t_price
-                    FROM public.offers AS o
-                    WHERE o.starting_id = %s
-                      AND o.destination_id = %s
-                    GROUP BY  o.enlistment_hour
-                    HAVING
-                        AVG(o.trailer_avg_price_per_km) IS NOT NULL
-                    OR AVG(o.vehicle_up_to_3_5_t_avg_price_per_km) IS NOT NULL
-                    OR AVG(o.vehicle_up_to_12_t_avg_price_per_km) IS NOT NULL
-                    ORDER BY  o.enlistment_hour;
-                """
-                params = (start_id, dest_id)
-        else:  # transeu
-            if payload.PassingCityName:
-                query = """
-                    SELECT
-
-                        o.enlistment_hour,
-                        sd.city_name AS starting_city,
-                        dd.city_name AS destination_city,
-                        ROUND(AVG(o.lorry_avg_price_per_km), 4) AS avg_lorry_price
-                    FROM public."OffersTransEU" AS o
-                    JOIN public."DestinationsTransEU" AS sd ON sd.id = o.starting_id
-                    JOIN public."DestinationsTransEU" AS dd ON dd.id = o.destination_id
-                    WHERE sd.city_name = %s
-                      AND dd.city_name = %s
-                    GROUP BY
-                        o.enlistment_hour,
-                        sd.city_name,
-                        dd.city_name
-                    HAVING
-                        AVG(o.lorry_avg_price_per_km) IS NOT NULL
-                    ORDER BY  o.enlistment_hour;
-                """
-                params = (start_name, dest_name)
-            else:
-                query = """
-                    SELECT
-                        o.enlistment_hour,
-                        ROUND(AVG(o.lorry_avg_price_per_km), 4) AS avg_lorry_price
-                    FROM public."OffersTransEU" AS o
-                    WHERE o.starting_id = %s
-                      AND o.destination_id = %s
-                    GROUP BY  o.enlistment_hour
-                    HAVING
-                        AVG(o.lorry_avg_price_per_km) IS NOT NULL
-                    ORDER BY  o.enlistment_hour;
-                """
-                params = (start_id, dest_id)
 
-        data = _run_query(conn, query, params)
-    finally:
-        conn.close()
+app = FastAPI(title="Route General Report API", lifespan=_lifespan)
+
+
+def _validate_exchange(payload: RouteRequest, allow_both: bool = False) -> str:
+    exchange = payload.freight_exchange.lower()
+    if exchange not in ({"timocom", "transeu", "both"} if allow_both else {"timocom", "transeu"}):
+        raise HTTPException(status_code=400, detail=f"Unsupported freight exchange '{payload.freight_exchange}'.")
+    return exchange
+
 
+def _build_report_query(
+    exchange: str,
+    passing_city_name: bool,
+    start_id: int,
+    start_name: str,
+    dest_id: int,
+    dest_name: str,
+    start_ids: Sequence[int] = (),
+    dest_ids: Sequence[int] = (),
+) -> Tuple[str, Tuple[Any, ...]]:
+    """
+    Name mode aggregates over every id carrying the city name (start_ids / dest_ids),
+    keyed by id like id mode - no joins with the destinations tables.
+    """
+    # Precomputed hourly sums/counts (lane_rollup.py) - same numbers without scanning raw offers
+    if use_rollup(exchange):
+        return report_query(exchange, passing_city_name), (
+            (start_name, dest_name, list(start_ids), list(dest_ids)) if passing_city_name else (start_id, dest_id)
+        )
+
+    if exchange == "timocom":
+        if passing_city_name:
+            query = """
+                SELECT
+                    o.enlistment_hour,
+                    CAST(%s AS text) AS starting_city,
+                    CAST(%s AS text) AS destination_city,
+                    ROUND(AVG(o.trailer_avg_price_per_km), 4)             AS avg_trailer_price,
+                    ROUND(AVG(o.vehicle_up_to_3_5_t_avg_price_per_km), 4) AS avg_3_5t_price,
+                    ROUND(AVG(o.vehicle_up_to_12_t_avg_price_per_km), 4)  AS avg_12t_price
+                FROM public.offers AS o
+                WHERE o.starting_id = ANY(%s::bigint[])
+                  AND o.destination_id = ANY(%s::bigint[])
+                GROUP BY  o.enlistment_hour
+                HAVING
+                    AVG(o.trailer_avg_price_per_km) IS NOT NULL
+                OR AVG(o.vehicle_up_to_3_5_t_avg_price_per_km) IS NOT NULL
+                OR AVG(o.vehicle_up_to_12_t_avg_price_per_km) IS NOT NULL
+                ORDER BY  o.enlistment_hour;
+            """
+            params = (start_name, dest_name, list(start_ids), list(dest_ids))
+        else:
+            query = """
+                SELECT
+                    o.enlistment_hour,
+                    ROUND(AVG(o.trailer_avg_price_per_km), 4)             AS avg_trailer_price,
+                    ROUND(AVG(o.vehicle_up_to_3_5_t_avg_price_per_km), 4) AS avg_3_5t_price,
+                    ROUND(AVG(o.vehicle_up_to_12_t_avg_price_per_km), 4)  AS avg_12t_price
+                FROM public.offers AS o
+                WHERE o.starting_id = %s
+                  AND o.destination_id = %s
+                GROUP BY  o.enlistment_hour
+                HAVING
+                    AVG(o.trailer_avg_price_per_km) IS NOT NULL
+                OR AVG(o.vehicle_up_to_3_5_t_avg_price_per_km) IS NOT NULL
+                OR AVG(o.vehicle_up_to_12_t_avg_price_per_km) IS NOT NULL
+                ORDER BY  o.enlistment_hour;
+            """
+            params = (start_id, dest_id)
+    else:  # transeu
+        if passing_city_name:
+            query = """
+                SELECT
+                    o.enlistment_hour,
+                    CAST(%s AS text) AS starting_city,
+                    CAST(%s AS text) AS destination_city,
+                    ROUND(AVG(o.lorry_avg_price_per_km), 4) AS avg_lorry_price
+                FROM public."OffersTransEU" AS o
+                WHERE o.starting_id = ANY(%s::bigint[])
+                  AND o.destination_id = ANY(%s::bigint[])
+                GROUP BY  o.enlistment_hour
+                HAVING
+                    AVG(o.lorry_avg_price_per_km) IS NOT NULL
+                ORDER BY  o.enlistment_hour;
+            """
+            params = (start_name, dest_name, list(start_ids), list(dest_ids))
+        else:
+            query = """
+                SELECT
+                    o.enlistment_hour,
+                    ROUND(AVG(o.lorry_avg_price_per_km), 4) AS avg_lorry_price
+                FROM public."OffersTransEU" AS o
+                WHERE o.starting_id = %s
+                  AND o.destination_id = %s
+                GROUP BY  o.enlistment_hour
+                HAVING
+                    AVG(o.lorry_avg_price_per_km) IS NOT NULL
+                ORDER BY  o.enlistment_hour;
+            """
+            params = (start_id, dest_id)
+    return query, params
+
+
+def _build_both_report_query(
+    passing_city_name: bool, lanes: Dict[str, Dict[str, Any]]
+) -> Tuple[str, Tuple[Any, ...]]:
+    """
+    Both hourly aggregates in one statement, full-joined on enlistment_hour. NULL hours
+    are joined too (NULL_HOUR on both sides): PostgreSQL rejects IS NOT DISTINCT FROM
+    as a FULL JOIN condition, it has to be an equality.
+    """
+    timocom_query, timocom_params = _build_report_query("timocom", passing_city_name, **lanes["timocom"])
+    transeu_query, transeu_params = _build_report_query("transeu", passing_city_name, **lanes["transeu"])
+    query = f"""
+        WITH timocom AS ({timocom_query.strip().rstrip(";")}),
+             transeu AS ({transeu_query.strip().rstrip(";")})
+        SELECT
+            COALESCE(timocom.enlistment_hour, transeu.enlistment_hour) AS enlistment_hour,
+            timocom.avg_trailer_price,
+            timocom.avg_3_5t_price,
+            timocom.avg_12t_price,
+            transeu.avg_lorry_price
+        FROM timocom
+        FULL JOIN transeu
+          ON COALESCE(timocom.enlistment_hour, {NULL_HOUR}) = COALESCE(transeu.enlistment_hour, {NULL_HOUR})
+        ORDER BY  COALESCE(timocom.enlistment_hour, transeu.enlistment_hour);
+    """
+    return query, timocom_params + transeu_params
+
+
+def _report_response(
+    payload: RouteRequest,
+    start_id: int,
+    start_name: str,
+    dest_id: int,
+    dest_name: str,
+    data: List[Dict[str, Any]],
+) -> Dict[str, Any]:
     return {
         "query_mode": "city_name" if payload.PassingCityName else "id",
         "start": {"id": start_id, "name": start_name},
@@ -236,11 +478,355 @@ def get_route_general_report(payload: RouteRequest) -> Dict[str, Any]:
     }
 
 
+def _both_report_response(
+    payload: RouteRequest, lanes: Dict[str, Dict[str, Any]], data: List[Dict[str, Any]]
+) -> Dict[str, Any]:
+    transeu = lanes["transeu"]
+    response = _report_response(
+        payload, transeu["start_id"], transeu["start_name"], transeu["dest_id"], transeu["dest_name"], data
+    )
+    response["lanes"] = {
+        exchange: {
+            "start": {"id": lane["start_id"], "name": lane["start_name"]},
+            "destination": {"id": lane["dest_id"], "name": lane["dest_name"]},
+        }
+        for exchange, lane in lanes.items()
+    }
+    return response
+
+
+def _prepare_report(conn, payload: RouteRequest) -> Tuple[str, Tuple[Any, ...], Dict[str, Any]]:
+    """Resolves the lane; returns the report query, its parameters and the response without rows."""
+    exchange = _validate_exchange(payload, allow_both=True)
+    if exchange == "both":
+        lanes = _resolve_both_lanes(conn, payload)
+        query, params = _build_both_report_query(payload.PassingCityName, lanes)
+        return query, params, _both_report_response(payload, lanes, [])
+
+    start_id, start_name = _resolve_city_identifiers(
+        conn, payload.starting_name, payload.starting_id, "starting", exchange
+    )
+    dest_id, dest_name = _resolve_city_identifiers(
+        conn, payload.destination_name, payload.destination_id, "destination", exchange
+    )
+    start_ids = dest_ids = ()
+    if payload.PassingCityName:
+        start_ids = _resolve_city_ids(conn, start_name, exchange)
+        dest_ids = _resolve_city_ids(conn, dest_name, exchange)
+    query, params = _build_report_query(
+        exchange, payload.PassingCityName, start_id, start_name, dest_id, dest_name, start_ids, dest_ids
+    )
+    return query, params, _report_response(payload, start_id, start_name, dest_id, dest_name, [])
+
+
+async def _prepare_report_async(conn, payload: RouteRequest) -> Tuple[str, Tuple[Any, ...], Dict[str, Any]]:
+    exchange = _validate_exchange(payload, allow_both=True)
+    if exchange == "both":
+        lanes = await _resolve_both_lanes_async(conn, payload)
+        query, params = _build_both_report_query(payload.PassingCityName, lanes)
+        return query, params, _both_report_response(payload, lanes, [])
+
+    start_id, start_name = await _resolve_city_identifiers_async(
+        conn, payload.starting_name, payload.starting_id, "starting", exchange
+    )
+    dest_id, dest_name = await _resolve_city_identifiers_async(
+        conn, payload.destination_name, payload.destination_id, "destination", exchange
+    )
+    start_ids = dest_ids = ()
+    if payload.PassingCityName:
+        start_ids = await _resolve_city_ids_async(conn, start_name, exchange)
+        dest_ids = await _resolve_city_ids_async(conn, dest_name, exchange)
+    query, params = _build_report_query(
+        exchange, payload.PassingCityName, start_id, start_name, dest_id, dest_name, start_ids, dest_ids
+    )
+    return query, params, _report_response(payload, start_id, start_name, dest_id, dest_name, [])
+
+
+def _with_rows(response: Dict[str, Any], data: List[Dict[str, Any]]) -> Dict[str, Any]:
+    response["rows"] = jsonable_encoder(data)
+    response["row_count"] = len(data)
+    return response
+
+
+def _stream_report(payload: RouteRequest, response_format: str) -> StreamingResponse:
+    # The connection outlives the handler: ClosingStreamingResponse returns it to the pool
+    # when the stream ends, the client disconnects or the body is never iterated
+    stack = ExitStack()
+    try:
+        conn = stack.enter_context(_get_db_connection())
+        query, params, response = _prepare_report(conn, payload)
+    except BaseException:
+        stack.close()
+        raise
+    stream = ReportStream(response, response_format)
+
+    def body():
+        with stack:
+            yield stream.start()
+            # Named cursor: rows stay on the server and arrive REPORT_STREAM_BATCH_ROWS at a time
+            with conn.cursor(name=f"route_report_{uuid.uuid4().hex}") as cur:
+                cur.execute(query, params)
+                while True:
+                    rows = cur.fetchmany(REPORT_STREAM_BATCH_ROWS)
+                    if not rows:
+                        break
+                    yield stream.rows(rows)
+            yield stream.end()
+
+    chunks = body()
+
+    def close() -> None:
+        # A started body leaves `with stack` when closed; otherwise stack.close() releases the connection
+        chunks.close()
+        stack.close()
+
+    return ClosingStreamingResponse(chunks, close=partial(run_in_threadpool, close), media_type=stream.media_type)
+
+
+async def _stream_report_async(payload: RouteRequest, response_format: str) -> StreamingResponse:
+    stack = AsyncExitStack()
+    try:
+        conn = await stack.enter_async_context(_get_async_db_connection())
+        query, params, response = await _prepare_report_async(conn, payload)
+    except BaseException:
+        await stack.aclose()
+        raise
+    stream = ReportStream(response, response_format)
+
+    async def body():
+        async with stack:
+            yield stream.start()
+            # asyncpg cursors only exist inside a transaction
+            async with conn.transaction():
+                cursor = await conn.cursor(to_asyncpg_query(query), *params)
+                while True:
+                    rows = await cursor.fetch(REPORT_STREAM_BATCH_ROWS)
+                    if not rows:
+                        break
+                    yield stream.rows([dict(row) for row in rows])
+            yield stream.end()
+
+    chunks = body()
+
+    async def close() -> None:
+        await chunks.aclose()
+        await stack.aclose()
+
+    return ClosingStreamingResponse(chunks, close=close, media_type=stream.media_type)
+
+
+def get_route_general_report(payload: RouteRequest, request: Request) -> Any:
+    response_format = stream_format(request)
+    if response_format is not None:
+        return _stream_report(payload, response_format)
+
+    with _get_db_connection() as conn:
+        query, params, response = _prepare_report(conn, payload)
+        data = _run_query(conn, query, params)
+
+    return _with_rows(response, data)
+
+
+async def get_route_general_report_async(payload: RouteRequest, request: Request) -> Any:
+    response_format = stream_format(request)
+    if response_format is not None:
+        return await _stream_report_async(payload, response_format)
+
+    async with _get_async_db_connection() as conn:
+        query, params, response = await _prepare_report_async(conn, payload)
+        data = await _run_query_async(conn, query, params)
+
+    return _with_rows(response, data)
+
+
+# DB_DRIVER=asyncpg: async handler on the asyncpg pool, otherwise psycopg2 in the threadpool
+app.post("/route-general-report")(
+    get_route_general_report_async if USE_ASYNCPG else get_route_general_report
+)
+
+
+_BATCH_REPORT_QUERIES = {
+    "timocom": """
+        SELECT
+            l.lane,
+            o.enlistment_hour,
+            ROUND(AVG(o.trailer_avg_price_per_km), 4)             AS avg_trailer_price,
+            ROUND(AVG(o.vehicle_up_to_3_5_t_avg_price_per_km), 4) AS avg_3_5t_price,
+            ROUND(AVG(o.vehicle_up_to_12_t_avg_price_per_km), 4)  AS avg_12t_price
+        FROM unnest(%s::int[], %s::bigint[], %s::bigint[]) AS l(lane, starting_id, destination_id)
+        JOIN public.offers AS o
+          ON o.starting_id = l.starting_id
+         AND o.destination_id = l.destination_id
+        GROUP BY  l.lane, o.enlistment_hour
+        HAVING
+            AVG(o.trailer_avg_price_per_km) IS NOT NULL
+        OR AVG(o.vehicle_up_to_3_5_t_avg_price_per_km) IS NOT NULL
+        OR AVG(o.vehicle_up_to_12_t_avg_price_per_km) IS NOT NULL
+        ORDER BY  l.lane, o.enlistment_hour;
+    """,
+    "transeu": """
+        SELECT
+            l.lane,
+            o.enlistment_hour,
+            ROUND(AVG(o.lorry_avg_price_per_km), 4) AS avg_lorry_price
+        FROM unnest(%s::int[], %s::bigint[], %s::bigint[]) AS l(lane, starting_id, destination_id)
+        JOIN public."OffersTransEU" AS o
+          ON o.starting_id = l.starting_id
+         AND o.destination_id = l.destination_id
+        GROUP BY  l.lane, o.enlistment_hour
+        HAVING
+            AVG(o.lorry_avg_price_per_km) IS NOT NULL
+        ORDER BY  l.lane, o.enlistment_hour;
+    """,
+}
+
+
+def _batch_lane(
+    lane: RouteRequest,
+    exchange: str,
+    start: Tuple[int, str],
+    dest: Tuple[int, str],
+    start_ids: Sequence[int] = (),
+    dest_ids: Sequence[int] = (),
+) -> Dict[str, Any]:
+    if lane.PassingCityName:
+        # Every id pair of the two names, like the single-lane name mode
+        pairs = list(dict.fromkeys((s, d) for s in start_ids for d in dest_ids))
+    else:
+        pairs = [(start[0], dest[0])]
+    return {"payload": lane, "exchange": exchange, "start": start, "destination": dest, "pairs": pairs}
+
+
+def _build_batch_queries(lanes: List[Dict[str, Any]]) -> Dict[str, Tuple[str, Tuple[Any, ...]]]:
+    """One set-based query per exchange; the lanes go in as parallel unnest() arrays."""
+    arrays: Dict[str, Tuple[List[int], List[int], List[int]]] = {}
+    for number, lane in enumerate(lanes):
+        if "error" in lane:
+            continue
+        lane_numbers, starting_ids, destination_ids = arrays.setdefault(lane["exchange"], ([], [], []))
+        for start_id, dest_id in lane["pairs"]:
+            lane_numbers.append(number)
+            starting_ids.append(start_id)
+            destination_ids.append(dest_id)
+
+    queries = {}
+    for exchange, params in arrays.items():
+        query = batch_report_query(exchange) if use_rollup(exchange) else _BATCH_REPORT_QUERIES[exchange]
+        queries[exchange] = (query, params)
+    return queries
+
+
+def _batch_response(lanes: List[Dict[str, Any]], rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    rows_by_lane: Dict[int, List[Dict[str, Any]]] = {}
+    for row in rows:
+        rows_by_lane.setdefault(row.pop("lane"), []).append(row)
+
+    results = []
+    for number, lane in enumerate(lanes):
+        if "error" in lane:
+            results.append({"lane": number, **lane})
+            continue
+        payload = lane["payload"]
+        start_id, start_name = lane["start"]
+        dest_id, dest_name = lane["destination"]
+        data = rows_by_lane.get(number, [])
+        if payload.PassingCityName:
+            data = [
+                {
+                    "enlistment_hour": row.pop("enlistment_hour"),
+                    "starting_city": start_name,
+                    "destination_city": dest_name,
+                    **row,
+                }
+                for row in data
+            ]
+        results.append({"lane": number, **_report_response(payload, start_id, start_name, dest_id, dest_name, data)})
+
+    return {
+        "lane_count": len(results),
+        "failed_lanes": sum("error" in result for result in results),
+        "lanes": results,
+    }
+
+
+def get_route_general_report_batch(payload: BatchRouteRequest) -> Dict[str, Any]:
+    with _get_db_connection() as conn:
+        lanes = []
+        for lane in payload.lanes:
+            # A lane with an unknown city is reported on its own, the rest of the batch still runs
+            try:
+                exchange = _validate_exchange(lane)
+                start = _resolve_city_identifiers(conn, lane.starting_name, lane.starting_id, "starting", exchange)
+                dest = _resolve_city_identifiers(
+                    conn, lane.destination_name, lane.destination_id, "destination", exchange
+                )
+            except HTTPException as exc:
+                lanes.append({"error": exc.detail, "status_code": exc.status_code})
+                continue
+            start_ids = dest_ids = ()
+            if lane.PassingCityName:
+                start_ids = _resolve_city_ids(conn, start[1], exchange)
+                dest_ids = _resolve_city_ids(conn, dest[1], exchange)
+            lanes.append(_batch_lane(lane, exchange, start, dest, start_ids, dest_ids))
+
+        rows = []
+        for query, params in _build_batch_queries(lanes).values():
+            rows.extend(_run_query(conn, query, params))
+
+    return _batch_response(lanes, rows)
+
+
+async def get_route_general_report_batch_async(payload: BatchRouteRequest) -> Dict[str, Any]:
+    async with _get_async_db_connection() as conn:
+        lanes = []
+        for lane in payload.lanes:
+            try:
+                exchange = _validate_exchange(lane)
+                start = await _resolve_city_identifiers_async(
+                    conn, lane.starting_name, lane.starting_id, "starting", exchange
+                )
+                dest = await _resolve_city_identifiers_async(
+                    conn, lane.destination_name, lane.destination_id, "destination", exchange
+                )
+            except HTTPException as exc:
+                lanes.append({"error": exc.detail, "status_code": exc.status_code})
+                continue
+            start_ids = dest_ids = ()
+            if lane.PassingCityName:
+                start_ids = await _resolve_city_ids_async(conn, start[1], exchange)
+                dest_ids = await _resolve_city_ids_async(conn, dest[1], exchange)
+            lanes.append(_batch_lane(lane, exchange, start, dest, start_ids, dest_ids))
+
+        rows = []
+        for query, params in _build_batch_queries(lanes).values():
+            rows.extend(await _run_query_async(conn, query, params))
+
+    return _batch_response(lanes, rows)
+
+
+app.post("/route-general-report/batch")(
+    get_route_general_report_batch_async if USE_ASYNCPG else get_route_general_report_batch
+)
+
+
 @app.get("/health")
 def health_check() -> Dict[str, str]:
     return {"status": "ok"}
 
 
+@app.get("/db-pool-stats")
+async def db_pool_stats() -> Dict[str, Any]:
+    pool = await get_async_pool() if USE_ASYNCPG else get_pool()
+    if pool is None:
+        raise HTTPException(status_code=500, detail="Database environment variables are not fully configured.")
+    return pool.stats()
+
+
+@app.get("/destinations-stats")
+def destinations_stats() -> Dict[str, Any]:
+    return destinations.stats()
+
+
 if __name__ == "__main__":
     import uvicorn
 
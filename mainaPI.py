@@ -1,22 +1,27 @@
 import os
+import uuid
+from contextlib import AsyncExitStack, ExitStack, asynccontextmanager, contextmanager
 from decimal import Decimal
-from typing import Any, Dict, List, Optional, Tuple
+from functools import partial
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
-import psycopg2
-from psycopg2.extras import RealDictCursor
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, ConfigDict, Field, model_validator
 
+from db_pool import PoolTimeout, close_pool, get_pool
+from db_pool_async import USE_ASYNCPG, close_async_pool, get_async_pool, to_asyncpg_query
+from destinations_index import destinations
+from lane_rollup import detect_installed, report_query, use_rollup
+from report_stream import ClosingStreamingResponse, ReportStream, stream_format
+
 
 load_dotenv()
 
-DB_HOST = os.getenv("POSTGRES_HOST")
-DB_PORT = os.getenv("POSTGRES_PORT")
-DB_USER = os.getenv("POSTGRES_USER")
-DB_NAME = os.getenv("POSTGRES_DB")
-DB_PASSWORD = os.getenv("POSTGRES_PASSWORD")
+REPORT_STREAM_BATCH_ROWS = int(os.getenv("REPORT_STREAM_BATCH_ROWS", "2000"))
 
 
 class RouteRequest(BaseModel):
@@ -37,22 +42,43 @@ class RouteRequest(BaseModel):
         return self
 
 
+@contextmanager
 def _get_db_connection():
-    if not all([DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_NAME]):
+    try:
+        pool = get_pool()
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=f"Database connection failed: {exc}")
+    if pool is None:
         raise HTTPException(status_code=500, detail="Database environment variables are not fully configured.")
 
     try:
-        return psycopg2.connect(
-            host=DB_HOST,
-            port=DB_PORT,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME,
-            cursor_factory=RealDictCursor,
-        )
+        conn = pool.getconn()
+    except PoolTimeout as exc:
+        raise HTTPException(status_code=503, detail=f"Database busy: {exc}")
     except Exception as exc:
         raise HTTPException(status_code=500, detail=f"Database connection failed: {exc}")
 
+    try:
+        yield conn
+    finally:
+        pool.putconn(conn)
+
+
+@asynccontextmanager
+async def _get_async_db_connection():
+    try:
+        pool = await get_async_pool()
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=f"Database connection failed: {exc}")
+    if pool is None:
+        raise HTTPException(status_code=500, detail="Database environment variables are not fully configured.")
+
+    try:
+        async with pool.connection() as conn:
+            yield conn
+    except PoolTimeout as exc:
+        raise HTTPException(status_code=503, detail=f"Database busy: {exc}")
+
 
 def _decimal_to_float(record: Dict[str, Any]) -> Dict[str, Any]:
     converted = {}
@@ -68,6 +94,17 @@ def _resolve_city_identifiers(conn, name: Optional[str], identifier: Optional[in
     if identifier is not None and name is not None:
         return identifier, name
 
+    # In-memory index first; a miss (city added since the last refresh) goes to the database
+    index = destinations.get("timocom")
+    if identifier is not None:
+        city_name = index.name_for_id(identifier)
+        if city_name is not None:
+            return identifier, city_name
+    else:
+        match = index.id_for_name(name)
+        if match is not None:
+            return match
+
     if identifier is not None:
         with conn.cursor() as cur:
             cur.execute("SELECT city_name FROM public.destinations WHERE id = %s LIMIT 1;", (identifier,))
@@ -85,6 +122,52 @@ def _resolve_city_identifiers(conn, name: Optional[str], identifier: Optional[in
         return row["id"], name
 
 
+async def _resolve_city_identifiers_async(conn, name: Optional[str], identifier: Optional[int], label: str) -> Tuple[int, str]:
+    if identifier is not None and name is not None:
+        return identifier, name
+
+    # In-memory index first; a miss (city added since the last refresh) goes to the database
+    index = destinations.get("timocom")
+    if identifier is not None:
+        city_name = index.name_for_id(identifier)
+        if city_name is not None:
+            return identifier, city_name
+    else:
+        match = index.id_for_name(name)
+        if match is not None:
+            return match
+
+    if identifier is not None:
+        row = await conn.fetchrow("SELECT city_name FROM public.destinations WHERE id = $1 LIMIT 1;", identifier)
+        if not row:
+            raise HTTPException(status_code=404, detail=f"No city found for {label} id {identifier}.")
+        return identifier, row["city_name"]
+
+    assert name is not None  # Guaranteed by validation
+    row = await conn.fetchrow("SELECT id FROM public.destinations WHERE city_name = $1 ORDER BY id LIMIT 1;", name)
+    if not row:
+        raise HTTPException(status_code=404, detail=f"No city found matching {label} name '{name}'.")
+    return row["id"], name
+
+
+def _resolve_city_ids(conn, name: str) -> Tuple[int, ...]:
+    """Every id carrying the city name - the PassingCityName report aggregates over all of them."""
+    ids = destinations.get("timocom").ids_for_name(name)
+    if ids is not None:
+        return ids
+    with conn.cursor() as cur:
+        cur.execute("SELECT id FROM public.destinations WHERE city_name = %s ORDER BY id;", (name,))
+        return tuple(row["id"] for row in cur.fetchall())
+
+
+async def _resolve_city_ids_async(conn, name: str) -> Tuple[int, ...]:
+    ids = destinations.get("timocom").ids_for_name(name)
+    if ids is not None:
+        return ids
+    rows = await conn.fetch("SELECT id FROM public.destinations WHERE city_name = $1 ORDER BY id;", name)
+    return tuple(row["id"] for row in rows)
+
+
 def _run_query(conn, query: str, params: Tuple[Any, ...]) -> List[Dict[str, Any]]:
     try:
         with conn.cursor() as cur:
@@ -96,65 +179,96 @@ def _run_query(conn, query: str, params: Tuple[Any, ...]) -> List[Dict[str, Any]
     return [_decimal_to_float(dict(row)) for row in results]
 
 
-app = FastAPI(title="Route General Report API")
+async def _run_query_async(conn, query: str, params: Tuple[Any, ...]) -> List[Dict[str, Any]]:
+    try:
+        results = await conn.fetch(to_asyncpg_query(query), *params)
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=f"Query execution failed: {exc}")
 
+    return [_decimal_to_float(dict(row)) for row in results]
 
-@app.post("/route-general-report")
-def get_route_general_report(payload: RouteRequest) -> Dict[str, Any]:
-    conn = _get_db_connection()
-    try:
-        start_id, start_name = _resolve_city_identifiers(conn, payload.starting_name, payload.starting_id, "starting")
-        dest_id, dest_name = _resolve_city_identifiers(conn, payload.destination_name, payload.destination_id, "destination")
-
-        if payload.PassingCityName:
-            query = """
-                SELECT
-
-                    o.enlistment_hour,
-                    sd.city_name AS starting_city,
-                    dd.city_name AS destination_city,
-                    ROUND(AVG(o.trailer_avg_price_per_km), 4)             AS avg_trailer_price,
-                    ROUND(AVG(o.vehicle_up_to_3_5_t_avg_price_per_km), 4) AS avg_3_5t_price,
-                    ROUND(AVG(o.vehicle_up_to_12_t_avg_price_per_km), 4)  AS avg_12t_price
-                FROM public.offers AS o
-                JOIN public.destinations AS sd ON sd.id = o.starting_id
-                JOIN public.destinations AS dd ON dd.id = o.destination_id
-                WHERE sd.city_name = %s
-                  AND dd.city_name = %s
-                GROUP BY
-                    o.enlistment_hour,
-                    sd.city_name,
-                    dd.city_name
-                HAVING
-                    AVG(o.trailer_avg_price_per_km) IS NOT NULL
-                OR AVG(o.vehicle_up_to_3_5_t_avg_price_per_km) IS NOT NULL
-                OR AVG(o.vehicle_up_to_12_t_avg_price_per_km) IS NOT NULL
-                ORDER BY  o.enlistment_hour;
-            """
-            params = (start_name, dest_name)
-        else:
-            query = """
-                SELECT
-                    o.enlistment_hour,
-                    ROUND(AVG(o.trailer_avg_price_per_km), 4)             AS avg_trailer_price,
-                    ROUND(AVG(o.vehicle_up_to_3_5_t_avg_price_per_km), 4) AS avg_3_5t_price,
-                    ROUND(AVG(o.vehicle_up_to_12_t_avg_price_per_km), 4)  AS avg_12t_price
-                FROM public.offers AS o
-                WHERE o.starting_id = %s
-                  AND o.destination_id = %s
-                GROUP BY  o.enlistment_hour
-                HAVING
-                    AVG(o.trailer_avg_price_per_km) IS NOT NULL
-                OR AVG(o.vehicle_up_to_3_5_t_avg_price_per_km) IS NOT NULL
-                OR AVG(o.vehicle_up_to_12_t_avg_price_per_km) IS NOT NULL
-                ORDER BY  o.enlistment_hour;
-            """
-            params = (start_id, dest_id)
 
-        data = _run_query(conn, query, params)
-    finally:
-        conn.close()
+@asynccontextmanager
+async def _lifespan(_: FastAPI):
+    destinations.start()
+    detect_installed()
+    yield
+    destinations.stop()
+    close_pool()
+    await close_async_pool()
+
+
+app = FastAPI(title="Route General Report API", lifespan=_lifespan)
+
+
+def _build_report_query(
+    passing_city_name: bool,
+    start_id: int,
+    start_name: str,
+    dest_id: int,
+    dest_name: str,
+    start_ids: Sequence[int] = (),
+    dest_ids: Sequence[int] = (),
+) -> Tuple[str, Tuple[Any, ...]]:
+    """
+    Name mode aggregates over every id carrying the city name (start_ids / dest_ids),
+    keyed by id like id mode - no joins with the destinations tables.
+    """
+    # Precomputed hourly sums/counts (lane_rollup.py) - same numbers without scanning raw offers
+    if use_rollup("timocom"):
+        return report_query("timocom", passing_city_name), (
+            (start_name, dest_name, list(start_ids), list(dest_ids)) if passing_city_name else (start_id, dest_id)
+        )
 
+    if passing_city_name:
+        query = """
+            SELECT
+                o.enlistment_hour,
+                CAST(%s AS text) AS starting_city,
+                CAST(%s AS text) AS destination_city,
+                ROUND(AVG(o.trailer_avg_price_per_km), 4)             AS avg_trailer_price,
+                ROUND(AVG(o.vehicle_up_to_3_5_t_avg_price_per_km), 4) AS avg_3_5t_price,
+                ROUND(AVG(o.vehicle_up_to_12_t_avg_price_per_km), 4)  AS avg_12t_price
+            FROM public.offers AS o
+            WHERE o.starting_id = ANY(%s::bigint[])
+              AND o.destination_id = ANY(%s::bigint[])
+            GROUP BY  o.enlistment_hour
+            HAVING
+                AVG(o.trailer_avg_price_per_km) IS NOT NULL
+            OR AVG(o.vehicle_up_to_3_5_t_avg_price_per_km) IS NOT NULL
+            OR AVG(o.vehicle_up_to_12_t_avg_price_per_km) IS NOT NULL
+            ORDER BY  o.enlistment_hour;
+        """
+        params = (start_name, dest_name, list(start_ids), list(dest_ids))
+    else:
+        query = """
+            SELECT
+                o.enlistment_hour,
+                ROUND(AVG(o.trailer_avg_price_per_km), 4)             AS avg_trailer_price,
+                ROUND(AVG(o.vehicle_up_to_3_5_t_avg_price_per_km), 4) AS avg_3_5t_price,
+                ROUND(AVG(o.vehicle_up_to_12_t_avg_price_per_km), 4)  AS avg_12t_price
+            FROM public.offers AS o
+            WHERE o.starting_id = %s
+              AND o.destination_id = %s
+            GROUP BY  o.enlistment_hour
+            HAVING
+                AVG(o.trailer_avg_price_per_km) IS NOT NULL
+            OR AVG(o.vehicle_up_to_3_5_t_avg_price_per_km) IS NOT NULL
+            OR AVG(o.vehicle_up_to_12_t_avg_price_per_km) IS NOT NULL
+            ORDER BY  o.enlistment_hour;
+        """
+        params = (start_id, dest_id)
+    return query, params
+
+
+def _report_response(
+    payload: RouteRequest,
+    start_id: int,
+    start_name: str,
+    dest_id: int,
+    dest_name: str,
+    data: List[Dict[str, Any]],
+) -> Dict[str, Any]:
     return {
         "query_mode": "city_name" if payload.PassingCityName else "id",
         "start": {"id": start_id, "name": start_name},
@@ -164,11 +278,154 @@ def get_route_general_report(payload: RouteRequest) -> Dict[str, Any]:
     }
 
 
+def _prepare_report(conn, payload: RouteRequest) -> Tuple[str, Tuple[Any, ...], Dict[str, Any]]:
+    """Resolves the lane; returns the report query, its parameters and the response without rows."""
+    start_id, start_name = _resolve_city_identifiers(conn, payload.starting_name, payload.starting_id, "starting")
+    dest_id, dest_name = _resolve_city_identifiers(conn, payload.destination_name, payload.destination_id, "destination")
+    start_ids = dest_ids = ()
+    if payload.PassingCityName:
+        start_ids = _resolve_city_ids(conn, start_name)
+        dest_ids = _resolve_city_ids(conn, dest_name)
+    query, params = _build_report_query(
+        payload.PassingCityName, start_id, start_name, dest_id, dest_name, start_ids, dest_ids
+    )
+    return query, params, _report_response(payload, start_id, start_name, dest_id, dest_name, [])
+
+
+async def _prepare_report_async(conn, payload: RouteRequest) -> Tuple[str, Tuple[Any, ...], Dict[str, Any]]:
+    start_id, start_name = await _resolve_city_identifiers_async(conn, payload.starting_name, payload.starting_id, "starting")
+    dest_id, dest_name = await _resolve_city_identifiers_async(conn, payload.destination_name, payload.destination_id, "destination")
+    start_ids = dest_ids = ()
+    if payload.PassingCityName:
+        start_ids = await _resolve_city_ids_async(conn, start_name)
+        dest_ids = await _resolve_city_ids_async(conn, dest_name)
+    query, params = _build_report_query(
+        payload.PassingCityName, start_id, start_name, dest_id, dest_name, start_ids, dest_ids
+    )
+    return query, params, _report_response(payload, start_id, start_name, dest_id, dest_name, [])
+
+
+def _with_rows(response: Dict[str, Any], data: List[Dict[str, Any]]) -> Dict[str, Any]:
+    response["rows"] = jsonable_encoder(data)
+    response["row_count"] = len(data)
+    return response
+
+
+def _stream_report(payload: RouteRequest, response_format: str) -> StreamingResponse:
+    # The connection outlives the handler: ClosingStreamingResponse returns it to the pool
+    # when the stream ends, the client disconnects or the body is never iterated
+    stack = ExitStack()
+    try:
+        conn = stack.enter_context(_get_db_connection())
+        query, params, response = _prepare_report(conn, payload)
+    except BaseException:
+        stack.close()
+        raise
+    stream = ReportStream(response, response_format)
+
+    def body():
+        with stack:
+            yield stream.start()
+            # Named cursor: rows stay on the server and arrive REPORT_STREAM_BATCH_ROWS at a time
+            with conn.cursor(name=f"route_report_{uuid.uuid4().hex}") as cur:
+                cur.execute(query, params)
+                while True:
+                    rows = cur.fetchmany(REPORT_STREAM_BATCH_ROWS)
+                    if not rows:
+                        break
+                    yield stream.rows(rows)
+            yield stream.end()
+
+    chunks = body()
+
+    def close() -> None:
+        # A started body leaves `with stack` when closed; otherwise stack.close() releases the connection
+        chunks.close()
+        stack.close()
+
+    return ClosingStreamingResponse(chunks, close=partial(run_in_threadpool, close), media_type=stream.media_type)
+
+
+async def _stream_report_async(payload: RouteRequest, response_format: str) -> StreamingResponse:
+    stack = AsyncExitStack()
+    try:
+        conn = await stack.enter_async_context(_get_async_db_connection())
+        query, params, response = await _prepare_report_async(conn, payload)
+    except BaseException:
+        await stack.aclose()
+        raise
+    stream = ReportStream(response, response_format)
+
+    async def body():
+        async with stack:
+            yield stream.start()
+            # asyncpg cursors only exist inside a transaction
+            async with conn.transaction():
+                cursor = await conn.cursor(to_asyncpg_query(query), *params)
+                while True:
+                    rows = await cursor.fetch(REPORT_STREAM_BATCH_ROWS)
+                    if not rows:
+                        break
+                    yield stream.rows([dict(row) for row in rows])
+            yield stream.end()
+
+    chunks = body()
+
+    async def close() -> None:
+        await chunks.aclose()
+        await stack.aclose()
+
+    return ClosingStreamingResponse(chunks, close=close, media_type=stream.media_type)
+
+
+def get_route_general_report(payload: RouteRequest, request: Request) -> Any:
+    response_format = stream_format(request)
+    if response_format is not None:
+        return _stream_report(payload, response_format)
+
+    with _get_db_connection() as conn:
+        query, params, response = _prepare_report(conn, payload)
+        data = _run_query(conn, query, params)
+
+    return _with_rows(response, data)
+
+
+async def get_route_general_report_async(payload: RouteRequest, request: Request) -> Any:
+    response_format = stream_format(request)
+    if response_format is not None:
+        return await _stream_report_async(payload, response_format)
+
+    async with _get_async_db_connection() as conn:
+        query, params, response = await _prepare_report_async(conn, payload)
+        data = await _run_query_async(conn, query, params)
+
+    return _with_rows(response, data)
+
+
+# DB_DRIVER=asyncpg: async handler on the asyncpg pool, otherwise psycopg2 in the threadpool
+app.post("/route-general-report")(
+    get_route_general_report_async if USE_ASYNCPG else get_route_general_report
+)
+
+
 @app.get("/health")
 def health_check() -> Dict[str, str]:
     return {"status": "ok"}
 
 
+@app.get("/db-pool-stats")
+async def db_pool_stats() -> Dict[str, Any]:
+    pool = await get_async_pool() if USE_ASYNCPG else get_pool()
+    if pool is None:
+        raise HTTPException(status_code=500, detail="Database environment variables are not fully configured.")
+    return pool.stats()
+
+
+@app.get("/destinations-stats")
+def destinations_stats() -> Dict[str, Any]:
+    return destinations.stats()
+
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -0,0 +1,534 @@
+"""
+Kostka cen tras (lane × okno × pojazd) dla wyceny w app_full_backup.py.
+
+Zamiast agregować surowe public.offers / "OffersTransEU" przy każdej wycenie,
+dla każdej giełdy utrzymywane są:
+- report_rollup.<giełda>_lane_daily - sumy i liczniki cen per trasa i dzień
+  (enlistment_date) w obrębie najdłuższego okna
+- report_rollup.<giełda>_price_cube - gotowe średnie dla okien 7/30/90 dni
+  (ROUND(SUM / COUNT, 4) - dokładnie to, co liczy AVG w zapytaniu)
+- w procesach aplikacji: tablica NumPy [start, cel, okno, wartość] indeksowana
+  ID regionów - wycena to jeden odczyt z tablicy, bez zapytania do bazy
+
+Odświeżanie tabel robi wyłącznie `python price_cube.py refresh` uruchamiane
+z crona. Triggery (na poziomie instrukcji, jak w lane_rollup.py) zapisują
+w report_rollup.<giełda>_cube_dirty_days każdy dzień, w którym oferty dodano,
+zmieniono lub usunięto - także wstecz - i refresh przelicza dokładnie te dni,
+więc kostka nie rozjeżdża się z zapytaniami na surowych danych.
+
+Workery aplikacji (PRICE_CUBE=on, domyślnie off) nie piszą do bazy: co
+PRICE_CUBE_RELOAD_SECONDS sprawdzają czas ostatniego odświeżenia i wczytują
+kostkę tylko, gdy się zmieniła. Kostka starsza niż PRICE_CUBE_MAX_AGE_SECONDS
+(np. gdy cron stanął) nie jest używana. Okresy spoza PRICE_CUBE_WINDOWS
+i czas przed pierwszym załadowaniem obsługują zwykłe zapytania do bazy.
+
+Użycie:
+    python price_cube.py install [timocom|transeu ...]   # tabele, triggery, pełne przeliczenie
+    python price_cube.py refresh [timocom|transeu ...]   # zmienione dni (cron, np. co 10 min)
+    python price_cube.py rebuild [timocom|transeu ...]   # całe okno od zera
+    python price_cube.py drop [timocom|transeu ...]
+    python price_cube.py stats
+"""
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import psycopg2
+
+from db_pool import connect_kwargs_from_env, get_pool
+
+PRICE_CUBE = os.getenv("PRICE_CUBE", "off").lower()
+PRICE_CUBE_RELOAD_SECONDS = float(os.getenv("PRICE_CUBE_RELOAD_SECONDS", "60"))
+PRICE_CUBE_MAX_AGE_SECONDS = float(os.getenv("PRICE_CUBE_MAX_AGE_SECONDS", "1800"))
+PRICE_CUBE_WINDOWS: Tuple[int, ...] = tuple(
+    sorted(int(days) for days in os.getenv("PRICE_CUBE_WINDOWS", "7,30,90").split(","))
+)
+PRICE_CUBE_SCHEMA = "report_rollup"
+PRICE_CUBE_STATE = f"{PRICE_CUBE_SCHEMA}.price_cube_state"
+
+
+@dataclass(frozen=True)
+class CubeSpec:
+    source: str
+    table_prefix: str
+    # kolumna ceny -> alias w wyniku (jak w zapytaniach get_timocom_data / get_transeu_data)
+    prices: Tuple[Tuple[str, str], ...]
+    # kolumna liczby ofert (TimoCom) - Trans.eu jej nie ma
+    offers_column: Optional[str] = None
+
+    @property
+    def daily(self) -> str:
+        return f"{PRICE_CUBE_SCHEMA}.{self.table_prefix}_lane_daily"
+
+    @property
+    def cube(self) -> str:
+        return f"{PRICE_CUBE_SCHEMA}.{self.table_prefix}_price_cube"
+
+    @property
+    def dirty(self) -> str:
+        return f"{PRICE_CUBE_SCHEMA}.{self.table_prefix}_cube_dirty_days"
+
+    @property
+    def function(self) -> str:
+        return f"{PRICE_CUBE_SCHEMA}.{self.table_prefix}_cube_mark"
+
+    @property
+    def values(self) -> Tuple[str, ...]:
+        """Wartości w kostce, w kolejności ostatniego wymiaru tablicy"""
+        offers = ("total_offers",) if self.offers_column else ()
+        return tuple(alias for _, alias in self.prices) + offers + ("days_count",)
+
+
+CUBES: Dict[str, CubeSpec] = {
+    "timocom": CubeSpec(
+        source="public.offers",
+        table_prefix="timocom",
+        prices=(
+            ("trailer_avg_price_per_km", "avg_trailer_price"),
+            ("vehicle_up_to_3_5_t_avg_price_per_km", "avg_3_5t_price"),
+            ("vehicle_up_to_12_t_avg_price_per_km", "avg_12t_price"),
+        ),
+        offers_column="number_of_offers_total",
+    ),
+    "transeu": CubeSpec(
+        source='public."OffersTransEU"',
+        table_prefix="transeu",
+        prices=(("lorry_avg_price_per_km", "avg_lorry_price"),),
+    ),
+}
+
+
+def _mark_sql(spec: CubeSpec, rows: str) -> str:
+    # Bez klucza unikalnego - równoległe ładowania ofert nie czekają na siebie nawzajem
+    return f"""
+        INSERT INTO {spec.dirty} (enlistment_date)
+        SELECT DISTINCT enlistment_date FROM {rows} WHERE enlistment_date IS NOT NULL
+    """
+
+
+def install_sql(spec: CubeSpec) -> Iterable[str]:
+    price_columns = ",\n            ".join(
+        f"{alias}_sum numeric, {alias}_count bigint NOT NULL DEFAULT 0" for _, alias in spec.prices
+    )
+    cube_columns = ",\n            ".join(f"{alias} numeric" for _, alias in spec.prices)
+    offers = "offers_total numeric," if spec.offers_column else ""
+    cube_offers = "total_offers numeric," if spec.offers_column else ""
+    yield f"CREATE SCHEMA IF NOT EXISTS {PRICE_CUBE_SCHEMA};"
+    yield f"""
+        CREATE TABLE IF NOT EXISTS {spec.daily} (
+            starting_id     bigint NOT NULL,
+            destination_id  bigint NOT NULL,
+            enlistment_date date   NOT NULL,
+            {price_columns},
+            {offers}
+            rows_count      bigint NOT NULL,
+            PRIMARY KEY (starting_id, destination_id, enlistment_date)
+        );
+    """
+    yield f"CREATE INDEX IF NOT EXISTS {spec.table_prefix}_lane_daily_date ON {spec.daily} (enlistment_date);"
+    yield f"""
+        CREATE TABLE IF NOT EXISTS {spec.cube} (
+            starting_id    bigint  NOT NULL,
+            destination_id bigint  NOT NULL,
+            window_days    integer NOT NULL,
+            {cube_columns},
+            {cube_offers}
+            days_count     bigint  NOT NULL,
+            PRIMARY KEY (starting_id, destination_id, window_days)
+        );
+    """
+    yield f"CREATE TABLE IF NOT EXISTS {spec.dirty} (enlistment_date date NOT NULL);"
+    yield f"""
+        CREATE TABLE IF NOT EXISTS {PRICE_CUBE_STATE} (
+            exchange     text PRIMARY KEY,
+            refreshed_at timestamptz NOT NULL,
+            cube_date    date NOT NULL
+        );
+    """
+    yield f"""
+        CREATE OR REPLACE FUNCTION {spec.function}() RETURNS trigger LANGUAGE plpgsql AS $fn$
+        BEGIN
+            IF TG_OP = 'TRUNCATE' THEN
+                DELETE FROM {spec.daily};
+                RETURN NULL;
+            END IF;
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                {_mark_sql(spec, "old_rows")};
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                {_mark_sql(spec, "new_rows")};
+            END IF;
+            RETURN NULL;
+        END
+        $fn$;
+    """
+    yield from triggers_sql(spec)
+
+
+def triggers_sql(spec: CubeSpec) -> Iterable[str]:
+    """Triggery oznaczające zmienione dni (także po przebudowie tabeli ofert - db_migrations.py partition)"""
+    trigger = f"{spec.table_prefix}_price_cube"
+    yield from drop_triggers_sql(spec)
+    yield f"""
+        CREATE TRIGGER {trigger}_ins AFTER INSERT ON {spec.source}
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION {spec.function}();
+    """
+    yield f"""
+        CREATE TRIGGER {trigger}_upd AFTER UPDATE ON {spec.source}
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION {spec.function}();
+    """
+    yield f"""
+        CREATE TRIGGER {trigger}_del AFTER DELETE ON {spec.source}
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION {spec.function}();
+    """
+    yield f"""
+        CREATE TRIGGER {trigger}_trunc AFTER TRUNCATE ON {spec.source}
+        FOR EACH STATEMENT EXECUTE FUNCTION {spec.function}();
+    """
+
+
+def drop_triggers_sql(spec: CubeSpec) -> Iterable[str]:
+    trigger = f"{spec.table_prefix}_price_cube"
+    for suffix in ("ins", "upd", "del", "trunc"):
+        yield f"DROP TRIGGER IF EXISTS {trigger}_{suffix} ON {spec.source};"
+
+
+def drop_sql(spec: CubeSpec, exchange: str) -> Iterable[str]:
+    yield from drop_triggers_sql(spec)
+    yield f"DROP FUNCTION IF EXISTS {spec.function}();"
+    for table in (spec.dirty, spec.cube, spec.daily):
+        yield f"DROP TABLE IF EXISTS {table};"
+    yield f"DO $$ BEGIN DELETE FROM {PRICE_CUBE_STATE} WHERE exchange = '{exchange}'; EXCEPTION WHEN undefined_table THEN NULL; END $$;"
+
+
+def daily_select_sql(spec: CubeSpec, days_filter: str) -> str:
+    """Agregaty dzienne dla dni wybranych przez days_filter (warunek na o.enlistment_date)"""
+    aggregates = ",\n            ".join(f"SUM(o.{column}), COUNT(o.{column})" for column, _ in spec.prices)
+    offers = f", SUM(o.{spec.offers_column})" if spec.offers_column else ""
+    return f"""
+        SELECT
+            o.starting_id,
+            o.destination_id,
+            o.enlistment_date,
+            {aggregates}{offers},
+            COUNT(*)
+        FROM {spec.source} AS o
+        WHERE {days_filter}
+          AND o.starting_id IS NOT NULL
+          AND o.destination_id IS NOT NULL
+        GROUP BY o.starting_id, o.destination_id, o.enlistment_date
+    """
+
+
+def daily_sql(spec: CubeSpec, days_filter: str) -> str:
+    columns = ", ".join(f"{alias}_sum, {alias}_count" for _, alias in spec.prices)
+    offers_column = ", offers_total" if spec.offers_column else ""
+    return f"""
+        INSERT INTO {spec.daily} (starting_id, destination_id, enlistment_date, {columns}{offers_column}, rows_count)
+        {daily_select_sql(spec, days_filter).strip()};
+    """
+
+
+def cube_select_sql(spec: CubeSpec) -> str:
+    """Kostka z agregatów dziennych - okno N dni to enlistment_date >= CURRENT_DATE - N, jak w zapytaniach wyceny"""
+    averages = ",\n            ".join(
+        f"ROUND(SUM(d.{alias}_sum) / NULLIF(SUM(d.{alias}_count), 0), 4)" for _, alias in spec.prices
+    )
+    offers = ", SUM(d.offers_total)" if spec.offers_column else ""
+    windows = ", ".join(f"({days})" for days in PRICE_CUBE_WINDOWS)
+    return f"""
+        SELECT
+            d.starting_id,
+            d.destination_id,
+            w.days,
+            {averages}{offers},
+            COUNT(*)
+        FROM {spec.daily} AS d
+        JOIN (VALUES {windows}) AS w(days) ON d.enlistment_date >= CURRENT_DATE - w.days
+        GROUP BY d.starting_id, d.destination_id, w.days
+    """
+
+
+def cube_sql(spec: CubeSpec) -> str:
+    columns = ", ".join(alias for _, alias in spec.prices)
+    offers_column = ", total_offers" if spec.offers_column else ""
+    return f"""
+        INSERT INTO {spec.cube} (starting_id, destination_id, window_days, {columns}{offers_column}, days_count)
+        {cube_select_sql(spec).strip()};
+    """
+
+
+def refresh(conn, exchange: str, rebuild: bool = False) -> Optional[int]:
+    """
+    Przelicza dni oznaczone przez triggery (albo całe okno) i kostkę w jednej
+    transakcji. Zwraca liczbę przeliczonych dni; None, gdy trwa inne odświeżenie.
+    """
+    spec = CUBES[exchange]
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_try_advisory_xact_lock(hashtext(%s)) AS locked;", (spec.cube,))
+        if not cur.fetchone()["locked"]:
+            conn.rollback()
+            return None
+
+        cur.execute("SELECT CURRENT_DATE - %s AS first;", (max(PRICE_CUBE_WINDOWS),))
+        first = cur.fetchone()["first"]
+        # Oznaczenia z transakcji jeszcze niezatwierdzonych zostają na następny refresh
+        cur.execute(f"DELETE FROM {spec.dirty} RETURNING enlistment_date;")
+        days = sorted({row["enlistment_date"] for row in cur.fetchall()} - {None})
+        days = [day for day in days if day >= first]
+        cur.execute(f"SELECT 1 FROM {PRICE_CUBE_STATE} WHERE exchange = %s;", (exchange,))
+        full = rebuild or cur.fetchone() is None
+
+        if full:
+            cur.execute(f"DELETE FROM {spec.daily};")
+            cur.execute(daily_sql(spec, "o.enlistment_date >= %s"), (first,))
+        else:
+            cur.execute(
+                f"DELETE FROM {spec.daily} WHERE enlistment_date < %s OR enlistment_date = ANY(%s::date[]);",
+                (first, days),
+            )
+            if days:
+                cur.execute(daily_sql(spec, "o.enlistment_date = ANY(%s::date[])"), (days,))
+
+        # Okna liczone od CURRENT_DATE - kostka przeliczana przy każdym odświeżeniu
+        cur.execute(f"DELETE FROM {spec.cube};")
+        cur.execute(cube_sql(spec))
+        cur.execute(
+            f"""
+            INSERT INTO {PRICE_CUBE_STATE} (exchange, refreshed_at, cube_date) VALUES (%s, now(), CURRENT_DATE)
+            ON CONFLICT (exchange) DO UPDATE SET refreshed_at = EXCLUDED.refreshed_at, cube_date = EXCLUDED.cube_date;
+            """,
+            (exchange,),
+        )
+    conn.commit()
+    return max(PRICE_CUBE_WINDOWS) + 1 if full else len(days)
+
+
+def _id_index(ids: np.ndarray) -> np.ndarray:
+    """Tablica ID regionu -> pozycja w kostce (-1 dla regionów bez danych)"""
+    index = np.full(int(ids.max()) + 1 if len(ids) else 0, -1, dtype=np.int32)
+    index[ids] = np.arange(len(ids), dtype=np.int32)
+    return index
+
+
+class PriceCube:
+    """Kostka jednej giełdy; migawka podmieniana atomowo przy wczytaniu - odczyty bez blokady"""
+
+    def __init__(self, exchange: str, spec: CubeSpec):
+        self.exchange = exchange
+        self.spec = spec
+        # (indeks startów, indeks celów, wartości [start, cel, okno, wartość], refreshed_at)
+        self._snapshot: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray, float]] = None
+        self.loaded_at: Optional[float] = None
+        self.lanes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def refreshed_at(self) -> Optional[float]:
+        snapshot = self._snapshot
+        return snapshot[3] if snapshot else None
+
+    def reload(self, conn) -> bool:
+        """Wczytuje kostkę, jeśli od ostatniego wczytania była odświeżona; tylko odczyt"""
+        with conn.cursor() as cur:
+            # Najpierw stan: odświeżenie zatwierdzone w międzyczasie najwyżej wymusi kolejne wczytanie
+            cur.execute(f"SELECT refreshed_at FROM {PRICE_CUBE_STATE} WHERE exchange = %s;", (self.exchange,))
+            row = cur.fetchone()
+            if row is None or row["refreshed_at"].timestamp() == self.refreshed_at:
+                conn.rollback()
+                return False
+            cur.execute(
+                f"SELECT starting_id, destination_id, window_days, {', '.join(self.spec.values)} FROM {self.spec.cube};"
+            )
+            rows = cur.fetchall()
+        conn.rollback()
+        self.load(rows, row["refreshed_at"].timestamp())
+        return True
+
+    def load(self, rows, refreshed_at: float) -> int:
+        spec = self.spec
+        starts = np.array([row["starting_id"] for row in rows], dtype=np.int64)
+        destinations = np.array([row["destination_id"] for row in rows], dtype=np.int64)
+        windows = np.searchsorted(PRICE_CUBE_WINDOWS, [row["window_days"] for row in rows])
+        values = np.array(
+            [[np.nan if row[name] is None else float(row[name]) for name in spec.values] for row in rows],
+            dtype=np.float64,
+        ).reshape(len(rows), len(spec.values))
+
+        start_ids, start_pos = np.unique(starts, return_inverse=True)
+        destination_ids, destination_pos = np.unique(destinations, return_inverse=True)
+        cube = np.full((len(start_ids), len(destination_ids), len(PRICE_CUBE_WINDOWS), len(spec.values)), np.nan)
+        cube[start_pos, destination_pos, windows] = values
+
+        self._snapshot = (_id_index(start_ids), _id_index(destination_ids), cube, refreshed_at)
+        self.loaded_at = time.time()
+        self.lanes = len(set(zip(starts.tolist(), destinations.tolist())))
+        return self.lanes
+
+    def lookup(self, start_id: int, end_id: int, days: int) -> Optional[Dict[str, Any]]:
+        """
+        Wartości trasy dla okna jak wiersz zapytania get_timocom_data / get_transeu_data
+        (średnie None przy braku danych). None, gdy kostka nie obejmuje tego okresu
+        albo jest przeterminowana - wtedy trzeba zapytać bazę.
+        """
+        snapshot = self._snapshot
+        if (
+            snapshot is None
+            or days not in PRICE_CUBE_WINDOWS
+            or time.time() - snapshot[3] > PRICE_CUBE_MAX_AGE_SECONDS
+        ):
+            self.misses += 1
+            return None
+        self.hits += 1
+
+        start_index, destination_index, cube, _ = snapshot
+        start = start_index[start_id] if 0 <= start_id < len(start_index) else -1
+        destination = destination_index[end_id] if 0 <= end_id < len(destination_index) else -1
+        if start < 0 or destination < 0:
+            values = np.full(len(self.spec.values), np.nan)
+        else:
+            values = cube[start, destination, PRICE_CUBE_WINDOWS.index(days)]
+
+        result = {name: None if np.isnan(value) else float(value) for name, value in zip(self.spec.values, values)}
+        result["days_count"] = int(result["days_count"] or 0)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "loaded_at": self.loaded_at,
+            "refreshed_at": self.refreshed_at,
+            "stale": snapshot is not None and time.time() - snapshot[3] > PRICE_CUBE_MAX_AGE_SECONDS,
+            "lanes": self.lanes,
+            "shape": list(snapshot[2].shape) if snapshot else None,
+            "bytes": int(snapshot[2].nbytes) if snapshot else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class PriceCubeLoader:
+    """Wczytuje kostki w procesie aplikacji - bez DDL i bez zapisów do bazy"""
+
+    def __init__(self, specs: Dict[str, CubeSpec] = CUBES, reload_interval: float = PRICE_CUBE_RELOAD_SECONDS):
+        self.cubes = {exchange: PriceCube(exchange, spec) for exchange, spec in specs.items()}
+        self.reload_interval = reload_interval
+        self.reloads = 0
+        self.last_error: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def get(self, exchange: str) -> PriceCube:
+        return self.cubes[exchange]
+
+    def reload(self) -> bool:
+        pool = get_pool()
+        if pool is None:
+            return False
+
+        errors = {}
+        for exchange, cube in self.cubes.items():
+            # Każda giełda osobno - błąd jednej nie blokuje drugiej
+            try:
+                with pool.connection() as conn:
+                    if cube.reload(conn):
+                        print(f"🧊 Kostka cen {exchange}: wczytano {cube.lanes} tras")
+            except Exception as exc:
+                errors[exchange] = str(exc).strip()
+
+        self.reloads += 1
+        self.last_error = "; ".join(f"{exchange}: {error}" for exchange, error in errors.items()) or None
+        if errors:
+            print(f"⚠ Wczytanie kostki cen nie powiodło się: {errors}")
+        return not errors
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.reload()
+            self._stop.wait(self.reload_interval)
+
+    def ensure_started(self) -> None:
+        """Wątek wczytujący uruchamiany przy pierwszej wycenie (w procesie workera, nie przed forkiem)"""
+        if self._thread is not None or PRICE_CUBE != "on":
+            return
+        with self._lock:
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="price-cube-reload", daemon=True)
+                self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": PRICE_CUBE == "on",
+            "windows": list(PRICE_CUBE_WINDOWS),
+            "reload_interval_seconds": self.reload_interval,
+            "max_age_seconds": PRICE_CUBE_MAX_AGE_SECONDS,
+            "reloads": self.reloads,
+            "last_error": self.last_error,
+            "exchanges": {exchange: cube.stats() for exchange, cube in self.cubes.items()},
+        }
+
+
+price_cubes = PriceCubeLoader()
+
+
+def main(argv) -> int:
+    commands = ("install", "refresh", "rebuild", "drop", "stats")
+    if not argv or argv[0] not in commands:
+        print(__doc__)
+        return 2
+
+    connect_kwargs = connect_kwargs_from_env()
+    if connect_kwargs is None:
+        print("Database environment variables are not fully configured.")
+        return 1
+
+    command, exchanges = argv[0], [a.lower() for a in argv[1:]] or list(CUBES)
+    conn = psycopg2.connect(**connect_kwargs)
+    try:
+        for exchange in exchanges:
+            spec = CUBES[exchange]
+            if command == "stats":
+                cube = PriceCube(exchange, spec)
+                cube.reload(conn)
+                print(f"{exchange}: {cube.stats()}")
+                continue
+            if command in ("install", "drop"):
+                with conn.cursor() as cur:
+                    for statement in install_sql(spec) if command == "install" else drop_sql(spec, exchange):
+                        cur.execute(statement)
+                if command == "drop":
+                    conn.commit()
+                    print(f"✅ drop: {exchange}")
+                    continue
+            # install: tabele, triggery i pełne przeliczenie w jednej transakcji
+            days = refresh(conn, exchange, rebuild=command != "refresh")
+            if days is None:
+                print(f"⏭ {exchange}: odświeżanie trwa w innym procesie")
+            else:
+                print(f"✅ {command}: {exchange} - przeliczono {days} dni")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
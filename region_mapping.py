@@ -0,0 +1,207 @@
+"""
+Trans.eu -> TimoCom region mapping compiled into a dense lookup array.
+
+static/data/transeu_to_timocom_mapping.json maps every Trans.eu region to the nearest
+TimoCom region centre in the same country (distance_km between the region centres).
+The file is generated - edit the GeoJSON sources and rerun build_region_mappings.py;
+`build_region_mappings.py --check` fails when the committed file is out of date.
+load_region_mapping() validates the file and compiles it into a numpy array indexed
+by Trans.eu id:
+- entries further than TRANSEU_TIMOCOM_MAX_DISTANCE_KM are dropped
+- Trans.eu regions missing from the file (or dropped) fall back to the nearest
+  TimoCom region centre (voronoi_regions.geojson / timocom_regions.geojson),
+  again only within the threshold
+- everything else maps to UNMAPPED - a Trans.eu id is not a TimoCom id, so it is
+  never passed through as one
+
+Used by app_full_backup.py (map_transeu_to_timocom_id) and "main 1.py"
+(freight_exchange=Both).
+
+Usage:
+    python region_mapping.py    # coverage report
+"""
+import json
+import os
+import sys
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "data")
+
+TRANSEU_TO_TIMOCOM_MAPPING_PATH = os.getenv(
+    "TRANSEU_TO_TIMOCOM_MAPPING_PATH", os.path.join(DATA_DIR, "transeu_to_timocom_mapping.json")
+)
+TRANSEU_REGIONS_PATH = os.getenv("TRANSEU_REGIONS_PATH", os.path.join(DATA_DIR, "voronoi_regions.geojson"))
+TIMOCOM_REGIONS_PATH = os.getenv("TIMOCOM_REGIONS_PATH", os.path.join(DATA_DIR, "timocom_regions.geojson"))
+TRANSEU_TIMOCOM_MAX_DISTANCE_KM = float(os.getenv("TRANSEU_TIMOCOM_MAX_DISTANCE_KM", "250"))
+
+UNMAPPED = -1
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Great-circle distance in km; arguments broadcast like numpy arrays."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(value, dtype=np.float64)) for value in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def region_centres(path: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(ids, latitudes, longitudes) of a regions GeoJSON, ordered by id."""
+    with open(path, "r", encoding="utf-8") as f:
+        features = json.load(f)["features"]
+    rows = sorted(
+        (int(p["id"]), float(p["latitude"]), float(p["longitude"])) for p in (f["properties"] for f in features)
+    )
+    ids, lats, lons = zip(*rows) if rows else ((), (), ())
+    return np.array(ids, dtype=np.int64), np.array(lats, dtype=np.float64), np.array(lons, dtype=np.float64)
+
+
+@dataclass
+class MappingCoverage:
+    regions: int = 0
+    from_file: int = 0
+    fallback: List[int] = field(default_factory=list)
+    too_far: List[int] = field(default_factory=list)
+    unmapped: List[int] = field(default_factory=list)
+    invalid: List[str] = field(default_factory=list)
+    max_distance_km: float = TRANSEU_TIMOCOM_MAX_DISTANCE_KM
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    def summary(self) -> str:
+        return (
+            f"{self.from_file + len(self.fallback)}/{self.regions} regions mapped "
+            f"({self.from_file} from file, {len(self.fallback)} by distance fallback), "
+            f"{len(self.too_far)} beyond {self.max_distance_km:g} km, {len(self.unmapped)} unmapped, "
+            f"{len(self.invalid)} invalid entries"
+        )
+
+
+class RegionMapping:
+    """Dense Trans.eu id -> TimoCom id table; UNMAPPED where no TimoCom region is close enough."""
+
+    def __init__(self, table: np.ndarray, distances: np.ndarray, coverage: MappingCoverage):
+        self.table = table
+        self.distances = distances
+        self.coverage = coverage
+
+    def map_one(self, transeu_id: int) -> Optional[int]:
+        if transeu_id is None or not 0 <= transeu_id < len(self.table):
+            return None
+        timocom_id = int(self.table[transeu_id])
+        return None if timocom_id == UNMAPPED else timocom_id
+
+    def map_many(self, transeu_ids: Iterable[int]) -> np.ndarray:
+        """TimoCom ids for an array of Trans.eu ids, UNMAPPED for unknown ids."""
+        ids = np.asarray(transeu_ids if isinstance(transeu_ids, np.ndarray) else list(transeu_ids), dtype=np.int64)
+        result = np.full(ids.shape, UNMAPPED, dtype=np.int64)
+        known = (ids >= 0) & (ids < len(self.table))
+        result[known] = self.table[ids[known]]
+        return result
+
+
+def _read_entries(data: Dict[str, Any], timocom_ids: set, coverage: MappingCoverage) -> List[Tuple[int, int, float]]:
+    entries = []
+    for key, entry in data.items():
+        try:
+            transeu_id = int(key)
+            timocom_id = int(entry["timocom_id"])
+            distance = float(entry["distance_km"])
+        except (KeyError, TypeError, ValueError) as exc:
+            coverage.invalid.append(f"{key}: {exc!r}")
+            continue
+        if transeu_id < 0 or not distance >= 0:
+            coverage.invalid.append(f"{key}: id {transeu_id}, distance_km {distance}")
+        elif timocom_ids and timocom_id not in timocom_ids:
+            coverage.invalid.append(f"{key}: unknown TimoCom region {timocom_id}")
+        else:
+            entries.append((transeu_id, timocom_id, distance))
+    return entries
+
+
+def load_region_mapping(
+    mapping_path: str = TRANSEU_TO_TIMOCOM_MAPPING_PATH,
+    transeu_regions_path: str = TRANSEU_REGIONS_PATH,
+    timocom_regions_path: str = TIMOCOM_REGIONS_PATH,
+    max_distance_km: float = TRANSEU_TIMOCOM_MAX_DISTANCE_KM,
+) -> RegionMapping:
+    """Validates the mapping file and compiles it; OSError / ValueError when it cannot be read."""
+    with open(mapping_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError(f"{mapping_path}: expected an object keyed by Trans.eu id")
+
+    try:
+        transeu_ids, transeu_lats, transeu_lons = region_centres(transeu_regions_path)
+        timocom_ids, timocom_lats, timocom_lons = region_centres(timocom_regions_path)
+    except (OSError, ValueError, KeyError) as exc:
+        # Without region centres only the file entries are used
+        print(f"⚠ Region centres unavailable, no distance fallback: {exc}")
+        transeu_ids = timocom_ids = np.array([], dtype=np.int64)
+        transeu_lats = transeu_lons = timocom_lats = timocom_lons = np.array([], dtype=np.float64)
+
+    coverage = MappingCoverage(max_distance_km=max_distance_km)
+    entries = _read_entries(data, set(timocom_ids.tolist()), coverage)
+
+    size = max([int(transeu_ids.max()) if len(transeu_ids) else -1] + [entry[0] for entry in entries]) + 1
+    table = np.full(size, UNMAPPED, dtype=np.int64)
+    distances = np.full(size, np.nan, dtype=np.float64)
+    for transeu_id, timocom_id, distance in entries:
+        if distance > max_distance_km:
+            coverage.too_far.append(transeu_id)
+            continue
+        table[transeu_id] = timocom_id
+        distances[transeu_id] = distance
+        coverage.from_file += 1
+
+    # Regions known from the GeoJSON but without a usable entry: nearest TimoCom centre
+    missing = np.flatnonzero(table[transeu_ids] == UNMAPPED) if len(transeu_ids) else np.array([], dtype=np.int64)
+    if len(missing) and len(timocom_ids):
+        matrix = haversine_km(
+            transeu_lats[missing, None], transeu_lons[missing, None], timocom_lats[None, :], timocom_lons[None, :]
+        )
+        nearest = matrix.argmin(axis=1)
+        nearest_km = matrix[np.arange(len(missing)), nearest]
+        within = nearest_km <= max_distance_km
+        table[transeu_ids[missing[within]]] = timocom_ids[nearest[within]]
+        distances[transeu_ids[missing[within]]] = np.round(nearest_km[within], 2)
+        coverage.fallback = sorted(int(i) for i in transeu_ids[missing[within]])
+
+    known = set(transeu_ids.tolist()) | {entry[0] for entry in entries}
+    coverage.regions = len(known)
+    coverage.unmapped = sorted(i for i in known if table[i] == UNMAPPED)
+    coverage.too_far = sorted(set(coverage.too_far))
+    return RegionMapping(table, distances, coverage)
+
+
+@lru_cache(maxsize=1)
+def transeu_to_timocom() -> RegionMapping:
+    """Process-wide mapping, loaded on first use."""
+    return load_region_mapping()
+
+
+def main(argv) -> int:
+    mapping = load_region_mapping(max_distance_km=float(argv[0]) if argv else TRANSEU_TIMOCOM_MAX_DISTANCE_KM)
+    coverage = mapping.coverage
+    print(coverage.summary())
+    for label, values in (
+        ("distance fallback", coverage.fallback),
+        (f"beyond {coverage.max_distance_km:g} km", coverage.too_far),
+        ("unmapped", coverage.unmapped),
+        ("invalid", coverage.invalid),
+    ):
+        if values:
+            print(f"  {label}: {', '.join(map(str, values))}")
+    mapped = mapping.distances[~np.isnan(mapping.distances)]
+    if len(mapped):
+        print(f"  distance km: median {np.median(mapped):.2f}, p95 {np.percentile(mapped, 95):.2f}, max {mapped.max():.2f}")
+    return 1 if coverage.unmapped or coverage.invalid else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,94 @@
+"""
+Streamed /route-general-report responses.
+
+The report rows are read in batches from a server-side cursor and encoded as they
+arrive, Decimals converted while encoding - memory stays bounded by one batch
+however long the history is. Used by "main 1.py" and mainaPI.py.
+"""
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+
+def stream_format(request: Request) -> Optional[str]:
+    """
+    ?stream=json (or 1/true): the same JSON document, streamed;
+    ?stream=ndjson or Accept: application/x-ndjson: the response head, then one row per line.
+    """
+    stream = request.query_params.get("stream", "").lower()
+    if stream in ("1", "true", "json"):
+        return "json"
+    if stream == "ndjson" or "application/x-ndjson" in request.headers.get("accept", ""):
+        return "ndjson"
+    return None
+
+
+class ClosingStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that always runs `close` once the server has it: after the last
+    chunk, on a client disconnect, or when the body was never iterated. Starlette skips
+    `background` when the client disconnects, so it cannot hold the pooled connection.
+    """
+
+    def __init__(self, content: Any, close: Callable[[], Awaitable[None]], media_type: str):
+        super().__init__(content, media_type=media_type)
+        self._close = close
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self._close()
+
+
+def json_default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value: Any) -> str:
+    # Same output as FastAPI's JSONResponse, Decimals converted while encoding
+    return json.dumps(value, default=json_default, ensure_ascii=False, separators=(",", ":"))
+
+
+class ReportStream:
+    """
+    Encodes a report as it is read: the response head first, then every batch of
+    rows, then row_count - never more than one batch in memory.
+    """
+
+    def __init__(self, response: Dict[str, Any], response_format: str):
+        keys = list(response)
+        self.head = {key: response[key] for key in keys[: keys.index("rows")]}
+        self.tail = {key: response[key] for key in keys[keys.index("row_count") + 1:]}
+        self.ndjson = response_format == "ndjson"
+        self.row_count = 0
+
+    def start(self) -> str:
+        if self.ndjson:
+            return dumps({**self.head, **self.tail}) + "\n"
+        return dumps(self.head)[:-1] + ',"rows":['
+
+    def rows(self, rows: List[Dict[str, Any]]) -> str:
+        if self.ndjson:
+            chunk = "".join(dumps(row) + "\n" for row in rows)
+        else:
+            chunk = ("," if self.row_count else "") + ",".join(dumps(row) for row in rows)
+        self.row_count += len(rows)
+        return chunk
+
+    def end(self) -> str:
+        if self.ndjson:
+            return ""
+        return "]," + dumps({"row_count": self.row_count, **self.tail})[1:]
+
+    @property
+    def media_type(self) -> str:
+        return "application/x-ndjson" if self.ndjson else "application/json"
@@ -0,0 +1,353 @@
+"""
+Cache odpowiedzi Backend API (wyceny) i AWS (dystanse).
+
+Klucz to np. znormalizowana trasa ('PL20', 'DE49'). Wpisy wygasają po TTL,
+a po przekroczeniu limitu rozmiaru usuwany jest najdawniej używany (LRU).
+
+Backendy (CACHE_BACKEND):
+- memory - słownik w pamięci procesu (osobny dla każdego workera gunicorna)
+- sqlite - plik SQLite w trybie WAL współdzielony przez wszystkie workery na węźle
+"""
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").lower()
+CACHE_SQLITE_PATH = os.getenv(
+    "CACHE_SQLITE_PATH", os.path.join(tempfile.gettempdir(), "cargoscout_cache.sqlite3")
+)
+# Co ile sekund (albo po ilu trafieniach) worker zapisuje zebrane last_access (SQLiteCache)
+CACHE_SQLITE_TOUCH_INTERVAL = float(os.getenv("CACHE_SQLITE_TOUCH_INTERVAL", "5"))
+CACHE_SQLITE_TOUCH_BATCH = int(os.getenv("CACHE_SQLITE_TOUCH_BATCH", "256"))
+
+
+class TTLCache:
+    """Bezpieczny wątkowo cache LRU z czasem życia wpisów (pamięć procesu)"""
+
+    backend = 'memory'
+
+    def __init__(self, maxsize=5000, ttl=3600, name='cache'):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """Zwraca wartość lub None (brak / wygasła)"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key=None):
+        """Usuwa jeden wpis lub (key=None) cały cache. Zwraca liczbę usuniętych."""
+        with self._lock:
+            if key is None:
+                removed = len(self._data)
+                self._data.clear()
+            else:
+                removed = 1 if self._data.pop(key, None) is not None else 0
+            self.invalidations += removed
+            return removed
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'name': self.name,
+                'backend': self.backend,
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
+
+
+class SQLiteCache:
+    """
+    Cache LRU z TTL w pliku SQLite (tryb WAL) - jeden ciepły cache dla
+    wszystkich workerów na węźle, bez zewnętrznej usługi.
+
+    Wartości muszą być serializowalne do JSON. Liczniki hit/miss są
+    per proces, rozmiar i wpisy są wspólne.
+
+    Trafienie to sam odczyt - last_access zbierany jest w pamięci i zapisywany
+    jedną transakcją co CACHE_SQLITE_TOUCH_INTERVAL s (albo po
+    CACHE_SQLITE_TOUCH_BATCH trafieniach) i przed każdym set(), więc odczyty
+    nie czekają na blokadę zapisu WAL. LRU jest przez to przybliżone
+    o ten interwał. Błędy SQLite (np. "database is locked") nie wychodzą
+    poza cache: get() zwraca wtedy brak, set() pomija zapis, invalidate()
+    zwraca None, a stats() size=None.
+    """
+
+    backend = 'sqlite'
+
+    def __init__(self, path, maxsize=5000, ttl=3600, name='cache'):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self._local = threading.local()
+        self._counter_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.errors = 0
+        self._touched = {}
+        self._touch_lock = threading.Lock()
+        self._flushed_at = time.monotonic()
+        self._init_schema()
+
+    def _connect(self):
+        # Osobne połączenie na wątek i proces (po forku gunicorna)
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _init_schema(self):
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                namespace   TEXT NOT NULL,
+                key         TEXT NOT NULL,
+                value       TEXT NOT NULL,
+                expires_at  REAL NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+        """)
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_cache_entries_lru ON cache_entries (namespace, last_access)"
+        )
+
+    @staticmethod
+    def _encode_key(key):
+        return json.dumps(list(key) if isinstance(key, tuple) else key, separators=(',', ':'))
+
+    def _count(self, counter, amount=1):
+        with self._counter_lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def _error(self, operation, exc):
+        self._count('errors')
+        print(f"⚠ Cache '{self.name}': błąd SQLite - {operation} ({exc}), pomijam cache")
+
+    def _touch(self, db_key, now):
+        with self._touch_lock:
+            self._touched[db_key] = now
+            due = (len(self._touched) >= CACHE_SQLITE_TOUCH_BATCH
+                   or time.monotonic() - self._flushed_at >= CACHE_SQLITE_TOUCH_INTERVAL)
+        if due:
+            self._flush_touched(self._connect())
+
+    def _flush_touched(self, conn):
+        """Zapisuje zebrane last_access (w bieżącej transakcji, jeśli jest otwarta)"""
+        with self._touch_lock:
+            touched, self._touched = self._touched, {}
+            self._flushed_at = time.monotonic()
+        if not touched:
+            return
+        rows = [(last_access, self.name, db_key, last_access) for db_key, last_access in touched.items()]
+        statement = ("UPDATE cache_entries SET last_access = ? "
+                     "WHERE namespace = ? AND key = ? AND last_access < ?")
+        if conn.in_transaction:
+            conn.executemany(statement, rows)
+            return
+        # Z odczytu nie czekamy na blokadę zapisu - zajęta: spróbujemy przy następnym trafieniu
+        conn.execute("PRAGMA busy_timeout=0")
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(statement, rows)
+            conn.execute("COMMIT")
+        except sqlite3.Error as exc:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            if isinstance(exc, sqlite3.OperationalError) and 'locked' in str(exc):
+                with self._touch_lock:
+                    for db_key, last_access in touched.items():
+                        self._touched[db_key] = max(last_access, self._touched.get(db_key, 0))
+            else:
+                # Tylko przybliżenie LRU - zgubione last_access nie psują odczytów
+                self._error('zapis last_access', exc)
+        finally:
+            conn.execute("PRAGMA busy_timeout=5000")
+
+    def get(self, key):
+        """Zwraca wartość lub None (brak / wygasła / błąd SQLite)"""
+        now = time.time()
+        db_key = self._encode_key(key)
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?",
+                (self.name, db_key),
+            ).fetchone()
+
+            if row is not None and row[1] <= now:
+                conn.execute(
+                    "DELETE FROM cache_entries WHERE namespace = ? AND key = ? AND expires_at <= ?",
+                    (self.name, db_key, now),
+                )
+                self._count('expirations')
+                row = None
+        except sqlite3.Error as exc:
+            self._error('odczyt', exc)
+            row = None
+
+        if row is None:
+            self._count('misses')
+            return None
+
+        self._touch(db_key, now)
+        self._count('hits')
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        now = time.time()
+        payload = json.dumps(value, separators=(',', ':'))
+        try:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+        except sqlite3.Error as exc:
+            self._error('zapis', exc)
+            return
+        try:
+            # Zaległe last_access przed wyborem wpisów do usunięcia (LRU)
+            self._flush_touched(conn)
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (self.name, self._encode_key(key), payload, now + self.ttl, now),
+            )
+            (size,) = conn.execute(
+                "SELECT COUNT(*) FROM cache_entries WHERE namespace = ?", (self.name,)
+            ).fetchone()
+            overflow = size - self.maxsize
+            if overflow > 0:
+                conn.execute(
+                    "DELETE FROM cache_entries WHERE rowid IN ("
+                    "SELECT rowid FROM cache_entries WHERE namespace = ? ORDER BY last_access LIMIT ?)",
+                    (self.name, overflow),
+                )
+                self._count('evictions', overflow)
+            conn.execute("COMMIT")
+        except sqlite3.Error as exc:
+            conn.execute("ROLLBACK")
+            self._error('zapis', exc)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def invalidate(self, key=None):
+        """
+        Usuwa jeden wpis lub (key=None) cały namespace. Zwraca liczbę usuniętych
+        albo None, gdy SQLite zgłosił błąd (nic nie zostało usunięte).
+        """
+        try:
+            conn = self._connect()
+            if key is None:
+                cur = conn.execute("DELETE FROM cache_entries WHERE namespace = ?", (self.name,))
+            else:
+                cur = conn.execute(
+                    "DELETE FROM cache_entries WHERE namespace = ? AND key = ?",
+                    (self.name, self._encode_key(key)),
+                )
+        except sqlite3.Error as exc:
+            self._error('unieważnienie', exc)
+            return None
+        removed = cur.rowcount
+        self._count('invalidations', removed)
+        return removed
+
+    def stats(self):
+        """Statystyki; size=None, gdy SQLite zgłosił błąd"""
+        try:
+            (size,) = self._connect().execute(
+                "SELECT COUNT(*) FROM cache_entries WHERE namespace = ?", (self.name,)
+            ).fetchone()
+        except sqlite3.Error as exc:
+            self._error('odczyt rozmiaru', exc)
+            size = None
+        with self._counter_lock:
+            lookups = self.hits + self.misses
+            return {
+                'name': self.name,
+                'backend': self.backend,
+                'path': self.path,
+                'pid': os.getpid(),
+                'size': size,
+                'maxsize': self.maxsize,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+                'errors': self.errors,
+                'pending_touches': len(self._touched),
+            }
+
+
+def create_cache(name, maxsize, ttl, backend=None):
+    """Tworzy cache według CACHE_BACKEND (memory | sqlite)"""
+    backend = (backend or CACHE_BACKEND).lower()
+
+    if backend == 'sqlite':
+        try:
+            cache = SQLiteCache(CACHE_SQLITE_PATH, maxsize=maxsize, ttl=ttl, name=name)
+            print(f"🗄️ Cache '{name}': sqlite ({CACHE_SQLITE_PATH})")
+            return cache
+        except sqlite3.Error as e:
+            print(f"⚠ Cache '{name}': sqlite niedostępny ({e}) - używam pamięci procesu")
+    elif backend != 'memory':
+        print(f"⚠ Nieznany CACHE_BACKEND '{backend}' - używam pamięci procesu")
+
+    return TTLCache(maxsize=maxsize, ttl=ttl, name=name)
@@ -0,0 +1,146 @@
+"""
+Single-flight - łączenie równoczesnych, identycznych wywołań.
+
+Pierwsze wywołanie dla danego klucza (lider) wykonuje funkcję, a wywołania
+z tym samym kluczem, które przyjdą w trakcie, czekają na jego wynik
+(albo wyjątek) i dostają ten sam obiekt.
+
+Działa w obrębie procesu - żeby łączyć równoległe wyceny w jednym workerze,
+gunicorn musi obsługiwać kilka requestów naraz (np. --threads 4).
+"""
+import asyncio
+import threading
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Koalescencja wywołań po kluczu z licznikami deduplikacji"""
+
+    def __init__(self, name='singleflight'):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.deduplicated = 0
+        self.errors = 0
+
+    def do(self, key, fn, timeout=None):
+        """
+        Wykonuje fn() raz dla wszystkich równoczesnych wywołań z kluczem key.
+
+        Returns:
+            (wynik, shared) - shared=True jeśli wynik pochodzi z cudzego wywołania
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.deduplicated += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.leaders += 1
+                leader = True
+
+        if not leader:
+            if not call.event.wait(timeout):
+                raise TimeoutError(f"{self.name}: przekroczono czas oczekiwania na {key}")
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as exc:
+            call.error = exc
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+        return call.result, False
+
+    def stats(self):
+        with self._lock:
+            total = self.leaders + self.deduplicated
+            return {
+                'name': self.name,
+                'in_flight': len(self._calls),
+                'waiting': sum(c.waiters for c in self._calls.values()),
+                'leaders': self.leaders,
+                'deduplicated': self.deduplicated,
+                'dedup_ratio': round(self.deduplicated / total, 4) if total else None,
+                'errors': self.errors,
+            }
+
+
+class AsyncSingleFlight:
+    """
+    Wersja dla asyncio - wywołanie działa jako osobne zadanie, więc
+    rozłączenie klienta-lidera nie przerywa go pozostałym oczekującym
+    """
+
+    def __init__(self, name='singleflight'):
+        self.name = name
+        self._calls = {}
+        self.leaders = 0
+        self.deduplicated = 0
+        self.errors = 0
+
+    async def _run(self, key, coro_fn):
+        try:
+            return await coro_fn()
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self._calls.pop(key, None)
+
+    @staticmethod
+    def _consume_exception(task):
+        # Wyjątek odbierają oczekujący; gdy wszyscy się rozłączyli - bez ostrzeżenia asyncio
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key, coro_fn):
+        """
+        Wykonuje await coro_fn() raz dla wszystkich równoczesnych wywołań z kluczem key.
+
+        Returns:
+            (wynik, shared) - shared=True jeśli wynik pochodzi z cudzego wywołania
+        """
+        task = self._calls.get(key)
+        shared = task is not None
+        if shared:
+            self.deduplicated += 1
+        else:
+            self.leaders += 1
+            task = asyncio.ensure_future(self._run(key, coro_fn))
+            task.add_done_callback(self._consume_exception)
+            self._calls[key] = task
+
+        return await asyncio.shield(task), shared
+
+    def stats(self):
+        total = self.leaders + self.deduplicated
+        return {
+            'name': self.name,
+            'in_flight': len(self._calls),
+            'leaders': self.leaders,
+            'deduplicated': self.deduplicated,
+            'dedup_ratio': round(self.deduplicated / total, 4) if total else None,
+            'errors': self.errors,
+        }
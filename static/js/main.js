@@ -3,6 +3,11 @@
  * Bez geokodowania - tylko wysyłanie kodów pocztowych do API
  */
 
+// Aktualna trasa i stan listy zleceń historycznych (paginacja)
+let currentLane = null;
+let historicalOrdersState = { orders: [], nextCursor: null, total: 0 };
+
+
 document.addEventListener('DOMContentLoaded', function() {
     console.log('🚀 Cargo Scout UI - Simple Mode');
     
@@ -56,6 +61,8 @@ async function calculateRoute(startCode, endCode) {
         
         console.log('✅ Dane z API:', data);
         
+        currentLane = { start: startCode, end: endCode };
+        
         // Ukryj spinner
         hideLoadingSpinner();
         
@@ -135,7 +142,14 @@ function displayResults(data) {
     displayHistoricalCarriers(data.historical_rates || {});
     
     // Wyświetl zlecenia historyczne
-    displayHistoricalOrders(data.historical_orders || []);
+    const ordersPage = data.historical_orders_page || {};
+    historicalOrdersState = {
+        orders: data.historical_orders || [],
+        // mode 'all' (tryb strumieniowy) - wszystkie zlecenia już są, bez kolejnych stron
+        nextCursor: ordersPage.mode === 'all' ? null : (ordersPage.next_cursor || null),
+        total: ordersPage.total || (data.historical_orders || []).length
+    };
+    displayHistoricalOrders(historicalOrdersState.orders);
     
     // Scroll do wyników
     resultsSection.scrollIntoView({ behavior: 'smooth', block: 'start' });
@@ -291,7 +305,52 @@ function displayHistoricalOrders(orders) {
     });
     
     html += '</tbody></table></div>';
+    
+    if (historicalOrdersState.nextCursor) {
+        html += `<div class="text-center">
+            <button type="button" class="btn btn-outline-secondary btn-sm" id="loadMoreOrders">
+                <i class="fas fa-chevron-down"></i> Pokaż więcej (${orders.length} z ${historicalOrdersState.total})
+            </button>
+        </div>`;
+    }
+    
     container.innerHTML = html;
+    
+    const loadMoreButton = document.getElementById('loadMoreOrders');
+    if (loadMoreButton) {
+        loadMoreButton.addEventListener('click', loadMoreHistoricalOrders);
+    }
+}
+
+
+async function loadMoreHistoricalOrders() {
+    if (!currentLane || !historicalOrdersState.nextCursor) return;
+    
+    const params = new URLSearchParams({
+        start_location: currentLane.start,
+        end_location: currentLane.end,
+        cursor: historicalOrdersState.nextCursor
+    });
+    
+    try {
+        const response = await fetch(`/api/historical-orders?${params}`);
+        const page = await response.json();
+        
+        if (!response.ok) {
+            console.error('❌ Błąd:', page);
+            alert(`Błąd: ${page.error || 'Nieznany błąd'}`);
+            return;
+        }
+        
+        historicalOrdersState.orders = historicalOrdersState.orders.concat(page.orders || []);
+        historicalOrdersState.nextCursor = page.next_cursor || null;
+        historicalOrdersState.total = page.total;
+        displayHistoricalOrders(historicalOrdersState.orders);
+        
+    } catch (error) {
+        console.error('❌ Błąd:', error);
+        alert(`Błąd połączenia: ${error.message}`);
+    }
 }
 
 
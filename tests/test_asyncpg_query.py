@@ -0,0 +1,50 @@
+import re
+
+import pytest
+
+import check_query_plans
+import lane_rollup
+from db_pool_async import to_asyncpg_query
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('SELECT 1', 'SELECT 1'),
+    ('SELECT * FROM t WHERE a = %s', 'SELECT * FROM t WHERE a = $1'),
+    ('%s', '$1'),
+    ('WHERE a = %s AND b = ANY(%s::bigint[]) AND c = %s', 'WHERE a = $1 AND b = ANY($2::bigint[]) AND c = $3'),
+    ('VALUES (%s,%s)', 'VALUES ($1,$2)'),
+    ("WHERE city LIKE 'Kra%%' AND id = %s", "WHERE city LIKE 'Kra%' AND id = $1"),
+    ("SELECT '100%%%s'", "SELECT '100%$1'"),
+])
+def test_to_asyncpg_query(query, expected):
+    assert to_asyncpg_query(query) == expected
+
+
+def _placeholders(query):
+    return [int(number) for number in re.findall(r'\$(\d+)', to_asyncpg_query(query))]
+
+
+@pytest.fixture(scope='module')
+def report_service():
+    return check_query_plans._load_report_service()
+
+
+LANE = {'start_id': 1, 'start_name': 'Warszawa', 'dest_id': 2, 'dest_name': 'Berlin',
+        'start_ids': [1, 11], 'dest_ids': [2, 22]}
+
+
+@pytest.mark.parametrize('rollup', [False, True])
+@pytest.mark.parametrize('passing_city_name', [False, True])
+def test_report_queries_number_every_parameter(report_service, monkeypatch, rollup, passing_city_name):
+    monkeypatch.setattr(report_service, 'use_rollup', lambda exchange: rollup)
+    built = [report_service._build_report_query(exchange, passing_city_name, **LANE)
+             for exchange in ('timocom', 'transeu')]
+    built.append(report_service._build_both_report_query(passing_city_name, {'timocom': LANE, 'transeu': LANE}))
+    for query, params in built:
+        assert '%s' not in to_asyncpg_query(query)
+        assert _placeholders(query) == list(range(1, len(params) + 1))
+
+
+@pytest.mark.parametrize('exchange', ['timocom', 'transeu'])
+def test_batch_report_query_numbers_every_parameter(exchange):
+    assert _placeholders(lane_rollup.batch_report_query(exchange)) == [1, 2, 3]
@@ -0,0 +1,64 @@
+import sqlite3
+
+import pytest
+
+import check_query_plans
+from db_pool import connect_kwargs_from_env
+
+# Hourly aggregates of each exchange for one lane: both have a NULL-hour group
+HOURS = {
+    'timocom': [(None, 11, 12, 13), (1, 10, 10, 10), (2, 14, 14, 14)],
+    'transeu': [(None, 21), (1, 20), (3, 23)],
+}
+COLUMNS = {
+    'timocom': ('enlistment_hour', 'avg_trailer_price', 'avg_3_5t_price', 'avg_12t_price'),
+    'transeu': ('enlistment_hour', 'avg_lorry_price'),
+}
+EXPECTED = [
+    (1, 10, 10, 10, 20),
+    (2, 14, 14, 14, None),
+    (3, None, None, None, 23),
+    (None, 11, 12, 13, 21),
+]
+
+
+def _aggregate_query(exchange):
+    rows = [
+        ", ".join(f"{'NULL' if value is None else value} AS {column}" for value, column in zip(row, COLUMNS[exchange]))
+        for row in HOURS[exchange]
+    ]
+    return "SELECT " + " UNION ALL SELECT ".join(rows) + ";"
+
+
+@pytest.fixture
+def both_query(monkeypatch):
+    service = check_query_plans._load_report_service()
+    monkeypatch.setattr(service, '_build_report_query',
+                        lambda exchange, passing_city_name, **lane: (_aggregate_query(exchange), ()))
+    query, params = service._build_both_report_query(False, {'timocom': {}, 'transeu': {}})
+    assert params == ()
+    return query
+
+
+def test_null_hours_of_both_exchanges_are_one_row(both_query):
+    rows = sqlite3.connect(':memory:').execute(both_query).fetchall()
+    # SQLite sorts NULL first, PostgreSQL last - only the rows are compared here
+    assert sorted(rows, key=lambda row: (row[0] is None, row[0] or 0)) == EXPECTED
+
+
+def test_null_hours_of_both_exchanges_on_postgres(both_query):
+    psycopg2 = pytest.importorskip('psycopg2')
+    connect_kwargs = connect_kwargs_from_env()
+    if connect_kwargs is None:
+        pytest.skip('POSTGRES_* not set')
+    connect_kwargs.pop('cursor_factory')
+    try:
+        conn = psycopg2.connect(connect_timeout=3, **connect_kwargs)
+    except psycopg2.OperationalError as exc:
+        pytest.skip(f'PostgreSQL unavailable: {exc}')
+    try:
+        with conn.cursor() as cur:
+            cur.execute(both_query)
+            assert cur.fetchall() == EXPECTED
+    finally:
+        conn.close()
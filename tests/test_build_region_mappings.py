@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+import build_region_mappings
+from build_region_mappings import KDTree, _unit_vectors
+from region_mapping import haversine_km
+
+
+def _brute_force(tree, lat, lon):
+    query = tuple(_unit_vectors(lat, lon).tolist())
+    chords = [sum((a - b) ** 2 for a, b in zip(point, query)) for point in tree.points]
+    return chords.index(min(chords))  # first minimum - the lower index on ties
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_kdtree_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    # Europe-sized cloud plus points anywhere on the sphere
+    lats = np.concatenate([rng.uniform(35, 70, 300), np.degrees(np.arcsin(rng.uniform(-1, 1, 50)))])
+    lons = np.concatenate([rng.uniform(-10, 40, 300), rng.uniform(-180, 180, 50)])
+    tree = KDTree(lats, lons)
+
+    query_lats = np.concatenate([rng.uniform(30, 75, 200), np.degrees(np.arcsin(rng.uniform(-1, 1, 50)))])
+    query_lons = np.concatenate([rng.uniform(-20, 50, 200), rng.uniform(-180, 180, 50)])
+    for lat, lon in zip(query_lats, query_lons):
+        index, distance = tree.nearest(lat, lon)
+        assert index == _brute_force(tree, lat, lon)
+        assert distance == pytest.approx(haversine_km(lat, lon, lats, lons).min(), abs=1e-6)
+
+
+def test_kdtree_ties_go_to_the_lower_index():
+    lats = [50.0, 52.0, 50.0, 52.0, 50.0]
+    lons = [20.0, 21.0, 20.0, 21.0, 20.0]
+    tree = KDTree(lats, lons)
+    assert tree.nearest(50.1, 20.0)[0] == 0
+    assert tree.nearest(51.9, 21.0)[0] == 1
+
+
+def test_kdtree_single_point():
+    index, distance = KDTree([52.23], [21.01]).nearest(52.23, 21.01)
+    assert (index, distance) == (0, pytest.approx(0.0, abs=1e-6))
+
+
+def test_committed_mappings_are_up_to_date():
+    # static/data must be exactly what the generator writes
+    assert build_region_mappings.main(['--check']) == 0
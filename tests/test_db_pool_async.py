@@ -0,0 +1,82 @@
+import asyncio
+import itertools
+
+import db_pool_async
+from db_pool_async import AsyncConnectionPool
+
+
+class FakeConnection:
+    pids = itertools.count(1000)
+
+    def __init__(self):
+        self.pid = next(self.pids)
+        self.closed = False
+
+    def get_server_pid(self):
+        return self.pid
+
+    def is_closed(self):
+        return self.closed
+
+    async def close(self, timeout=None):
+        self.closed = True
+
+    def terminate(self):
+        self.closed = True
+
+
+class FakePool:
+    """One asyncpg connection slot: reconnects (and runs init) when its connection was closed"""
+
+    def __init__(self):
+        self.init = None
+        self.conn = None
+        self.released = 0
+
+    async def acquire(self, timeout=None):
+        if self.conn is None or self.conn.closed:
+            self.conn = FakeConnection()
+            await self.init(self.conn)
+        return self.conn
+
+    async def release(self, conn):
+        self.released += 1
+
+
+def test_connections_are_recycled_by_age(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(db_pool_async.time, 'monotonic', lambda: now[0])
+
+    async def scenario():
+        pool = AsyncConnectionPool(FakePool(), max_lifetime=60)
+        pool._pool.init = pool._opened
+        pids = []
+        for step in (0, 30, 31, 0, 10):
+            now[0] += step
+            async with pool.connection() as conn:
+                pids.append(conn.pid)
+        return pool, pids
+
+    pool, pids = asyncio.run(scenario())
+    # Returned at 161 s after opening at 100 s: closed, the next checkout gets a new connection
+    assert pids[0] == pids[1] == pids[2] != pids[3] == pids[4]
+    assert pool.recycled == 1 and pool._pool.released == 5
+    assert list(pool._opened_at) == [pids[3]]
+
+
+def test_max_lifetime_zero_disables_recycling(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(db_pool_async.time, 'monotonic', lambda: now[0])
+
+    async def scenario():
+        pool = AsyncConnectionPool(FakePool(), max_lifetime=0)
+        pool._pool.init = pool._opened
+        pids = []
+        for _ in range(3):
+            now[0] += 10_000
+            async with pool.connection() as conn:
+                pids.append(conn.pid)
+        return pool, pids
+
+    pool, pids = asyncio.run(scenario())
+    assert len(set(pids)) == 1 and pool.recycled == 0
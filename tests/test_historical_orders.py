@@ -0,0 +1,112 @@
+import base64
+
+import pytest
+
+import app as flask_app
+from app import _decode_cursor, _encode_cursor, query_historical_orders
+
+
+def _order(day, carrier, order_type, rate, amount):
+    return {
+        'order_date': f'2025-03-{day:02d}T08:00:00' if day else None,
+        'carrier_name': carrier,
+        'order_type': order_type,
+        'carrier_price_per_km': rate,
+        'carrier_amount': amount,
+        'carrier_currency': 'EUR',
+        'route_distance': 850,
+    }
+
+
+ORDERS = [
+    _order(3, 'Trans-Pol Sp. z o.o.', 'FTL', 1.10, 900.0),
+    _order(1, 'Kowalski Transport', 'LTL', 0.80, 400.0),
+    _order(7, 'TRANS-POL SP. Z O.O.', 'FTL', None, 950.0),
+    _order(5, 'Euro Cargo', 'FTL', 0.95, None),
+    _order(None, 'Euro Cargo', 'LTL', 1.30, 500.0),
+    _order(2, 'Kowalski Transport', 'FTL', 0.85, 700.0),
+    _order(6, 'Nord Logistik', 'LTL', 1.00, 300.0),
+]
+BACKEND_DATA = {'pricing': {'historical': {'180d': {'orders': ORDERS}}}}
+
+
+@pytest.mark.parametrize('offset', [0, 1, 50, 10 ** 9])
+def test_cursor_round_trip(offset):
+    cursor = _encode_cursor(offset)
+    assert '=' not in cursor
+    assert _decode_cursor(cursor) == offset
+
+
+@pytest.mark.parametrize('cursor', [None, ''])
+def test_missing_cursor_is_first_page(cursor):
+    assert _decode_cursor(cursor) == 0
+
+
+@pytest.mark.parametrize('raw', [b'o:-1', b'x:5', b'o:abc', b'5', b'\xff\xfe'])
+def test_invalid_cursor(raw):
+    with pytest.raises(ValueError):
+        _decode_cursor(base64.urlsafe_b64encode(raw).decode())
+
+
+def test_garbage_cursor():
+    with pytest.raises(ValueError):
+        _decode_cursor('!!not base64!!')
+
+
+@pytest.mark.parametrize('sort', ['date', 'rate_per_km', 'amount'])
+@pytest.mark.parametrize('descending', [True, False])
+def test_pages_cover_every_order_once(sort, descending):
+    full = query_historical_orders(BACKEND_DATA, sort=sort, descending=descending, limit=100)
+    assert full['next_cursor'] is None
+
+    orders, cursor, pages = [], None, 0
+    while True:
+        page = query_historical_orders(BACKEND_DATA, sort=sort, descending=descending, cursor=cursor, limit=3)
+        assert page['total'] == len(ORDERS)
+        orders += page['orders']
+        pages += 1
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+
+    assert pages == 3
+    assert orders == full['orders']
+
+
+@pytest.mark.parametrize('sort', ['date', 'rate_per_km', 'amount'])
+@pytest.mark.parametrize('descending', [True, False])
+def test_orders_without_value_sort_last(sort, descending):
+    values = [o[sort] for o in query_historical_orders(BACKEND_DATA, sort=sort, descending=descending)['orders']]
+    present = [v for v in values if v is not None]
+    assert values == present + [None]
+    assert present == sorted(present, reverse=descending)
+
+
+def test_filters():
+    page = query_historical_orders(BACKEND_DATA, order_type='ftl', carrier='trans-pol')
+    assert [o['date'] for o in page['orders']] == ['2025-03-07', '2025-03-03']
+
+    page = query_historical_orders(BACKEND_DATA, date_from='2025-03-02', date_to='2025-03-05', descending=False)
+    assert [o['date'] for o in page['orders']] == ['2025-03-02', '2025-03-03', '2025-03-05']
+    assert page['total'] == 3
+
+
+def test_cursor_past_the_end():
+    page = query_historical_orders(BACKEND_DATA, cursor=_encode_cursor(len(ORDERS) + 5))
+    assert page['orders'] == [] and page['next_cursor'] is None
+
+
+def test_endpoint_rejects_invalid_cursor(monkeypatch):
+    monkeypatch.setattr(flask_app, 'BACKEND_API_URL', 'http://backend')
+    monkeypatch.setattr(flask_app, 'BACKEND_API_KEY', 'key')
+    monkeypatch.setattr(flask_app, 'load_lane_pricing', lambda start, end: (BACKEND_DATA, None))
+    client = flask_app.app.test_client()
+    url = '/api/historical-orders?start_location=PL20&end_location=DE49&limit=2'
+
+    first = client.get(url).get_json()
+    assert len(first['orders']) == 2
+    second = client.get(f"{url}&cursor={first['next_cursor']}").get_json()
+    assert second['orders'][0] == query_historical_orders(BACKEND_DATA, limit=3)['orders'][2]
+
+    response = client.get(f'{url}&cursor=bm9wZQ')
+    assert response.status_code == 400
@@ -0,0 +1,99 @@
+import dataclasses
+import datetime
+import decimal
+import uuid
+
+import pytest
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from bench_quote_response import make_backend_data
+from json_provider import OrjsonProvider
+
+pytest.importorskip('orjson')
+
+
+@dataclasses.dataclass
+class Point:
+    z: int
+    a: float
+
+
+OBJECTS = [
+    {'b': 1, 'a': 'zażółć 😀 \x7f \x01 </script>', 'nested': {'y': [1, 2], 'x': None}},
+    [1.5, float('nan'), None],
+    {'x': float('inf'), 'y': float('-inf')},
+    {'at': datetime.datetime(2024, 1, 2, 3, 4, 5), 'day': datetime.date(2024, 1, 2)},
+    {'price': decimal.Decimal('1.10'), 'id': uuid.UUID(int=5), 'point': Point(1, 2.0)},
+    {1: 2, 3: None},
+    {'big': 2 ** 70},
+    {'tuple': (1, 'a')},
+    {},
+    [],
+    'ą',
+    0.1,
+    1e20,
+    -0.0,
+    make_backend_data(carriers=5, orders=20),
+]
+
+DUMPS_KWARGS = [
+    {},
+    {'separators': (',', ':')},
+    {'separators': [',', ':']},
+    {'indent': 2},
+    {'indent': 2, 'separators': (',', ': ')},
+    {'indent': 4},
+    {'ensure_ascii': False, 'separators': (',', ':')},
+    {'sort_keys': False, 'separators': (',', ':')},
+    {'default': str, 'separators': (',', ':')},
+    {'allow_nan': False, 'separators': (',', ':')},
+]
+
+
+@pytest.fixture
+def providers():
+    app = Flask(__name__)
+    return app, DefaultJSONProvider(app), OrjsonProvider(app)
+
+
+def _dumps(provider, obj, kwargs):
+    try:
+        return provider.dumps(obj, **kwargs)
+    except (TypeError, ValueError) as exc:
+        return repr(exc)
+
+
+@pytest.mark.parametrize('kwargs', DUMPS_KWARGS, ids=repr)
+@pytest.mark.parametrize('obj', OBJECTS, ids=lambda obj: type(obj).__name__)
+def test_dumps_matches_default_provider(providers, obj, kwargs):
+    _, default, fast = providers
+    assert _dumps(fast, obj, kwargs) == _dumps(default, obj, kwargs)
+
+
+@pytest.mark.parametrize('debug', [False, True])
+@pytest.mark.parametrize('obj', [obj for obj in OBJECTS if isinstance(obj, (dict, list))],
+                         ids=lambda obj: type(obj).__name__)
+def test_response_matches_default_provider(providers, obj, debug):
+    app, default, fast = providers
+    app.debug = debug
+    with app.app_context():
+        expected, actual = default.response(obj), fast.response(obj)
+    assert actual.get_data() == expected.get_data()
+    assert actual.mimetype == expected.mimetype
+
+
+def test_ensure_ascii_off(providers):
+    app, default, fast = providers
+    default.ensure_ascii = fast.ensure_ascii = False
+    obj = {'city': 'Kraków', 'emoji': '🚚'}
+    with app.app_context():
+        assert fast.response(obj).get_data() == default.response(obj).get_data()
+    assert fast.dumps(obj, separators=(',', ':')) == default.dumps(obj, separators=(',', ':'))
+
+
+def test_loads(providers):
+    _, default, fast = providers
+    text = default.dumps(make_backend_data(carriers=3, orders=5))
+    assert fast.loads(text) == default.loads(text)
+    assert fast.loads(text.encode()) == default.loads(text.encode())
@@ -0,0 +1,74 @@
+import json
+
+import numpy as np
+import pytest
+
+from region_mapping import UNMAPPED, haversine_km, load_region_mapping
+
+
+def _regions(path, centres):
+    features = [
+        {'type': 'Feature', 'geometry': None, 'properties': {'id': region_id, 'latitude': lat, 'longitude': lon}}
+        for region_id, (lat, lon) in centres.items()
+    ]
+    path.write_text(json.dumps({'type': 'FeatureCollection', 'features': features}), encoding='utf-8')
+    return str(path)
+
+
+@pytest.fixture
+def mapping(tmp_path):
+    transeu = _regions(tmp_path / 'transeu.geojson', {
+        1: (52.23, 21.01),  # Warszawa
+        2: (50.06, 19.94),  # Kraków - bez wpisu w pliku
+        3: (52.52, 13.40),  # Berlin - wpis za daleko
+        5: (64.15, -21.94),  # Reykjavík - nic w zasięgu
+    })
+    timocom = _regions(tmp_path / 'timocom.geojson', {
+        10: (52.40, 16.93),  # Poznań
+        11: (50.26, 19.02),  # Katowice
+        12: (52.39, 13.06),  # Poczdam
+    })
+    entries = tmp_path / 'mapping.json'
+    entries.write_text(json.dumps({
+        '1': {'timocom_id': 10, 'distance_km': 120.0},
+        '3': {'timocom_id': 10, 'distance_km': 400.0},
+        '4': {'timocom_id': 11, 'distance_km': 10.0},  # tylko w pliku
+        '6': {'timocom_id': 99, 'distance_km': 10.0},  # nieznany region TimoCom
+        '7': {'timocom_id': 'x', 'distance_km': 10.0},
+    }), encoding='utf-8')
+    return load_region_mapping(str(entries), transeu, timocom, max_distance_km=250)
+
+
+def test_map_many(mapping):
+    ids = [1, 2, 3, 4, 5, 6, 7, -1, 10 ** 6]
+    expected = [10, 11, 12, 11, UNMAPPED, UNMAPPED, UNMAPPED, UNMAPPED, UNMAPPED]
+    assert mapping.map_many(ids).tolist() == expected
+    assert mapping.map_many(np.array(ids)).tolist() == expected
+    assert mapping.map_many(iter(ids)).tolist() == expected
+    assert [mapping.map_one(i) for i in ids] == [None if i == UNMAPPED else i for i in expected]
+
+
+def test_map_many_keeps_shape(mapping):
+    result = mapping.map_many(np.array([[1, 2], [5, 40]]))
+    assert result.dtype == np.int64
+    assert result.tolist() == [[10, 11], [UNMAPPED, UNMAPPED]]
+    assert mapping.map_many([]).shape == (0,)
+
+
+def test_coverage(mapping):
+    coverage = mapping.coverage
+    assert coverage.from_file == 2
+    assert coverage.fallback == [2, 3]
+    assert coverage.too_far == [3]
+    assert coverage.unmapped == [5]
+    assert [entry.split(':')[0] for entry in coverage.invalid] == ['6', '7']
+    assert mapping.distances[2] == round(float(haversine_km(50.06, 19.94, 50.26, 19.02)), 2)
+    assert np.isnan(mapping.distances[5])
+
+
+def test_committed_mapping_maps_every_region():
+    mapping = load_region_mapping()
+    ids = np.arange(-1, len(mapping.table) + 1)
+    one_by_one = [mapping.map_one(int(i)) for i in ids]
+    assert mapping.map_many(ids).tolist() == [UNMAPPED if t is None else t for t in one_by_one]
+    assert not mapping.coverage.unmapped and not mapping.coverage.invalid
@@ -0,0 +1,154 @@
+import sqlite3
+
+import pytest
+
+import response_cache
+from response_cache import SQLiteCache, TTLCache
+
+
+class Clock:
+    """Ręczny zegar; tick() przesuwa czas, żeby kolejność last_access była jednoznaczna"""
+
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def tick(self):
+        self.now += 1
+        return self.now
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1  # 'b' staje się najdawniej używany
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert cache.stats()['evictions'] == 1
+
+
+def test_ttl_cache_expires_entries(monkeypatch):
+    clock = Clock(1000.0)
+    monkeypatch.setattr(response_cache.time, 'monotonic', clock)
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set(('PL20', 'DE49'), {'price': 1.1})
+
+    clock.now += 59
+    assert cache.get(('PL20', 'DE49')) == {'price': 1.1}
+    clock.now += 1
+    assert cache.get(('PL20', 'DE49')) is None
+
+    stats = cache.stats()
+    assert (stats['size'], stats['expirations'], stats['hits'], stats['misses']) == (0, 1, 1, 1)
+
+
+def test_ttl_cache_invalidate():
+    cache = TTLCache(maxsize=10, ttl=60)
+    for key in 'abc':
+        cache.set(key, key)
+    assert cache.invalidate('a') == 1
+    assert cache.invalidate('a') == 0
+    assert cache.invalidate() == 2
+    assert cache.get('b') is None
+
+
+@pytest.fixture
+def wall_clock(monkeypatch):
+    clock = Clock(1_700_000_000.0)
+    monkeypatch.setattr(response_cache.time, 'time', clock.tick)
+    # Trafienia zostają w pamięci do najbliższego set()
+    monkeypatch.setattr(response_cache, 'CACHE_SQLITE_TOUCH_INTERVAL', 3600)
+    return clock
+
+
+def test_sqlite_cache_evicts_least_recently_used(tmp_path, wall_clock):
+    cache = SQLiteCache(str(tmp_path / 'cache.sqlite3'), maxsize=2, ttl=60, name='pricing')
+    cache.set(('PL20', 'DE49'), {'price': 1})
+    cache.set(('PL20', 'FR75'), {'price': 2})
+    assert cache.get(('PL20', 'DE49')) == {'price': 1}
+    assert cache.stats()['pending_touches'] == 1
+    # set() zapisuje zaległe last_access przed wyborem wpisu do usunięcia
+    cache.set(('PL20', 'IT20'), {'price': 3})
+
+    assert cache.get(('PL20', 'FR75')) is None
+    assert cache.get(('PL20', 'DE49')) == {'price': 1}
+    assert cache.get(('PL20', 'IT20')) == {'price': 3}
+    stats = cache.stats()
+    assert (stats['size'], stats['evictions']) == (2, 1)
+
+
+def test_sqlite_cache_is_shared_between_workers(tmp_path, wall_clock):
+    path = str(tmp_path / 'cache.sqlite3')
+    writer = SQLiteCache(path, maxsize=10, ttl=60, name='pricing')
+    reader = SQLiteCache(path, maxsize=10, ttl=60, name='pricing')
+    other = SQLiteCache(path, maxsize=10, ttl=60, name='distance')
+    writer.set('lane', [1, 2])
+
+    assert reader.get('lane') == [1, 2]
+    assert other.get('lane') is None
+
+
+def test_sqlite_cache_expires_entries(tmp_path, monkeypatch):
+    clock = Clock(1_700_000_000.0)
+    monkeypatch.setattr(response_cache.time, 'time', clock)
+    cache = SQLiteCache(str(tmp_path / 'cache.sqlite3'), maxsize=10, ttl=5, name='pricing')
+    cache.set('lane', 1)
+    clock.now += 5
+
+    assert cache.get('lane') is None
+    stats = cache.stats()
+    assert (stats['size'], stats['expirations'], stats['misses']) == (0, 1, 1)
+
+
+def test_sqlite_cache_errors_are_misses(tmp_path, wall_clock):
+    path = str(tmp_path / 'cache.sqlite3')
+    cache = SQLiteCache(path, maxsize=10, ttl=60, name='pricing')
+    cache.set('lane', 1)
+    conn = sqlite3.connect(path)
+    conn.execute('DROP TABLE cache_entries')
+    conn.close()
+
+    assert cache.get('lane') is None
+    cache.set('lane', 2)  # zapis pominięty, bez wyjątku
+    assert (cache.misses, cache.errors) == (1, 2)
+
+
+def test_sqlite_cache_invalidate_and_stats_survive_errors(tmp_path, wall_clock):
+    path = str(tmp_path / 'cache.sqlite3')
+    cache = SQLiteCache(path, maxsize=10, ttl=60, name='pricing')
+    cache.set('lane', 1)
+    conn = sqlite3.connect(path)
+    conn.execute('DROP TABLE cache_entries')
+    conn.close()
+
+    assert cache.invalidate('lane') is None
+    assert cache.invalidate() is None
+    stats = cache.stats()
+    assert (stats['size'], stats['invalidations'], stats['errors']) == (None, 0, 3)
+
+
+def test_invalidate_endpoint_reports_cache_errors(tmp_path, monkeypatch):
+    import app as flask_app
+
+    path = str(tmp_path / 'cache.sqlite3')
+    cache = SQLiteCache(path, maxsize=10, ttl=60, name='pricing')
+    monkeypatch.setattr(flask_app, 'pricing_cache', cache)
+    monkeypatch.setattr(flask_app, 'ADMIN_API_KEY', None)
+    client = flask_app.app.test_client()
+    cache.set(('PL20', 'DE49'), 1)
+    response = client.post('/api/cache/invalidate', json={'start_location': 'PL20', 'end_location': 'DE49'})
+    assert (response.status_code, response.get_json()['removed']) == (200, 1)
+
+    conn = sqlite3.connect(path)
+    conn.execute('DROP TABLE cache_entries')
+    conn.close()
+    response = client.post('/api/cache/invalidate', json={})
+    assert response.status_code == 503 and response.get_json()['success'] is False
+    response = client.get('/api/cache/stats')
+    assert response.status_code == 200 and response.get_json()['pricing']['size'] is None
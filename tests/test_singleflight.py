@@ -0,0 +1,134 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from singleflight import AsyncSingleFlight, SingleFlight
+
+
+def _wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.001)
+
+
+def _run_concurrently(flight, key, fn, callers):
+    results, errors = [], []
+
+    def call():
+        try:
+            results.append(flight.do(key, fn, timeout=5))
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=call) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return {'price': 1.0}
+
+    threads, results, errors = _run_concurrently(flight, ('PL20', 'DE49'), fetch, 5)
+    _wait_for(lambda: flight.stats()['waiting'] == 4)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1 and not errors
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    assert all(result is results[0][0] for result, _ in results)
+    stats = flight.stats()
+    assert (stats['in_flight'], stats['leaders'], stats['deduplicated']) == (0, 1, 4)
+
+
+def test_waiters_get_the_leaders_exception():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def fetch():
+        release.wait(5)
+        raise ValueError('backend down')
+
+    threads, results, errors = _run_concurrently(flight, 'lane', fetch, 3)
+    _wait_for(lambda: flight.stats()['waiting'] == 2)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert not results
+    assert len(errors) == 3 and all(error is errors[0] for error in errors)
+    assert flight.stats()['errors'] == 1
+
+
+def test_key_is_released_after_the_call():
+    flight = SingleFlight()
+    assert flight.do('lane', lambda: 1) == (1, False)
+    assert flight.do('lane', lambda: 2) == (2, False)
+
+
+def test_waiter_timeout():
+    flight = SingleFlight()
+    release = threading.Event()
+    leader = threading.Thread(target=flight.do, args=('lane', lambda: release.wait(5)))
+    leader.start()
+    _wait_for(lambda: flight.stats()['in_flight'] == 1)
+    try:
+        with pytest.raises(TimeoutError):
+            flight.do('lane', lambda: None, timeout=0.01)
+    finally:
+        release.set()
+        leader.join()
+
+
+def test_async_calls_share_one_execution():
+    async def scenario():
+        flight = AsyncSingleFlight()
+        release = asyncio.Event()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await release.wait()
+            return {'price': 1.0}
+
+        tasks = [asyncio.ensure_future(flight.do('lane', fetch)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*tasks)
+        return flight, calls, results
+
+    flight, calls, results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert [shared for _, shared in results] == [False, True, True]
+    assert flight.stats()['in_flight'] == 0
+
+
+def test_async_cancelled_leader_does_not_cancel_waiters():
+    async def scenario():
+        flight = AsyncSingleFlight()
+        release = asyncio.Event()
+
+        async def fetch():
+            await release.wait()
+            return 'quote'
+
+        leader = asyncio.ensure_future(flight.do('lane', fetch))
+        waiter = asyncio.ensure_future(flight.do('lane', fetch))
+        await asyncio.sleep(0)
+        leader.cancel()  # klient lidera się rozłączył
+        await asyncio.sleep(0)
+        release.set()
+        return leader.cancelled(), await waiter
+
+    assert asyncio.run(scenario()) == (True, ('quote', True))